@@ -0,0 +1,72 @@
+import csv
+import os
+import time
+
+from datetime import datetime
+from tempfile import TemporaryDirectory
+
+from benchmarks.generate import generate
+from stl.db import ARCHIVE_DT_FORMAT, ENCODING
+from stl.db import parse_stamp
+
+
+def read_stamps(dir_path):
+    """
+    Returns the [] of all the start and stop strings found in the archive log
+    files in the given database dir.
+    """
+    stamps = []
+
+    for year in sorted(os.listdir(dir_path)):
+        year_dir = os.path.join(dir_path, year)
+        if not year.isdigit():
+            continue
+
+        for month in sorted(os.listdir(year_dir)):
+            path = os.path.join(year_dir, month)
+            with open(path, newline='', encoding=ENCODING) as f:
+                for line in csv.reader(f, delimiter='\t'):
+                    stamps.extend(line[:2])
+
+    return stamps
+
+
+def time_decoder(func, stamps, repeat=3):
+    """
+    Returns the best of the given number of timings, in seconds, of the given
+    function decoding all the given stamps.
+    """
+    best = None
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for s in stamps:
+            func(s)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def main():
+    """
+    Generates a 10-year database and prints how many archive log rows per
+    second are decoded with strptime (before) and with parse_stamp (after).
+    """
+    with TemporaryDirectory() as dir_path:
+        count = generate(dir_path, years=10)
+        stamps = read_stamps(dir_path)
+
+    before = time_decoder(
+        lambda s: datetime.strptime(s, ARCHIVE_DT_FORMAT), stamps)
+    after = time_decoder(parse_stamp, stamps)
+
+    print('rows: {}'.format(count))
+    print('strptime: {:.0f} rows/s'.format(count / before))
+    print('parse_stamp: {:.0f} rows/s'.format(count / after))
+    print('speedup: {:.1f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import csv
+import os
+import random
+
+from datetime import datetime, timedelta
+
+from stl.db import ARCHIVE_DT_FORMAT, CURRENT_DT_FORMAT, ENCODING
+
+
+def generate(dir_path, years=10, entries_per_day=8, num_tasks=50, seed=0,
+             first_year=2010):
+    """
+    Fills the given (empty) dir with a synthetic database: the archive log
+    files for the given number of years starting with first_year, a tasks file
+    and a current file. The output only depends on the arguments.
+
+    Returns the number of archive log entries written.
+    """
+    rand = random.Random(seed)
+    tasks = ['task-{}'.format(i) for i in range(num_tasks)]
+    task_months = {task: set() for task in tasks}
+
+    count = 0
+    day = datetime(first_year, 1, 1)
+
+    while day.year < first_year + years:
+        year_dir = os.path.join(dir_path, str(day.year).zfill(4))
+        os.makedirs(year_dir, exist_ok=True)
+
+        path = os.path.join(year_dir, str(day.month).zfill(2))
+        month = day.month
+
+        with open(path, 'w', newline='', encoding=ENCODING) as f:
+            writer = csv.writer(f, delimiter='\t')
+
+            while day.month == month:
+                start = day + timedelta(hours=8)
+
+                for _ in range(entries_per_day):
+                    stop = start + timedelta(minutes=rand.randint(5, 90))
+                    task = rand.choice(tasks) if rand.random() < .9 else ''
+
+                    writer.writerow([start.strftime(ARCHIVE_DT_FORMAT),
+                                     stop.strftime(ARCHIVE_DT_FORMAT),
+                                     task])
+                    if task:
+                        task_months[task].add(
+                            '{}-{:02}'.format(day.year, day.month))
+
+                    start = stop + timedelta(minutes=rand.randint(0, 30))
+                    count += 1
+
+                day += timedelta(days=1)
+
+    with open(os.path.join(dir_path, 'tasks'), 'w',
+              newline='', encoding=ENCODING) as f:
+        writer = csv.writer(f, delimiter='\t')
+        for task in sorted(tasks):
+            if task_months[task]:
+                writer.writerow([task, ','.join(sorted(task_months[task]))])
+
+    with open(os.path.join(dir_path, 'current'), 'w',
+              newline='', encoding=ENCODING) as f:
+        writer = csv.writer(f, delimiter='\t')
+        writer.writerow([day.strftime(CURRENT_DT_FORMAT), rand.choice(tasks)])
+
+    return count
+
+
+def main():
+    """
+    Generates a database in the dir given on the command line.
+    """
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.generate')
+    parser.add_argument('dir', help='an empty or non-existent dir')
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--entries-per-day', type=int, default=8)
+    parser.add_argument('--tasks', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--first-year', type=int, default=2010)
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+
+    count = generate(args.dir, years=args.years,
+                     entries_per_day=args.entries_per_day,
+                     num_tasks=args.tasks, seed=args.seed,
+                     first_year=args.first_year)
+
+    print('{} entries written to {}'.format(count, args.dir))
+
+
+if __name__ == '__main__':
+    main()
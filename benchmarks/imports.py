@@ -0,0 +1,94 @@
+import os
+import re
+import subprocess
+import sys
+
+
+"""
+The modules to measure the import time of: the entry points and the modules
+behind the commands.
+"""
+MODULES = ['stl.prompt', 'stl.cli', 'stl.core', 'stl.db', 'stl.status',
+           'stl.daemon']
+
+
+"""
+The pattern of the lines output by python -X importtime: the time spent
+importing the module itself and the cumulative time including its own imports,
+both in microseconds, and the module name indented by its nesting level.
+"""
+IMPORTTIME_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def parse_importtime(output):
+    """
+    Returns a [] of (module, self_us, cumulative_us, level) tuples parsed from
+    the given stderr of python -X importtime. Other lines are ignored.
+    """
+    rows = []
+
+    for line in output.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumul_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumul_us),
+                         (len(indent) - 1) // 2))
+
+    return rows
+
+
+def measure(module, repeat=5):
+    """
+    Imports the given module in a new interpreter the given number of times and
+    returns the rows of the run in which it took the least time to import:
+    those of the modules it imported, followed by its own. The modules that
+    the interpreter imports on startup are left out.
+
+    The bytecode is cached, as it would be in an installed package; the first
+    run is discarded.
+    """
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+    best = None
+
+    for i in range(repeat + 1):
+        res = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                env=env, stderr=subprocess.PIPE, check=True)
+
+        rows = parse_importtime(res.stderr.decode())
+
+        end = [row[0] for row in rows].index(module)
+        start = end
+        while start > 0 and rows[start - 1][3] > 0:
+            start -= 1
+
+        if i and (best is None or rows[end][2] < best[-1][2]):
+            best = rows[start:end + 1]
+
+    return best
+
+
+def main(top=8):
+    """
+    Prints a table with the import time of each of MODULES and, for each of
+    them, the given number of the most expensive modules imported with it.
+    """
+    print('{:<40} {:>10} {:>10}'.format('module', 'self (ms)', 'cumul (ms)'))
+
+    for module in MODULES:
+        rows = measure(module)
+        _, self_us, cumul_us, _ = rows[-1]
+
+        print('{:<40} {:>10.1f} {:>10.1f}'.format(
+            module, self_us / 1000, cumul_us / 1000))
+
+        others = sorted(rows[:-1], key=lambda row: row[1], reverse=True)
+        for name, self_us, cumul_us, _ in others[:top]:
+            print('  {:<38} {:>10.1f} {:>10.1f}'.format(
+                name, self_us / 1000, cumul_us / 1000))
+
+
+if __name__ == '__main__':
+    main()
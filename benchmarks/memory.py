@@ -0,0 +1,48 @@
+import tracemalloc
+
+from datetime import date
+from tempfile import TemporaryDirectory
+
+from benchmarks.generate import generate
+from stl.db import Database
+
+
+def measure(func):
+    """
+    Returns the peak memory, in bytes, allocated while calling the given
+    function, as well as the size of the latter's result.
+    """
+    tracemalloc.start()
+    res = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return peak, len(res)
+
+
+def main():
+    """
+    Generates a 10-year database and prints the peak memory of loading all of
+    it as a MonthLog and as the [] of {start, stop, task} dicts that Database
+    used to return.
+    """
+    with TemporaryDirectory() as dir_path:
+        generate(dir_path, years=10)
+        db = Database(dir_path)
+
+        start, end = date(2010, 1, 1), date(2019, 12, 31)
+        db.get_span(start, end)  # warm the cache
+
+        after, count = measure(lambda: db.get_span(start, end))
+        before, _ = measure(lambda: [
+            {'start': entry.start, 'stop': entry.stop, 'task': entry.task}
+            for entry in db.get_span(start, end)])
+
+    print('rows: {}'.format(count))
+    print('dicts: {:.1f} MiB'.format(before / 2**20))
+    print('MonthLog: {:.1f} MiB'.format(after / 2**20))
+    print('ratio: {:.1f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+from datetime import date, datetime, timedelta
+from statistics import median
+from tempfile import TemporaryDirectory
+
+from benchmarks.generate import generate
+from stl.cache import CACHE_DIR
+from stl.core import Core
+from stl.db import BACKENDS
+from stl.db import Database, copy_database
+from stl.status import Status
+from stl.time import Parser
+
+
+"""
+The scenarios' names and the functions that set them up; see run_scenarios.
+Each function takes the Core instance of a generated database and the latter's
+first year and returns a (func, setup, number) tuple: the function to time,
+the function to call (untimed) before each timing or None, and how many times
+to call func per timing.
+"""
+SCENARIOS = []
+
+
+def scenario(name):
+    """
+    Decorator that adds the decorated function to SCENARIOS.
+    """
+    def decorator(func):
+        SCENARIOS.append((name, func))
+        return func
+
+    return decorator
+
+
+@scenario('core.start')
+def setup_start(core, first_year):
+    now = datetime(first_year + 1, 6, 15, 9)
+
+    def setup():
+        core.db.get_current(delete=True)
+
+    return lambda: core.start('task-1', now=now), setup, 1
+
+
+@scenario('core.stop')
+def setup_stop(core, first_year):
+    start = datetime(first_year + 1, 6, 15, 9)
+
+    def setup():
+        core.db.add_current(start, 'task-1')
+
+    return lambda: core.stop(now=start + timedelta(hours=1)), setup, 1
+
+
+@scenario('core.add')
+def setup_add(core, first_year):
+    start = datetime(first_year, 6, 15, 12, 30)
+    stop = start + timedelta(minutes=15)
+
+    return lambda: core.add(start, stop, 'task-2'), None, 1
+
+
+@scenario('status.get_year_info')
+def setup_year(core, first_year):
+    status = Status(core.db)
+    return lambda: status.get_year_info(first_year), None, 1
+
+
+@scenario('status.get_year_info.cold')
+def setup_year_cold(core, first_year):
+    status = Status(core.db)
+
+    def setup():
+        shutil.rmtree(os.path.join(core.dir_path, CACHE_DIR),
+                      ignore_errors=True)
+
+    return lambda: status.get_year_info(first_year), setup, 1
+
+
+@scenario('status.get_span_info')
+def setup_span(core, first_year):
+    status = Status(core.db)
+    start, end = date(first_year, 3, 10), date(first_year + 2, 10, 20)
+
+    return lambda: status.get_span_info(start, end), None, 1
+
+
+@scenario('status.get_span_info.sparse')
+def setup_span_sparse(core, first_year):
+    status = Status(core.db)
+    start, end = date(first_year - 10, 1, 1), date(first_year + 2, 12, 31)
+
+    return lambda: status.get_span_info(start, end), None, 1
+
+
+@scenario('status.get_breakdown_info')
+def setup_breakdown(core, first_year):
+    status = Status(core.db)
+    start, end = date(first_year, 1, 1), date(first_year, 12, 31)
+
+    return lambda: status.get_breakdown_info(start, end, ['day']), None, 1
+
+
+@scenario('core.export.tsv')
+def setup_export(core, first_year):
+    from stl.status import iter_tsv
+
+    extras = [('year', str(first_year))]
+
+    def func():
+        for line in iter_tsv(core.export(extras, ['day', 'task'])):
+            pass
+
+    return func, None, 1
+
+
+@scenario('status.get_task_info')
+def setup_task(core, first_year):
+    status = Status(core.db)
+    return lambda: status.get_task_info('task-7'), None, 1
+
+
+@scenario('db.iter_task.after_add')
+def setup_iter_task(core, first_year):
+    months = core.db.get_task('task-7')
+
+    def setup():
+        for year, month in months:
+            start = datetime(year, month, 28, 23)
+            core.db.add_complete(start, start + timedelta(minutes=30),
+                                 'task-7')
+
+    return lambda: list(core.db.iter_task('task-7')), setup, 1
+
+
+@scenario('db.get_day.after_add')
+def setup_get_day(core, first_year):
+    year, month = first_year + 1, 6
+
+    def setup():
+        start = datetime(year, month, 15, 23)
+        core.db.add_complete(start, start + timedelta(minutes=30), 'task-7')
+
+    return lambda: core.db.get_day(year, month, 15), setup, 1
+
+
+"""
+The inputs of the parser.corpus scenario, as they would be passed to stl show
+(the method of the Parser and the string); all of these are valid.
+"""
+PARSER_CORPUS = [
+    ('extract_date', 'today'), ('extract_date', 'yesterday'),
+    ('extract_date', '5'), ('extract_date', '2016-10-05'),
+    ('extract_date', '5 oct'), ('extract_date', 'october 5'),
+    ('extract_date', '5 oct 2016'), ('extract_date', '2016 oct 5'),
+    ('extract_date', '30 9 2016'), ('extract_date', 'Sep 30 2015'),
+    ('extract_month', 'this'), ('extract_month', 'last'),
+    ('extract_month', 'oct'), ('extract_month', '10'),
+    ('extract_month', 'oct 2016'), ('extract_month', '2016 10'),
+    ('extract_month', 'September 2015'),
+    ('extract_year', '2016'), ('extract_year', 'last'),
+    ('extract_span', '10'), ('extract_span', '10 12'),
+    ('extract_span', '10 12 sep'), ('extract_span', '10 sep 12 oct'),
+    ('extract_span', '10 sep 12 oct 2015'),
+    ('extract_span', '10 sep 2014 12 oct 2015'),
+    ('extract_span', 'sep 10 2014'),
+]
+
+
+@scenario('parser.corpus')
+def setup_parser_corpus(core, first_year):
+    parser = Parser(datetime(2016, 10, 15, 9))
+    calls = [(getattr(parser, name), s) for name, s in PARSER_CORPUS]
+
+    def func():
+        for method, s in calls:
+            method(s)
+
+    return func, None, 100
+
+
+@scenario('parser.resolve_many')
+def setup_resolve_many(core, first_year):
+    kinds = {'extract_date': 'day', 'extract_month': 'month',
+             'extract_year': 'year', 'extract_span': 'span'}
+    items = [(kinds[name], s) for name, s in PARSER_CORPUS]
+
+    def func():
+        return Parser(datetime(2016, 10, 15, 9)).resolve_many(items)
+
+    return func, None, 100
+
+
+@scenario('parser.extract_span')
+def setup_extract_span(core, first_year):
+    parser = Parser(datetime(first_year + 1, 6, 15, 9))
+    s = '15 sep {} 25 oct {}'.format(first_year, first_year + 1)
+
+    return lambda: parser.extract_span(s), None, 1000
+
+
+def time_scenario(func, setup=None, number=1, repeat=5):
+    """
+    Returns the [] of the given number of timings, in seconds per call, of the
+    given function. The setup function, if such, is called before each timing.
+    """
+    timings = []
+
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+
+    return timings
+
+
+def get_commit():
+    """
+    Returns the hash of the git commit checked out, or None if this is not
+    known; so that the results of different commits can be told apart.
+    """
+    try:
+        res = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return res.stdout.decode().strip()
+
+
+def run_scenarios(names=None, repeat=5, backend='files', **kwargs):
+    """
+    Generates a database, passing on the keyword args to generate, and times
+    the scenarios with the given names, or all of them. Returns a dict, ready
+    to be dumped as json, with the best and median time per call of each.
+
+    With a backend other than files, the generated database is copied into
+    one of that backend first; e.g. the memory backend leaves out the cost of
+    the file system.
+    """
+    results = {}
+
+    with TemporaryDirectory() as dir_path:
+        count = generate(dir_path, **kwargs)
+        core = Core(dir_path=dir_path, backend=backend)
+
+        if backend != 'files':
+            copy_database(Database(dir_path), core.db)
+        first_year = kwargs.get('first_year', 2010)
+
+        Status(core.db).get_year_info(first_year)  # migrate the tasks file
+
+        for name, setup_scenario in SCENARIOS:
+            if names and name not in names:
+                continue
+
+            func, setup, number = setup_scenario(core, first_year)
+            timings = time_scenario(func, setup, number, repeat)
+
+            results[name] = {
+                'best': min(timings),
+                'median': median(timings),
+                'repeat': repeat,
+                'number': number
+            }
+
+    return {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'params': dict(kwargs, backend=backend, entries=count),
+        'results': results
+    }
+
+
+def compare(old, new):
+    """
+    Returns a human-readable table comparing the best timings of the given
+    two results dicts, as returned by run_scenarios.
+    """
+    lines = ['{:<30} {:>12} {:>12} {:>8}'.format(
+        'scenario', old['commit'] or 'old', new['commit'] or 'new', 'ratio')]
+
+    for name in new['results']:
+        if name not in old['results']:
+            continue
+
+        before = old['results'][name]['best']
+        after = new['results'][name]['best']
+
+        lines.append('{:<30} {:>10.3f}ms {:>10.3f}ms {:>7.2f}x'.format(
+            name, before * 1000, after * 1000, before / after))
+
+    return '\n'.join(lines)
+
+
+def main():
+    """
+    Runs the scenarios and writes the results as json to stdout or to a file;
+    or, with --compare, prints the comparison of two such files.
+    """
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.scenarios')
+    parser.add_argument('-o', '--output', help='write the results here')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two results files instead')
+    parser.add_argument('--only', nargs='+', metavar='SCENARIO',
+                        choices=[name for name, _ in SCENARIOS])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--backend', choices=list(BACKENDS), default='files')
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--entries-per-day', type=int, default=8)
+    parser.add_argument('--tasks', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+
+        print(compare(old, new))
+        return
+
+    results = run_scenarios(args.only, args.repeat, args.backend,
+                            years=args.years,
+                            entries_per_day=args.entries_per_day,
+                            num_tasks=args.tasks, seed=args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    else:
+        json.dump(results, sys.stdout, indent=4)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import time
+
+from datetime import date
+from tempfile import TemporaryDirectory
+
+from benchmarks.generate import generate
+from stl.cache import CACHE_DIR
+from stl.db import Database
+
+
+"""
+The worker setups to compare, as (workers, processes) tuples.
+"""
+SETUPS = [(1, False), (2, False), (4, False), (8, False),
+          (2, True), (4, True)]
+
+
+def time_span(db, start, end, cold, repeat=3):
+    """
+    Returns the best of the given number of timings, in seconds, of loading
+    all the entries between the given dates. If cold is set, the cache is
+    removed before each run, so that all the month files are parsed.
+    """
+    best = None
+
+    for _ in range(repeat):
+        if cold:
+            shutil.rmtree(os.path.join(db.dir_path, CACHE_DIR),
+                          ignore_errors=True)
+
+        start_time = time.perf_counter()
+        db.get_span(start, end)
+        elapsed = time.perf_counter() - start_time
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def main():
+    """
+    Generates a 10-year database and prints how long loading all of it takes
+    with the different worker setups, with a cold and with a warm cache.
+    """
+    with TemporaryDirectory() as dir_path:
+        count = generate(dir_path, years=10, first_year=2010)
+        start, end = date(2010, 1, 1), date(2019, 12, 31)
+
+        print('rows: {}'.format(count))
+        print('{:<20} {:>10} {:>10}'.format('workers', 'cold (s)', 'warm (s)'))
+
+        for workers, processes in SETUPS:
+            db = Database(dir_path, workers=workers, processes=processes)
+            cold = time_span(db, start, end, cold=True)
+            warm = time_span(db, start, end, cold=False)
+
+            label = '{} {}'.format(
+                workers, 'processes' if processes else 'threads')
+            print('{:<20} {:>10.3f} {:>10.3f}'.format(label, cold, warm))
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,18 @@
+import time
+
+
 __version__ = '0.0.4'
+
+
+"""
+When the package was first imported; see stl.profile.
+"""
+STARTED = time.perf_counter()
+
+
+"""
+The paths, in order of preference, of the dir that contains the database files
+if not explicitly given; see Core._get_dir_path. Kept here, as the prompt entry
+point needs them without importing the rest of the package.
+"""
+DIR_PATHS = ('~/.config/stl', '~/.stl')
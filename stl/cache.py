@@ -0,0 +1,324 @@
+import logging
+import marshal
+import os
+import threading
+
+from stl.entries import Journal, Manifest, MonthLog, OffsetIndex, Rollup
+from stl.stats import Counters
+
+
+"""
+The name of the subdir of the database dir that holds the cache files and the
+version of the latter's format; cache files of other versions are ignored.
+"""
+CACHE_DIR = '.cache'
+CACHE_VERSION = 2
+
+
+"""
+The kinds of the per-month objects that can be brought up to date with the
+month files through the journals (see MonthCache.get_since): the suffixes of
+their cache files and their classes.
+"""
+KINDS = {
+    'rollup': ('.rollup', Rollup),
+    'tasks': ('.tasks', OffsetIndex),
+    'days': ('.days', OffsetIndex)
+}
+
+
+"""
+How many journal entries behind the cache file of a Rollup or an OffsetIndex
+can be before it is written anew once brought up to date; until then, catching
+up costs less than writing the file would.
+"""
+JOURNAL_LAG = 16
+
+
+def get_stat_key(stat):
+    """
+    Returns the tuple identifying the version of a file or a dir given the
+    latter's os.stat_result.
+    """
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class MonthCache:
+    """
+    Keeps the already de-serialised archive log entries of the month files,
+    their rollups, and their task and day indexes in binary form, a cache file
+    of each kind per month file, in a directory tree mirroring that of the
+    database. A cache file is only valid as long as the stat (modification
+    time, size, inode) of its month file has not changed; thus, editing a
+    month file by hand invalidates it.
+
+    The cache files can be safely deleted at any time.
+
+    Rather than the rollup and the indexes, adding an entry to a month file
+    updates the month's journal, which these are brought up to date with when
+    read; see get_since.
+
+    Long-running processes can also keep the cached objects in memory, so that
+    only the month files are stat-ed; the objects returned are then shared and
+    should not be modified.
+    """
+
+    def __init__(self, dir_path, keep_in_memory=False, counters=None):
+        """
+        Constructor. The path should lead to the database dir; the cache files
+        are kept in its CACHE_DIR subdir. If the flag is set, the cached
+        objects are also kept in memory, {path: (key, obj)}. The Counters
+        instance, if given, is updated with the cache hits and misses and with
+        the cache files read and written.
+        """
+        self.log = logging.getLogger(__name__)
+        self.dir_path = os.path.join(dir_path, CACHE_DIR)
+        self.memory = {} if keep_in_memory else None
+        self.counters = Counters() if counters is None else counters
+
+    def get_path(self, year, month, suffix=''):
+        """
+        Returns the absolute path to the cache file for the given year and
+        month. The suffix distinguishes the different kinds of cached data.
+        """
+        return os.path.join(self.dir_path, str(year).zfill(4),
+                            str(month).zfill(2) + suffix)
+
+    def _make_key(self, stat):
+        """
+        Returns the key of the given os.stat_result of a month file or None if
+        the stat is None, i.e. if the cached object is valid regardless.
+        """
+        return None if stat is None else get_stat_key(stat)
+
+    def _load(self, path, stat, cls):
+        """
+        Returns the instance of the given class (MonthLog or Rollup) cached in
+        the given file or None if the latter is missing, unreadable, or does
+        not match the given os.stat_result of the month file.
+        """
+        item = self._load_obj(path, [self._make_key(stat)], cls)
+        self.counters.add('cache_misses' if item is None else 'cache_hits')
+
+        return None if item is None else item[1]
+
+    def _load_obj(self, path, keys, cls):
+        """
+        Helper for the _load and get_since methods, which also count the hits
+        and the misses. Returns the (key, obj) tuple cached in the given file
+        if the key is any of the given [] of keys or if the latter is None, or
+        None otherwise.
+        """
+        if self.memory is not None and path in self.memory:
+            key, obj = self.memory[path]
+            if keys is None or key in keys:
+                return key, obj
+
+        try:
+            with self.counters.timed('io_time'):
+                with open(path, 'rb') as f:
+                    raw = f.read()
+            self.counters.add('files_opened')
+            self.counters.add('bytes_read', len(raw))
+            with self.counters.timed('parse_time'):
+                version, key, data = marshal.loads(raw)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, TypeError, ValueError) as err:
+            self.log.debug('Could not read {}: {}'.format(path, err))
+            return None
+
+        if version != CACHE_VERSION or (keys is not None and key not in keys):
+            return None
+
+        try:
+            with self.counters.timed('parse_time'):
+                obj = cls.load(data)
+        except (TypeError, ValueError) as err:
+            self.log.debug('Could not read {}: {}'.format(path, err))
+            return None
+
+        if self.memory is not None:
+            self.memory[path] = (key, obj)
+
+        return key, obj
+
+    def _save(self, path, stat, obj):
+        """
+        Writes the given MonthLog or Rollup to the given cache file, along with
+        the key of the given os.stat_result of the month file. Failing to write
+        the cache is not an error.
+        """
+        temp_path = '{}.{}.{}'.format(path, os.getpid(), threading.get_ident())
+
+        key = self._make_key(stat)
+        data = marshal.dumps((CACHE_VERSION, key, obj.dump()))
+
+        if self.memory is not None:
+            self.memory[path] = (key, obj)
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self.counters.timed('io_time'):
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+            os.replace(temp_path, path)
+        except OSError as err:
+            self.log.debug('Could not write {}: {}'.format(path, err))
+        else:
+            self.counters.add('files_opened')
+            self.counters.add('bytes_written', len(data))
+
+    def get(self, year, month, stat):
+        """
+        Returns the MonthLog cached for the given month or None if there is no
+        valid such. The stat argument should be the os.stat_result of the
+        month file.
+        """
+        return self._load(self.get_path(year, month), stat, MonthLog)
+
+    def put(self, year, month, stat, log):
+        """
+        Caches the given MonthLog for the given month. The stat argument should
+        be the os.stat_result of the month file taken before reading the
+        latter.
+        """
+        self._save(self.get_path(year, month), stat, log)
+
+    def get_rollup(self, year, month, stat):
+        """
+        Returns the Rollup cached for the given month or None if there is no
+        valid such. The stat argument is as in get.
+        """
+        return self._load(self.get_path(year, month, '.rollup'), stat, Rollup)
+
+    def put_rollup(self, year, month, stat, rollup):
+        """
+        Caches the given Rollup for the given month. The stat argument should
+        be the os.stat_result of the month file the rollup is up to date with.
+        """
+        self._save(self.get_path(year, month, '.rollup'), stat, rollup)
+
+    def get_task_index(self, year, month, stat):
+        """
+        Returns the task OffsetIndex cached for the given month or None if
+        there is no valid such. The stat argument is as in get.
+        """
+        return self._load(self.get_path(year, month, '.tasks'), stat,
+                          OffsetIndex)
+
+    def put_task_index(self, year, month, stat, index):
+        """
+        Caches the given task OffsetIndex for the given month. The stat
+        argument should be the os.stat_result of the month file the index is
+        up to date with.
+        """
+        self._save(self.get_path(year, month, '.tasks'), stat, index)
+
+    def get_day_index(self, year, month, stat):
+        """
+        Returns the day OffsetIndex cached for the given month or None if
+        there is no valid such. The stat argument is as in get.
+        """
+        return self._load(self.get_path(year, month, '.days'), stat,
+                          OffsetIndex)
+
+    def put_day_index(self, year, month, stat, index):
+        """
+        Caches the given day OffsetIndex for the given month. The stat argument
+        is as in put_task_index.
+        """
+        self._save(self.get_path(year, month, '.days'), stat, index)
+
+    def get_journal(self, year, month, stat):
+        """
+        Returns the Journal cached for the given month or None if there is not
+        a valid such. The stat argument is as in get.
+        """
+        return self._load(self.get_path(year, month, '.journal'), stat,
+                          Journal)
+
+    def put_journal(self, year, month, stat, journal):
+        """
+        Caches the given Journal for the given month. The stat argument should
+        be the os.stat_result of the month file after its last entry.
+        """
+        self._save(self.get_path(year, month, '.journal'), stat, journal)
+
+    def get_since(self, year, month, kind, stat):
+        """
+        Returns the Rollup or the task or day OffsetIndex, as per the given
+        kind (see KINDS), cached for the given month, along with the [] of the
+        Journal entries added to the month file since; or None if there is
+        not such an object or if the journal does not go back to it. The stat
+        argument is as in get. The entries are to be applied by the caller.
+        """
+        suffix, cls = KINDS[kind]
+        item = self._load_obj(self.get_path(year, month, suffix), None, cls)
+        res = None
+
+        if item is not None:
+            key, obj = item
+
+            if key == self._make_key(stat):
+                res = obj, []
+            else:
+                journal = self._load_obj(
+                        self.get_path(year, month, '.journal'),
+                        [self._make_key(stat)], Journal)
+                if journal is not None:
+                    entries = journal[1].get_since(key)
+                    if entries is not None:
+                        res = obj, entries
+
+        self.counters.add('cache_misses' if res is None else 'cache_hits')
+
+        return res
+
+    def put_since(self, year, month, kind, stat, obj, lag):
+        """
+        Caches the given object of the given kind, as returned by get_since and
+        brought up to date with the given stat by applying the given number of
+        journal entries to it. The cache file is only written if the object
+        lagged too far behind (see JOURNAL_LAG); the object is kept in memory
+        either way, if the cached objects are kept in memory, as it is then
+        shared.
+        """
+        path = self.get_path(year, month, KINDS[kind][0])
+
+        if lag >= JOURNAL_LAG:
+            self._save(path, stat, obj)
+        elif self.memory is not None:
+            self.memory[path] = (self._make_key(stat), obj)
+
+    def get_manifest(self):
+        """
+        Returns the cached Manifest of the database or None if there is not
+        such. The manifest is valid regardless of the month files' stats; it
+        keeps those itself.
+        """
+        return self._load(os.path.join(self.dir_path, 'manifest'), None,
+                          Manifest)
+
+    def put_manifest(self, manifest):
+        """
+        Caches the given Manifest of the database.
+        """
+        self._save(os.path.join(self.dir_path, 'manifest'), None, manifest)
+
+    def invalidate(self, year, month):
+        """
+        Removes the cached MonthLog for the given month, if such. Should be
+        called whenever the respective month file is written.
+        """
+        path = self.get_path(year, month)
+
+        if self.memory is not None:
+            self.memory.pop(path, None)
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as err:
+            self.log.debug(str(err))
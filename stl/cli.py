@@ -1,7 +1,66 @@
 import argparse
+import functools
+import os
+import sys
+import time
 
-from stl.core import Core
 from stl import __version__
+from stl.client import FORWARDED_COMMANDS, forward
+
+
+"""
+The global options that take a value; see Cli._find_command. The --profile
+option's value is optional and has to be given as --profile=MODE.
+"""
+VALUE_OPTIONS = ('--dir', '--jobs')
+
+
+"""
+The modes of the --profile option, the first one being the default; see
+stl.profile.
+"""
+PROFILE_MODES = ('phases', 'cprofile')
+
+
+class HelpFormatter(argparse.HelpFormatter):
+    """
+    The argparse default, except that the terminal width is told without
+    shutil, which is slow to import; the formatter is inited on every
+    add_argument call, not only for the help message.
+    """
+
+    def __init__(self, prog, **kwargs):
+        """
+        Constructor. The width defaults as in shutil.get_terminal_size.
+        """
+        if kwargs.get('width') is None:
+            try:
+                width = int(os.environ['COLUMNS'])
+            except (KeyError, ValueError):
+                width = 0
+
+            if width <= 0:
+                try:
+                    width = os.get_terminal_size(sys.__stdout__.fileno())[0]
+                except (AttributeError, ValueError, OSError):
+                    width = 0
+
+            kwargs['width'] = (width or 80) - 2
+
+        super().__init__(prog, **kwargs)
+
+
+class ReportAction(argparse.Action):
+    """
+    Appends the (key, value) tuple of a report option of stl show, e.g.
+    ('month', 'oct 2016') for --month oct 2016, to the list of its dest, so
+    that the reports are kept in the order they are asked for.
+    """
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        key = self.option_strings[-1].lstrip('-')
+        reports = getattr(namespace, self.dest) or []
+        setattr(namespace, self.dest, reports + [(key, ' '.join(values))])
 
 
 class Cli:
@@ -12,20 +71,22 @@ class Cli:
 
     def __init__(self):
         """
-        Constructor. Inits the argparse parser and then all the subparsers
-        through the _init_* methods.
+        Constructor. Inits the argparse parser. The subparsers are only inited
+        when parsing, through the _init_* methods, and usually only the one of
+        the command being called; see parse_args.
 
         Each of the latter defines a function that takes a Core instance and
         the argparse args as arguments, which function will be called if the
         respective command is called.
         """
-        usage = 'stl [-v] [--dir DIR] subcommand'
+        usage = 'stl [-v] [--dir DIR] [--jobs N] [--profile[=MODE]] subcommand'
         desc = (
             'stl is a simple time logger that enables you to '
             'keep tally of how many hours you have worked on this or that'
         )
 
-        self.parser = argparse.ArgumentParser(usage=usage, description=desc)
+        self.parser = argparse.ArgumentParser(
+                usage=usage, description=desc, formatter_class=HelpFormatter)
 
         self.parser.add_argument(
                 '--version', action='version', version=__version__)
@@ -36,18 +97,93 @@ class Cli:
                 '--dir',
                 help=('set the directory where the data will be saved; '
                       'defaults to ~/.config/stl or ~/.stl'))
+        self.parser.add_argument(
+                '--jobs', type=int, default=1, metavar='N',
+                help=('load up to N months at a time when reading '
+                      'multiple months; defaults to 1'))
+        self.parser.add_argument(
+                '--profile', nargs='?', const=PROFILE_MODES[0],
+                choices=PROFILE_MODES, metavar='MODE',
+                help=('print to stderr how long each phase of the command '
+                      'took and how much data was read; '
+                      'with --profile=cprofile, dump the cProfile stats '
+                      'to stl.pstats instead'))
 
         self.subparsers = self.parser.add_subparsers(
-                dest='command', title='subcommands')
+                dest='command', title='subcommands',
+                parser_class=functools.partial(
+                    argparse.ArgumentParser, formatter_class=HelpFormatter))
+
+        self.inits = {
+            'start': self._init_start,
+            'stop': self._init_stop,
+            'switch': self._init_switch,
+            'status': self._init_status,
+            'show': self._init_status,
+            'add': self._init_add,
+            'import': self._init_import,
+            'edit': self._init_edit,
+            'migrate': self._init_migrate,
+            'daemon': self._init_daemon
+        }
+
+        self._inited = set()
+
+    def _find_command(self, raw_args):
+        """
+        Returns the index of the command in the given [] of command-line args,
+        i.e. of the first arg that is neither an option nor an option's value,
+        or None. The result is only a guess, e.g. abbreviated options are not
+        known. Also returns None if the help message is asked for before a
+        command.
+        """
+        args = enumerate(raw_args)
 
-        self._init_start()
-        self._init_stop()
-        self._init_switch()
+        for index, arg in args:
+            if arg in ('-h', '--help'):
+                return None
+            elif arg in VALUE_OPTIONS:
+                next(args, None)
+            elif not arg.startswith('-'):
+                return index
 
-        self._init_status()
+        return None
 
-        self._init_add()
-        self._init_edit()
+    def _init_subparsers(self, command=None):
+        """
+        Inits the subparser of the given command or, if this is not a known
+        command, all the subparsers, e.g. for the help message. Subparsers that
+        have already been inited are skipped.
+        """
+        if command in self.inits:
+            inits = [self.inits[command]]
+        else:
+            inits = self.inits.values()
+
+        for init in inits:
+            if init.__name__ not in self._inited:
+                self._inited.add(init.__name__)
+                init()
+
+    def parse_args(self, raw_args):
+        """
+        Inits the subparsers needed and returns the argparse namespace for the
+        given [] of command-line args. Exits, as argparse does, if these are
+        invalid or if the help message is asked for.
+        """
+        index = self._find_command(raw_args)
+
+        if index is None:
+            self._init_subparsers()
+        else:
+            self._init_subparsers(raw_args[index])
+
+            # otherwise argparse would take the command for --profile's value
+            raw_args = [
+                '--profile=' + PROFILE_MODES[0] if arg == '--profile' else arg
+                for arg in raw_args[:index]] + raw_args[index:]
+
+        return self.parser.parse_args(raw_args)
 
     def _init_start(self):
         """
@@ -117,61 +253,104 @@ class Cli:
         Inits the subparser that handles the status/show command.
         """
         def status(core, args):
-            extra = None
+            extras = args.reports or []
+
+            if args.by is not None and not extras:
+                raise ValueError('Please specify what to break down')
+
+            if args.top is not None and args.by is None:
+                raise ValueError('Please specify what to break down by')
+
+            if args.format != 'text':
+                from stl.status import FORMATS
+
+                tables = core.export(extras, args.by, args.top)
+                return FORMATS[args.format](tables)
+
+            if args.by is not None:
+                return '\n\n'.join([
+                    core.breakdown(extra, args.by, args.top)
+                    for extra in extras])
 
-            for key in ['day', 'week', 'month', 'year', 'span', 'task']:
-                if getattr(args, key) is not None:
-                    extra = (key, ' '.join(getattr(args, key)))
-                    break
+            if len(extras) > 1:
+                return '\n\n'.join(core.status_many(extras))
 
-            return core.status(extra=extra)
+            return core.status(extra=extras[0] if extras else None)
 
         usage = (
             'stl (status|show) '
-            '[-d ... | -w ... | -m ... | -y ... | -s ... | -t ...]'
+            '[-d ...] [-w ...] [-m ...] [-y ...] [-s ...] '
+            '[--by KEYS [--top N]] [-f FORMAT] [-t ...]'
         )
         desc = (
             'show a status report; '
             'when called without further arguments, '
-            'it will tell you what you are doing now'
+            'it will tell you what you are doing now; '
+            'several reports can be asked for at once, '
+            'e.g. stl show -d today -w this -m this; '
+            'the date reports can be broken down, '
+            'e.g. stl show -y this --by day,task'
         )
 
         subp = self.subparsers.add_parser(
                 'status', aliases=['show'], usage=usage, description=desc,
                 help=desc[:desc.find(';')])
 
-        group = subp.add_mutually_exclusive_group()
-        group.add_argument(
-                '-d', '--day', nargs=argparse.REMAINDER,
+        subp.add_argument(
+                '-d', '--day', nargs='*', metavar='DAY',
+                dest='reports', action=ReportAction,
                 help=('report for the given day, '
                       'e.g. 15 oct, 2016-10-15, today, yesterday; '
                       'empty string defaults to today'))
-        group.add_argument(
-                '-w', '--week', nargs=argparse.REMAINDER,
+        subp.add_argument(
+                '-w', '--week', nargs='*', metavar='WEEK',
+                dest='reports', action=ReportAction,
                 help=('report for the given week, '
                       'possible values are this and last; '
                       'empty string defaults to this week'))
-        group.add_argument(
-                '-m', '--month', nargs=argparse.REMAINDER,
+        subp.add_argument(
+                '-m', '--month', nargs='*', metavar='MONTH',
+                dest='reports', action=ReportAction,
                 help=('report for the given month, '
                       'e.g. oct, 10, 10 2016, this, last; '
                       'empty string defaults to this month'))
-        group.add_argument(
-                '-y', '--year', nargs=argparse.REMAINDER,
+        subp.add_argument(
+                '-y', '--year', nargs='*', metavar='YEAR',
+                dest='reports', action=ReportAction,
                 help=('report for the given year, '
                       'e.g. 2016, this, last; '
                       'empty string defaults to this year'))
-        group.add_argument(
-                '-s', '--span', nargs=argparse.REMAINDER,
+        subp.add_argument(
+                '-s', '--span', nargs='*', metavar='SPAN',
+                dest='reports', action=ReportAction,
                 help=('report for the time span between two dates '
                       '(inclusive), e.g. 15 25 oct, 15 sep 2016 25 oct 2016, '
                       '15 sep 25 oct; if you specify only one date, '
                       'the second will be set to today; some restrictions: '
                       'the second date (if such) cannot be less specific '
                       'than the first and months cannot be numbers'))
-        group.add_argument(
-                '-t', '--task', nargs=argparse.REMAINDER,
-                help='report for the given task')
+        subp.add_argument(
+                '--by', metavar='KEYS', type=lambda s: s.split(','),
+                help=('break the date reports down by the given '
+                      'comma-separated keys: day, week, weekday, hour, '
+                      'month, year, task'))
+        subp.add_argument(
+                '--top', metavar='N', type=int,
+                help=('with --by, list only the N groups with the most '
+                      'time, largest first'))
+        subp.add_argument(
+                '-f', '--format', choices=['text', 'json', 'tsv'],
+                default='text',
+                help=('the format of the output; json and tsv give the times '
+                      'in seconds and the dates in ISO format, a json object '
+                      'or a tsv line per row; defaults to text'))
+        # unlike the others, the task takes the rest of the args, even those
+        # that look like options
+        subp.add_argument(
+                '-t', '--task', nargs=argparse.REMAINDER, metavar='TASK',
+                dest='reports', action=ReportAction,
+                help=('report for the given task; '
+                      'this should go after any other options'))
 
         subp.set_defaults(func=status)
 
@@ -205,6 +384,78 @@ class Cli:
 
         subp.set_defaults(func=add)
 
+    def _init_import(self):
+        """
+        Inits the subparser that handles the import command.
+        """
+        def read_tsv(f):
+            import csv
+
+            reader = csv.reader(f, delimiter='\t')
+            for line in reader:
+                if not line:
+                    continue
+                if len(line) not in (2, 3):
+                    raise ValueError('Could not read line {}: {}'.format(
+                        reader.line_num, line))
+                start, stop = [s.strip().replace(' ', 'T', 1)
+                               for s in line[:2]]
+                yield start, stop, line[2] if len(line) == 3 else ''
+
+        def read_jsonl(f):
+            import json
+
+            for num, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+
+                try:
+                    d = json.loads(line)
+                except ValueError:
+                    d = None
+
+                if not isinstance(d, dict) \
+                        or not isinstance(d.get('start'), str) \
+                        or not isinstance(d.get('stop'), str) \
+                        or not isinstance(d.get('task') or '', str):
+                    raise ValueError('Could not read line {}: {}'.format(
+                        num, line.strip()))
+
+                start, stop = [d[key].strip().replace(' ', 'T', 1)
+                               for key in ['start', 'stop']]
+                yield start, stop, d.get('task') or ''
+
+        def import_(core, args):
+            read = read_tsv if args.format == 'tsv' else read_jsonl
+
+            if args.file == '-':
+                return core.add_many(read(sys.stdin))
+
+            with open(args.file, newline='') as f:
+                return core.add_many(read(f))
+
+        usage = 'stl import [-f tsv|jsonl] [file]'
+        desc = (
+            'add log entries in bulk; '
+            'each entry is a start, a stop, and an optional task, '
+            'either tab-separated or as a json object per line, '
+            'the stamps being formatted as for stl add; '
+            'month files can be imported as they are'
+        )
+
+        subp = self.subparsers.add_parser(
+                'import', usage=usage, description=desc,
+                help=desc[:desc.find(';')])
+
+        subp.add_argument(
+                '-f', '--format', choices=['tsv', 'jsonl'], default='tsv',
+                help='the format of the input; defaults to tsv')
+        subp.add_argument(
+                'file', nargs='?', default='-',
+                help='the file to read the entries from; defaults to stdin')
+
+        subp.set_defaults(func=import_)
+
     def _init_edit(self):
         """
         Inits the subparser that handles the edit command.
@@ -227,36 +478,156 @@ class Cli:
 
         subp.set_defaults(func=edit)
 
-    def run(self, raw_args=None):
+    def _init_migrate(self):
+        """
+        Inits the subparser that handles the migrate command.
+        """
+        def migrate(core, args):
+            return core.migrate(args.to)
+
+        usage = 'stl migrate --to sqlite'
+        desc = (
+            'convert the database to another storage backend; '
+            'the old files are kept but no longer used'
+        )
+
+        subp = self.subparsers.add_parser(
+                'migrate', usage=usage, description=desc,
+                help=desc[:desc.find(';')])
+
+        subp.add_argument(
+                '--to', choices=['sqlite'], required=True,
+                help='the backend to convert the database to')
+
+        subp.set_defaults(func=migrate)
+
+    def _init_daemon(self):
+        """
+        Inits the subparser that handles the daemon command.
+        """
+        def daemon(core, args):
+            import signal
+            from stl.daemon import Daemon
+
+            # so that the socket is also cleaned up when killed
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+            core.configure_logging(args.verbose)
+
+            with Daemon(core, self) as server:
+                try:
+                    server.serve_forever()
+                except KeyboardInterrupt:
+                    pass
+
+            return ''
+
+        subp = self.subparsers.add_parser(
+                'daemon',
+                help=('keep running and serve the other commands, '
+                      'keeping the logs in memory for faster responses'))
+
+        subp.set_defaults(func=daemon)
+
+    def run(self, raw_args=None, core=None, use_daemon=False):
         """
         Parses the given arguments (or, except for in unit testing, sys.argv),
-        inits the Core instance and transfers to that. Note that if raw_args is
-        None, then argparse's parser defaults to reading sys.argv.
+        inits the Core instance (unless one is given) and transfers to that.
+
+        If use_daemon is set and there is a daemon serving the database dir,
+        the commands it runs are forwarded to it instead, unless in verbose
+        mode, as the debug info would then go to the daemon's stderr.
 
-        Returns a human-readable string to be printed to the user.
+        If the --profile option is given, the command is run in-process and
+        profiled; see stl.profile.
+
+        Returns a human-readable string to be printed to the user or, if the
+        command is asked for machine-readable output, an iterator of the lines
+        of the latter, so that large outputs can be written as they go.
         """
-        args = self.parser.parse_args(raw_args)
+        if raw_args is None:
+            raw_args = sys.argv[1:]
+
+        started = time.perf_counter()
+        args = self.parse_args(raw_args)
 
         if args.command is None:
             return self.parser.format_help()
 
-        core = Core(dir_path=args.dir, verbose=args.verbose)
+        if args.profile:
+            from stl.profile import Profiler
+
+            profiler = Profiler(args.profile, started)
+            return profiler.run(self._run, raw_args, args, core)
+
+        return self._run(raw_args, args, core, use_daemon)
+
+    def _run(self, raw_args, args, core=None, use_daemon=False):
+        """
+        Helper for the run method. Runs the command of the given already
+        parsed args, forwarding it to the daemon if use_daemon is set.
+        """
+        use_daemon = use_daemon and args.command in FORWARDED_COMMANDS
+
+        if use_daemon and not args.verbose:
+            try:
+                res = forward(args.dir, raw_args)
+            except ValueError as err:
+                return str(err)
+
+            if res is not None:
+                return res
+
+        if core is None:
+            from stl.core import Core
+
+            core = Core(dir_path=args.dir, verbose=args.verbose,
+                        workers=args.jobs,
+                        keep_in_memory=(args.command == 'daemon'))
 
         try:
             res = args.func(core, args)
+
+            # so that the stats include the work of generating the output
+            if args.verbose and res is not None and not isinstance(res, str):
+                res = list(res)
         except Exception as err:
             return str(err)
+        finally:
+            if args.verbose:
+                self._log_stats(core)
 
         return res
 
+    def _log_stats(self, core):
+        """
+        Logs the counters of the given Core instance's database, i.e. how much
+        work the command took; called at exit in verbose mode.
+        """
+        import logging
+        from stl.stats import format_stats
+
+        stats = format_stats(core.db.stats())
+        logging.getLogger(__name__).debug('Database stats: ' + ', '.join(
+            '{} {}'.format(label, value) for label, value in stats))
+
 
 def main():
     """
     The (only) entry point for the command-line interface as registered in
     setup.py. Inits a Cli instance, runs it with sys.argv, and prints the
-    output to stdout.
+    output to stdout, line by line if the output is an iterator of lines; the
+    errors raised while generating the latter are printed as those of Cli.run
+    are.
     """
     cli = Cli()
-    res = cli.run()
-    if res:
-        print(res.strip())
+    res = cli.run(use_daemon=True)
+
+    if isinstance(res, str):
+        if res:
+            print(res.strip())
+    elif res is not None:
+        try:
+            for line in res:
+                sys.stdout.write(line + '\n')
+        except ValueError as err:
+            print(str(err))
@@ -0,0 +1,103 @@
+import os
+
+from stl import DIR_PATHS
+
+
+"""
+The name of the Unix domain socket, in the database dir, that the daemon
+listens on; and the encoding of the messages sent over it.
+"""
+SOCKET_NAME = 'daemon.sock'
+SOCKET_ENCODING = 'utf-8'
+
+
+"""
+The commands that are forwarded to the daemon if there is one running. The
+others are always run in-process: edit spawns an editor in the terminal, import
+reads files and stdin, and daemon is the daemon itself.
+"""
+FORWARDED_COMMANDS = ('start', 'stop', 'switch', 'status', 'show', 'add')
+
+
+"""
+How long (in seconds) a client waits to connect to the daemon before falling
+back to in-process execution.
+"""
+CONNECT_TIMEOUT = 1
+
+
+"""
+How long (in seconds) a client waits for the daemon to reply to a command. A
+busy or hung daemon must not block the shell prompts forever, but the command
+cannot be run in-process instead either, as the daemon might have run it.
+"""
+REPLY_TIMEOUT = 10
+
+
+def get_socket_path(dir_path):
+    """
+    Returns the path to the socket of the daemon serving the given database dir
+    or, if dir_path is None, the default database dir (see Core._get_dir_path).
+    Returns None if there is no such dir.
+    """
+    if dir_path is None:
+        for path in DIR_PATHS:
+            path = os.path.expanduser(path)
+            if os.path.isdir(path):
+                dir_path = path
+                break
+        else:
+            return None
+
+    return os.path.join(os.path.abspath(dir_path), SOCKET_NAME)
+
+
+def forward(dir_path, raw_args):
+    """
+    Sends the given command-line arguments to the daemon serving the given
+    database dir and returns the output. Returns None if no daemon is running,
+    in which case the command is not run.
+
+    Raises ValueError if the connection is lost or the daemon does not reply in
+    time (see REPLY_TIMEOUT) after the command is sent: the latter might or
+    might not have been run, so it is not safe to re-run it.
+    """
+    path = get_socket_path(dir_path)
+    if path is None or not os.path.exists(path):
+        return None
+
+    # only imported if there might be a daemon to talk to
+    import json
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+
+    with sock:
+        sock.settimeout(REPLY_TIMEOUT)
+
+        try:
+            request = json.dumps({'args': raw_args})
+            sock.sendall(request.encode(SOCKET_ENCODING))
+            sock.shutdown(socket.SHUT_WR)
+
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+
+            response = json.loads(b''.join(chunks).decode(SOCKET_ENCODING))
+            return response['output']
+        except socket.timeout:
+            raise ValueError('The stl daemon did not reply in time; '
+                             'the command might or might not have been run')
+        except (OSError, ValueError, KeyError, TypeError):
+            raise ValueError('Lost the connection to the stl daemon')
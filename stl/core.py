@@ -1,19 +1,18 @@
 from datetime import datetime
 
-import logging.config
 import logging
 import os
 
-from stl.db import Database
-from stl.spawn import Spawner
-from stl.status import Status
+from stl import DIR_PATHS
+from stl.db import MEMORY_DIR, SQLITE_FILE
+from stl.db import copy_database, get_backend, open_database
 from stl.time import Parser
 from stl.time import prettify_date, prettify_datetime
 
 
 """
 The default logging configuration to be used; it will be slightly altered if
-the verbose flag is set (see Core.__init__).
+the verbose flag is set (see Core.configure_logging).
 """
 DEFAULT_LOGGING = {
     'version': 1,
@@ -42,37 +41,64 @@ class Core:
     the other modules in order to accomplish the tasks requested by the user.
     """
 
-    def __init__(self, dir_path=None, verbose=False):
+    def __init__(self, dir_path=None, verbose=False, workers=1,
+                 keep_in_memory=False, backend=None):
         """
-        Constructor. Configures the logging and inits the Database instance.
-
-        If set, dir_path has to be a valid path. The verbosity flag determines
-        whether the min log level would be DEBUG or INFO.
+        Constructor. Inits the database backend and, in verbose mode, the
+        logging (see configure_logging).
+
+        If set, dir_path has to be a valid path or MEMORY_DIR, which stands for
+        the memory backend. The backend is the one with the given name or, if
+        None, the one the dir uses (see open_database). The number of workers
+        and the keep_in_memory flag are passed on to it (see
+        Database.__init__).
         """
-        config = dict(DEFAULT_LOGGING)
-
         if verbose:
-            config['root']['level'] = logging.DEBUG
-
-        logging.config.dictConfig(config)
+            self.configure_logging(verbose=True)
 
         self.log = logging.getLogger(__name__)
 
-        if dir_path:
+        if backend == 'memory' and not dir_path:
+            dir_path = MEMORY_DIR
+
+        if dir_path == MEMORY_DIR:
+            self.dir_path = dir_path
+        elif dir_path:
             self.dir_path = os.path.abspath(dir_path)
             if not os.path.exists(self.dir_path):
                 raise ValueError('Could not find {}'.format(self.dir_path))
         else:
             self.dir_path = self._get_dir_path()
 
-        self.db = Database(self.dir_path)
+        self.db = open_database(self.dir_path, backend, workers=workers,
+                                keep_in_memory=keep_in_memory)
+
+    def configure_logging(self, verbose=False):
+        """
+        Configures the logging as per DEFAULT_LOGGING. The verbosity flag
+        determines whether the min log level would be DEBUG or INFO.
+
+        Unless this is called, warnings and errors are still printed to stderr
+        as they are, by the logging module's last resort handler; as
+        logging.config is slow to import, the constructor only calls this in
+        verbose mode.
+        """
+        import logging.config
+
+        config = dict(DEFAULT_LOGGING)
+        config['root'] = dict(config['root'])
+
+        if verbose:
+            config['root']['level'] = logging.DEBUG
+
+        logging.config.dictConfig(config)
 
     def _get_dir_path(self):
         """
         Returns the path to the dir that contains the database files, either
         ~/.config/stl or ~/.stl. If none exists, one will be created.
         """
-        for dir_path in ('~/.config/stl', '~/.stl'):
+        for dir_path in DIR_PATHS:
             dir_path = os.path.expanduser(dir_path)
             if os.path.exists(dir_path) and os.path.isdir(dir_path):
                 return dir_path
@@ -153,37 +179,151 @@ class Core:
     def status(self, extra=None, now=None):
         """
         Returns a human-readable string with status information. The optional
-        argument can be a (key, value) tuple, with the key being one of ('day',
-        'week', 'month', 'year', 'task').
+        argument can be a (key, value) tuple, with the key being task or one of
+        the kinds of expressions in stl.time.KINDS. The expressions resolved
+        are memoised for the day (see Parser.resolve).
         """
         if now is None:
             now = datetime.now()
 
+        from stl.status import Status
+
         status = Status(self.db)
 
         if not extra:
             return status.get_current_info(now)
 
+        return self._get_report(status, extra, now)
+
+    def status_many(self, extras, now=None):
+        """
+        Returns the [] of the human-readable strings with status information
+        for each of the given (key, value) tuples, as status would, in the
+        same order. The totals for all of them are fetched in one go, so that
+        each month is loaded only once, however many reports cover it.
+        """
+        if now is None:
+            now = datetime.now()
+
+        from stl.status import Status
+
+        status = Status(self.db)
+
+        items = [(key, value) for key, value in extras if key != 'task']
+        status.preload(Parser(now).resolve_many(items))
+
+        return [self._get_report(status, extra, now) for extra in extras]
+
+    def breakdown(self, extra, by, top=None, now=None):
+        """
+        Returns a human-readable string with the time worked during the span
+        specified by the given (key, value) tuple, as in status, broken down by
+        the given [] of stl.status.GROUP_KEYS names. If top is given, only the
+        that many groups with the most time are listed.
+        """
+        if now is None:
+            now = datetime.now()
+
+        from stl.status import Status
+
+        self._check_breakdown(extra, by, top)
+
+        d1, d2 = Parser(now).resolve(*extra)
+
+        return Status(self.db).get_breakdown_info(d1, d2, by, top)
+
+    def export(self, extras, by=None, top=None, now=None):
+        """
+        Returns the [] of structured status results for each of the given
+        (key, value) tuples, as status_many would, or for the current task if
+        there are none; each result being a (columns, rows) tuple, the rows
+        being an iterable of dicts as returned by the respective
+        stl.status.Status method. If the by arg is given, the date reports are
+        broken down, as in breakdown.
+
+        The arguments are checked right away but the rows of the date reports
+        are generated as they are consumed, e.g. by the stl.status.FORMATS
+        functions, so that large exports can be written out as they go.
+        Database errors can thus be raised while consuming the rows.
+        """
+        if now is None:
+            now = datetime.now()
+
+        from stl.status import COLUMNS, Status
+
+        status = Status(self.db)
+        parser = Parser(now)
+
+        if not extras:
+            curr = status.get_current(now)
+            return [(COLUMNS['current'], [] if curr is None else [curr])]
+
+        if by is not None:
+            for extra in extras:
+                self._check_breakdown(extra, by, top)
+
+            columns = COLUMNS['breakdown'][:2] + tuple(by) \
+                + COLUMNS['breakdown'][2:]
+
+            return [
+                (columns, status.get_breakdown(*parser.resolve(*extra), by,
+                                               top))
+                for extra in extras]
+
+        items = [(key, value) for key, value in extras if key != 'task']
+        status.preload(parser.resolve_many(items))
+
+        tables = []
+
+        for key, value in extras:
+            if key == 'task':
+                totals = status.get_task(value)
+                tables.append((COLUMNS['task'],
+                               [] if totals is None else [totals]))
+            else:
+                tables.append((COLUMNS['time'],
+                               status.get_time(*parser.resolve(key, value))))
+
+        return tables
+
+    def _check_breakdown(self, extra, by, top):
+        """
+        Raises ValueError if the report for the given (key, value) tuple
+        cannot be broken down by the given [] of keys, or if the given number
+        of top groups is not positive. Helper for the breakdown and export
+        methods.
+        """
+        from stl.status import GROUP_KEYS
+
+        if extra[0] == 'task':
+            raise ValueError('Only date reports can be broken down')
+
+        for name in by:
+            if name not in GROUP_KEYS:
+                raise ValueError('Cannot break down by {}'.format(name))
+
+        if top is not None and top < 1:
+            raise ValueError('The number of groups to list must be positive')
+
+    def _get_report(self, status, extra, now):
+        """
+        Returns the report of the given Status instance for the given (key,
+        value) tuple. Helper for the status and status_many methods.
+        """
         key, value = extra
 
         if key == 'task':
             return status.get_task_info(value)
 
-        parser = Parser(now)
+        d1, d2 = Parser(now).resolve(key, value)
+
         if key == 'day':
-            d = parser.extract_date(value)
-            return status.get_day_info(d)
-        elif key == 'week':
-            monday, sunday = parser.extract_week(value)
-            return status.get_span_info(monday, sunday)
+            return status.get_day_info(d1)
         elif key == 'month':
-            year, month = parser.extract_month(value)
-            return status.get_month_info(year, month)
+            return status.get_month_info(d1.year, d1.month)
         elif key == 'year':
-            year = parser.extract_year(value)
-            return status.get_year_info(year)
-        elif key == 'span':
-            d1, d2 = parser.extract_span(value)
+            return status.get_year_info(d1.year)
+        else:
             return status.get_span_info(d1, d2)
 
     def add(self, start, stop, task=''):
@@ -219,11 +359,51 @@ class Core:
             'stop: {}'.format(prettify_datetime(stop))
         ])
 
+    def add_many(self, entries):
+        """
+        Adds time logs to the database in bulk. Expects an iterable of (start,
+        stop, task) tuples, each as the arguments of the add method. Unlike
+        calling the latter for each entry, each month file and each bucket of
+        the tasks index is written only once.
+
+        All the entries are checked before anything is written, so nothing is
+        added if one of them is invalid.
+        """
+        parser = Parser()
+        li = []
+
+        for index, (start, stop, task) in enumerate(entries, start=1):
+            try:
+                if not isinstance(start, datetime):
+                    start = parser.extract_datetime(start)
+
+                if not isinstance(stop, datetime):
+                    stop = parser.extract_datetime(stop)
+
+                if stop < start:
+                    raise ValueError('Your time interval is negative')
+            except ValueError as err:
+                raise ValueError('Entry {}: {}'.format(index, err))
+
+            li.append((start, stop, task))
+
+        count = self.db.add_many(li)
+
+        self.db.add_tasks([
+            (task, start.year, start.month) for start, _, task in li
+        ])
+
+        return 'added {} entries'.format(count)
+
     def edit(self, month):
         """
         Invokes the user's favourite text editor to open the file corresponding
         to the specified year and month.
         """
+        if self.db.NAME != 'files':
+            message = 'Editing is not supported by the {} backend'
+            raise ValueError(message.format(self.db.NAME))
+
         parser = Parser(datetime.now())
         year, month = parser.extract_month(month)
 
@@ -232,5 +412,48 @@ class Core:
             message = 'There are no logs for {}'
             raise ValueError(message.format(prettify_date(year, month)))
 
+        from stl.spawn import Spawner
+
         spawner = Spawner()
         spawner.edit(file_path)
+
+    def migrate(self, backend):
+        """
+        Copies the database into a new one of the given backend, which then
+        takes over the database dir; the old files are left as they are. For
+        now, the only backend that can be migrated to is sqlite, as the dir is
+        only served by the files backend if there is no SQLITE_FILE in it.
+        """
+        if backend != 'sqlite':
+            raise ValueError('Can only migrate to sqlite')
+
+        if self.db.NAME == backend:
+            raise ValueError('The database is already in {}'.format(backend))
+
+        if self.dir_path == MEMORY_DIR:
+            raise ValueError('Cannot migrate an in-memory database')
+
+        from stl.client import forward
+
+        if forward(self.dir_path, ['show']) is not None:
+            raise ValueError('Please stop the stl daemon first')
+
+        path = os.path.join(self.dir_path, SQLITE_FILE)
+        temp_path = '{}.{}'.format(path, os.getpid())
+
+        target = get_backend(backend)(self.dir_path, path=temp_path)
+
+        try:
+            count = copy_database(self.db, target)
+            target.close()
+            os.replace(temp_path, path)
+        except Exception:
+            target.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.db.close()
+        self.db = open_database(self.dir_path)
+
+        return 'migrated {} entries to {}'.format(count, backend)
@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import socketserver
+
+from stl.client import FORWARDED_COMMANDS, SOCKET_ENCODING
+from stl.client import forward, get_socket_path
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """
+    Handles a single connection to the daemon: reads the command-line arguments
+    sent by the client, runs them, and sends back the output.
+    """
+
+    def handle(self):
+        request = json.loads(self.rfile.read().decode(SOCKET_ENCODING))
+        output = self.server.run(request['args'])
+
+        response = json.dumps({'output': output})
+        self.wfile.write(response.encode(SOCKET_ENCODING))
+
+
+class Daemon(socketserver.UnixStreamServer):
+    """
+    Serves the commands forwarded by the stl clients over a Unix domain socket
+    in the database dir. All commands are run by the same Core instance, the
+    Database of which keeps the months and rollups in memory; thus, after the
+    first command only the month files' stats are checked.
+
+    The commands are run one at a time, in the order they arrive.
+    """
+
+    def __init__(self, core, cli):
+        """
+        Constructor. Expects the Core instance to run the commands with and the
+        Cli instance to parse them with. Raises ValueError if another daemon is
+        already serving the database dir.
+        """
+        self.log = logging.getLogger(__name__)
+        self.core = core
+        self.cli = cli
+
+        path = get_socket_path(core.dir_path)
+
+        if os.path.exists(path):
+            if forward(core.dir_path, ['show']) is not None:
+                raise ValueError('The stl daemon is already running')
+            os.remove(path)
+
+        super().__init__(path, DaemonHandler)
+
+        self.log.info('Listening on {}'.format(path))
+
+    def server_bind(self):
+        """
+        Binds the socket and makes it only accessible by the user. The umask
+        is set for the binding, so that the socket is never accessible by
+        others, not even before the chmod.
+        """
+        umask = os.umask(0o077)
+
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+        os.chmod(self.server_address, 0o600)
+
+    def server_close(self):
+        """
+        Closes the socket and removes its file.
+        """
+        super().server_close()
+
+        try:
+            os.remove(self.server_address)
+        except OSError as err:
+            self.log.debug(str(err))
+
+    def run(self, raw_args):
+        """
+        Runs the given command-line arguments and returns the output as a
+        string; the lines of machine-readable output are joined, as the
+        response is sent in one go. The Cli.run errors are handled by the
+        latter, those raised while generating the lines as main does.
+        """
+        try:
+            args = self.cli.parse_args(raw_args)
+        except SystemExit:
+            return 'Could not parse the arguments: {}'.format(raw_args)
+
+        if args.command not in FORWARDED_COMMANDS:
+            return 'The stl daemon does not run {}'.format(args.command)
+
+        output = self.cli.run(raw_args, core=self.core)
+
+        if output is None or isinstance(output, str):
+            return output
+
+        try:
+            return '\n'.join(output)
+        except ValueError as err:
+            return str(err)
@@ -1,9 +1,20 @@
 import csv
 
 from datetime import datetime
+from itertools import repeat
 
+import io
 import logging
 import os
+import re
+import sys
+import zlib
+
+from stl.cache import MonthCache, get_stat_key
+from stl.entries import Journal, Manifest, MonthLog, OffsetIndex, Rollup
+from stl.entries import MINUTES_PER_DAY
+from stl.entries import decode_stamp, encode_stamp, merge_totals
+from stl.stats import Counters
 
 
 """
@@ -17,6 +28,84 @@ ARCHIVE_DT_FORMAT = '%Y-%m-%d %H:%M'
 ARCHIVE_DT_FORMAT_LEN = 16
 
 
+"""
+The encoding of the database files and the pattern that the raw bytes of an
+archive log file line have to match in order to start a new log entry; lines
+not matching it are continuations of quoted multi-line task names. The second
+pattern finds the starts of the entries in the raw bytes of a whole file.
+"""
+ENCODING = 'utf-8'
+ARCHIVE_LINE_RE = re.compile(rb'\d{4}-\d\d-\d\d \d\d:\d\d\t')
+ARCHIVE_ENTRY_RE = re.compile(rb'^' + ARCHIVE_LINE_RE.pattern, re.MULTILINE)
+
+
+"""
+The pattern a string has to fully match in order to be decoded by slicing
+instead of by strptime; i.e. either CURRENT_DT_FORMAT or ARCHIVE_DT_FORMAT with
+all the fields zero-padded to their full width.
+"""
+STAMP_RE = re.compile(
+        r'[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}(:[0-9]{2})?\Z')
+STAMP_LEN = {
+    CURRENT_DT_FORMAT: CURRENT_DT_FORMAT_LEN,
+    ARCHIVE_DT_FORMAT: ARCHIVE_DT_FORMAT_LEN
+}
+
+
+def parse_stamp(s, dt_format=ARCHIVE_DT_FORMAT):
+    """
+    Returns the naive datetime instance represented by the given string, which
+    should be in the given str(f|p)time format, one of the two above. Raises
+    ValueError if unsuccessful.
+
+    As the database formats are fixed-width, the fields are sliced out and
+    converted directly; strptime is only used as a fallback for strings that
+    do not strictly follow the format, e.g. if a file has been edited by hand.
+    """
+    if len(s) == STAMP_LEN[dt_format] and STAMP_RE.match(s):
+        return datetime(int(s[:4]), int(s[5:7]), int(s[8:10]),
+                        int(s[11:13]), int(s[14:16]), int(s[17:] or 0))
+
+    return datetime.strptime(s, dt_format)
+
+
+"""
+The dir holding the tasks index, i.e. the months in which each task has been
+worked on. The tasks are distributed among TASKS_BUCKETS files by the hash of
+their names. TASKS_FILE is the single-file index of older stl versions.
+"""
+TASKS_DIR = 'tasks.d'
+TASKS_FILE = 'tasks'
+TASKS_BUCKETS = 256
+
+
+"""
+The storage backends, by the name they go by in stl migrate --to: the module
+and the class of each, imported on demand. A database dir that contains
+SQLITE_FILE is served by the sqlite backend; otherwise by the files one. The
+memory backend is used instead of a dir if the latter's path is MEMORY_DIR.
+"""
+BACKENDS = {
+    'files': ('stl.db', 'Database'),
+    'sqlite': ('stl.sqlite', 'SqliteDatabase'),
+    'memory': ('stl.memory', 'MemoryDatabase')
+}
+SQLITE_FILE = 'stl.sqlite3'
+MEMORY_DIR = ':memory:'
+
+
+def iter_months(start, end):
+    """
+    Generates the (year, month) tuples from the month of the given date (or
+    datetime) instance to that of the other, inclusive.
+    """
+    year, month = start.year, start.month
+
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
 class DatabaseError(ValueError):
     """
     Raised when writing or retrieving data files.
@@ -24,22 +113,30 @@ class DatabaseError(ValueError):
     pass
 
 
-class Database:
+class BaseDatabase:
     """
-    Handles adding and retrieving log entries. There are two types of log
-    entries depending on whether the task is stopped (archive) or not
-    (current). There can be only one current log entry at a time and it is kept
-    in a single file named `current`. The archive log entries are kept
-    separately, one file per month, grouped in directories by year.
+    The interface of the storage backends. There are two types of log entries
+    depending on whether the task is stopped (archive) or not (current); there
+    can be only one current log entry at a time. The tasks index keeps track
+    of the months in which each task has been worked on.
+
+    Subclasses have to implement the methods raising NotImplementedError. The
+    rest, e.g. the span queries and the totals, are built on top of these and
+    can be overridden where the backend can answer them faster.
     """
 
-    def __init__(self, dir_path):
+    """
+    The name of the backend, as used by stl migrate --to; see BACKENDS.
+    """
+    NAME = None
+
+    def __init__(self, stats_callback=None):
         """
-        Constructor. The path should lead to a directory at stl's disposal for
-        creating and editing files in.
+        Constructor. The stats_callback, if given, is called with the name and
+        value of each update of the instance's counters (see stats).
         """
         self.log = logging.getLogger(__name__)
-        self.dir_path = dir_path
+        self.counters = Counters(stats_callback)
 
     def _sanitise_text(self, text):
         """
@@ -48,6 +145,463 @@ class Database:
         """
         return text.replace('\0', '').strip()
 
+    def stats(self):
+        """
+        Returns a {name: value} snapshot of the counters of the work done so
+        far, e.g. files opened, bytes read, cache hits; see stl.stats.NAMES.
+        """
+        return self.counters.snapshot()
+
+    def close(self):
+        """
+        Releases the resources held by the backend, if any.
+        """
+        pass
+
+    """
+    Methods handling the current log
+    """
+    def add_current(self, stamp, task=''):
+        """
+        Creates a new current log entry, overwriting the existing one, if such.
+        Expects a datetime instance with the time of starting the task. The
+        task argument is optional.
+        """
+        raise NotImplementedError
+
+    def get_current(self, delete=False):
+        """
+        Returns {stamp, task} of the current log entry or None if there is not
+        such. The entry will be removed from the database if the delete flag
+        is set.
+        """
+        raise NotImplementedError
+
+    """
+    Methods handling the archive logs
+    """
+    def add_complete(self, start, stop, task='', append=True):
+        """
+        Creates a new archive log entry. Expects two datetime instances, for
+        when work on the task started and stopped, respectively. The task
+        argument is optional. The append flag is a hint that the entry is the
+        latest one, which some backends can add faster.
+        """
+        raise NotImplementedError
+
+    def add_many(self, entries):
+        """
+        Creates archive log entries in bulk. Expects an iterable of (start,
+        stop, task) tuples, each as the arguments of add_complete. Returns the
+        number of entries added.
+        """
+        count = 0
+
+        for start, stop, task in entries:
+            self.add_complete(start, stop, task, append=False)
+            count += 1
+
+        return count
+
+    def get_month(self, year, month):
+        """
+        Returns a MonthLog, i.e. a compact sequence of {start, stop, task}, for
+        the archive log entries for the given month. The log is sorted by the
+        start datetime; entries with the same start keep the order they were
+        added in.
+        """
+        raise NotImplementedError
+
+    def get_month_task(self, year, month, task):
+        """
+        Returns the MonthLog of the archive log entries for the given month and
+        the given (sanitised) task, sorted by the start datetime.
+        """
+        return self.get_month(year, month).select_task(task)
+
+    def get_months(self):
+        """
+        Returns the sorted [] of (year, month) tuples for which there might be
+        archive log entries; months without such can be included.
+        """
+        raise NotImplementedError
+
+    def get_month_summary(self, year, month):
+        """
+        Returns the (count, first_start, last_start) of the archive log entries
+        for the given month, the last two being encoded stamps or None if the
+        count is zero.
+        """
+        log = self.get_month(year, month)
+
+        if not len(log):
+            return 0, None, None
+
+        return len(log), log.starts[0], log.starts[-1]
+
+    def get_bounds(self):
+        """
+        Returns the (start, start) naive datetime instances of the first and of
+        the last archive log entries or None if there are no such. Entries
+        with the same start are not told apart.
+        """
+        first, last = None, None
+        months = self.get_months()
+
+        for year, month in months:
+            first = self.get_month_summary(year, month)[1]
+            if first is not None:
+                break
+
+        for year, month in reversed(months):
+            last = self.get_month_summary(year, month)[2]
+            if last is not None:
+                break
+
+        if first is None:
+            return None
+
+        return decode_stamp(first), decode_stamp(last)
+
+    def get_month_span(self, year, month, first_day, last_day):
+        """
+        Returns the MonthLog of the archive log entries for the given month
+        that started between the given days of the month, inclusive, sorted by
+        the start datetime.
+        """
+        lo = encode_stamp(datetime(year, month, 1))
+
+        return self.get_month(year, month).select(
+                lo + (first_day - 1) * MINUTES_PER_DAY,
+                lo + last_day * MINUTES_PER_DAY)
+
+    def get_day(self, year, month, day):
+        """
+        Returns the MonthLog of {start, stop, task} for the archive log entries
+        for the given date. The log is sorted by the start datetime.
+        """
+        return self.get_month_span(year, month, day, day)
+
+    def get_year(self, year):
+        """
+        Returns the MonthLog of {start, stop, task} for the archive log entries
+        for the given year. The log is sorted by the start datetime.
+        """
+        log = MonthLog()
+
+        months = self._filter_months([(year, month) for month in range(1, 13)])
+        for month_log in self._map_months('get_month', months):
+            log.extend(month_log)
+
+        return log
+
+    def _get_span_months(self, start, end):
+        """
+        Generates the MonthLog of each month between the given date instances
+        with only the entries started between them, inclusive. Helper used by
+        get_span and iter_span.
+
+        The months in between are loaded whole, the first and the last one
+        through get_month_span, so that only the days needed can be read.
+        """
+        if start > end:
+            return
+
+        first, last = (start.year, start.month), (end.year, end.month)
+        months = self._filter_months(iter_months(start, end))
+
+        head = months[:1] if months[:1] == [first] else []
+        tail = months[-1:] if months[-1:] == [last] and first != last else []
+
+        for year, month in head:
+            yield self.get_month_span(year, month, start.day,
+                                      end.day if first == last else 31)
+
+        middle = months[len(head):len(months) - len(tail)]
+        yield from self._map_months('get_month', middle)
+
+        for year, month in tail:
+            yield self.get_month_span(year, month, 1, end.day)
+
+    def get_span(self, start, end):
+        """
+        Returns the MonthLog of {start, stop, task} for the archive log entries
+        started between the points in time specified by the given date
+        instances, inclusive. The log is sorted by the start datetime.
+        """
+        log = MonthLog()
+
+        for month_log in self._get_span_months(start, end):
+            log.extend(month_log)
+
+        return log
+
+    def _filter_months(self, months):
+        """
+        Returns the [] of those of the given (year, month) tuples for which
+        there might be archive log entries, in the same order. Backends that
+        can tell which months are empty without querying them override this.
+        """
+        return list(months)
+
+    def _map_months(self, name, months, *args):
+        """
+        Generates the results of calling the method with the given name, e.g.
+        get_month or get_rollup, for each of the given [] of (year, month)
+        tuples, in the same order. The extra args, if any, are passed on after
+        the year and the month.
+        """
+        func = getattr(self, name)
+        for year, month in months:
+            yield func(year, month, *args)
+
+    """
+    Generators yielding the archive log entries one month at a time
+    """
+    def iter_month(self, year, month):
+        """
+        Generates the archive log entries for the given month, sorted by the
+        start datetime; the same holds for the two methods below.
+        """
+        yield from self.get_month(year, month)
+
+    def iter_span(self, start, end):
+        """
+        Generates the archive log entries started between the given date
+        instances, inclusive.
+        """
+        for month_log in self._get_span_months(start, end):
+            yield from month_log
+
+    def iter_task(self, task):
+        """
+        Generates the archive log entries for the given task.
+        """
+        task = self._sanitise_text(task)
+
+        months = sorted(self.get_task(task))
+        for month_log in self._map_months('get_month_task', months, task):
+            yield from month_log
+
+    """
+    Methods handling the rollups, i.e. the per-month totals
+    """
+    def get_rollup(self, year, month):
+        """
+        Returns the Rollup of the archive log entries for the given month.
+        """
+        return Rollup.from_log(self.get_month(year, month))
+
+    def get_totals(self, start, end):
+        """
+        Returns the {task: [minutes, first_start]} totals of the archive log
+        entries started between the given date instances, inclusive. The empty
+        task holds the entries without one and first_start is an encoded stamp.
+
+        Months covered in full contribute their per-task totals, the first and
+        last months might contribute only some of their per-day totals.
+        """
+        return self.get_totals_many([(start, end)])[0]
+
+    def get_totals_many(self, spans):
+        """
+        Returns the [] of totals, as returned by get_totals, for each of the
+        given (start, end) tuples of date instances, in the same order. The
+        rollup of each month is loaded only once, however many of the spans
+        cover it.
+        """
+        months = sorted({(year, month) for start, end in spans
+                         for year, month in iter_months(start, end)})
+        months = self._filter_months(months)
+
+        rollups = dict(zip(months, self._map_months('get_rollup', months)))
+
+        return [self._sum_rollups(rollups, start, end) for start, end in spans]
+
+    def _sum_rollups(self, rollups, start, end):
+        """
+        Returns the totals of the entries started between the given date
+        instances, inclusive, from the given {(year, month): Rollup} dict.
+        Months missing from the latter are taken to have no entries. Helper
+        for get_totals_many.
+        """
+        totals = {}
+
+        for year, month in iter_months(start, end):
+            if (year, month) not in rollups:
+                continue
+
+            first_day, last_day = 1, 31
+            if (year, month) == (start.year, start.month):
+                first_day = start.day
+            if (year, month) == (end.year, end.month):
+                last_day = end.day
+
+            merge_totals(totals, rollups[(year, month)].get_totals(
+                first_day, last_day))
+
+        return totals
+
+    def get_task_totals(self, task):
+        """
+        Returns the [minutes, first_start, last_start, last_stop] totals of the
+        archive log entries for the given task, the last three being encoded
+        stamps, or None if there are no such entries.
+        """
+        task = self._sanitise_text(task)
+        totals = None
+
+        months = sorted(self.get_task(task))
+        for rollup in self._map_months('get_rollup', months):
+            item = rollup.tasks.get(task)
+
+            if item is None:
+                continue
+            elif totals is None:
+                totals = list(item)
+            else:
+                totals[0] += item[0]
+                totals[1] = min(totals[1], item[1])
+                if item[2] >= totals[2]:
+                    totals[2], totals[3] = item[2], item[3]
+
+        return totals
+
+    """
+    Methods handling the tasks index
+    """
+    def add_task(self, task, year, month):
+        """
+        Adds an entry in the tasks index for the given task for the given year
+        and month. The index is unchanged if the (task, year, month) tuple is
+        already recorded; otherwise, only the bucket of the task is rewritten.
+        """
+        if not len(self._sanitise_text(task)):
+            raise ValueError('Task cannot be an empty string')
+
+        self.add_tasks([(task, year, month)])
+
+    def add_tasks(self, items):
+        """
+        Adds entries in the tasks index for the given (task, year, month)
+        tuples, skipping those with an empty task and those already recorded.
+        """
+        raise NotImplementedError
+
+    def get_task(self, task):
+        """
+        Returns the [] of (year, month) tuples for which the given task has
+        archive log entries, in the order they were added to the index.
+        """
+        raise NotImplementedError
+
+    def check_month_tasks(self, year, month):
+        """
+        Ensures that the tasks index contains the given month for all the
+        tasks that are worked on during that month.
+
+        Does not ensure (yet) that the tasks index does not include a task
+        pointing to the given month which task is not in the given month's
+        archive file.
+        """
+        tasks = set([item['task'] for item in self.get_month(year, month)
+                     if item['task']])
+
+        for task in sorted(tasks):
+            months = self.get_task(task)
+            if len(months) and (year, month) not in months:
+                self.add_task(task, year, month)
+
+        self.log.debug('Checked tasks for {}-{:02}'.format(year, month))
+
+
+class Database(BaseDatabase):
+    """
+    The default backend, which keeps the data in plain text files. The current
+    log entry is kept in a single file named `current`. The archive log entries
+    are kept separately, one file per month, grouped in directories by year.
+    """
+
+    NAME = 'files'
+
+    def __init__(self, dir_path, workers=1, processes=False,
+                 keep_in_memory=False, stats_callback=None):
+        """
+        Constructor. The path should lead to a directory at stl's disposal for
+        creating and editing files in.
+
+        The workers arg sets how many months can be loaded concurrently by the
+        queries spanning several months. The workers are threads, which only
+        overlap the file reads, unless the processes flag is set; then they are
+        processes, which also parse the month files in parallel, at the price
+        of starting them anew for each query. The keep_in_memory flag is
+        passed on to the MonthCache and is meant for long-running processes.
+
+        The stats_callback, if given, is called with the name and value of each
+        update of the instance's counters (see stats); the counters of worker
+        processes are not collected.
+        """
+        super().__init__(stats_callback)
+
+        self.dir_path = dir_path
+        self.workers = max(workers, 1)
+        self.processes = processes
+        self.cache = MonthCache(dir_path, keep_in_memory, self.counters)
+        self.manifest = None
+        self._manifest_changed = False
+        self._tasks_checked = False
+
+    def _read_file(self, path):
+        """
+        Returns the [] of csv-read rows of the given database file. The file is
+        read in full first, so that the time spent reading it and the time
+        spent parsing it are counted separately.
+        """
+        return self._parse_rows(self._read_raw(path))
+
+    def _read_raw(self, path):
+        """
+        Returns the raw bytes of the given database file.
+        """
+        with self.counters.timed('io_time'):
+            with open(path, 'rb') as f:
+                raw = f.read()
+
+        self.counters.add('files_opened')
+        self.counters.add('bytes_read', len(raw))
+
+        return raw
+
+    def _parse_rows(self, raw):
+        """
+        Returns the [] of csv-read rows of the given raw database file bytes.
+        """
+        with self.counters.timed('parse_time'):
+            rows = list(csv.reader(
+                io.StringIO(raw.decode(ENCODING), newline=''), delimiter='\t'))
+
+        self.counters.add('rows_parsed', len(rows))
+
+        return rows
+
+    def _write_file(self, path, rows):
+        """
+        Writes the given [] of rows, each a [] of str, to the given database
+        file, replacing its contents.
+        """
+        buf = io.StringIO()
+        writer = csv.writer(buf, delimiter='\t')
+        writer.writerows(rows)
+        data = buf.getvalue().encode(ENCODING)
+
+        with self.counters.timed('io_time'):
+            with open(path, 'wb') as f:
+                f.write(data)
+
+        self.counters.add('files_opened')
+        self.counters.add('bytes_written', len(data))
+        self.counters.add('rows_written', len(rows))
+
     """
     Methods handling the current log
     """
@@ -65,9 +619,7 @@ class Database:
             self._sanitise_text(task)
         ]
 
-        with open(path, 'w', newline='') as f:
-            writer = csv.writer(f, delimiter='\t')
-            writer.writerow(entry)
+        self._write_file(path, [entry])
 
         self.log.debug('Added an open log entry: '+str(entry))
 
@@ -83,12 +635,7 @@ class Database:
             return None
 
         entry = {'stamp': None, 'task': None}
-        lines = []
-
-        with open(path, 'r', newline='') as f:
-            reader = csv.reader(f, delimiter='\t')
-            for line in reader:
-                lines.append(line)
+        lines = self._read_file(path)
 
         if len(lines) == 0:
             return None
@@ -97,7 +644,7 @@ class Database:
             raise DatabaseError('Multiple current log entries found')
 
         try:
-            entry['stamp'] = datetime.strptime(lines[0][0], CURRENT_DT_FORMAT)
+            entry['stamp'] = parse_stamp(lines[0][0], CURRENT_DT_FORMAT)
         except ValueError as err:
             self.log.error(str(err))
             raise DatabaseError('Could not read the current db file')
@@ -105,8 +652,7 @@ class Database:
         entry['task'] = lines[0][1] if lines[0][1] else ''
 
         if delete:
-            with open(path, 'w', newline='') as f:
-                pass
+            self._write_file(path, [])
             self.log.debug('Deleted contents of the current db file')
 
         return entry
@@ -134,33 +680,70 @@ class Database:
 
     def _read_entry(self, line):
         """
-        De-serialises a raw archive log file line and returns {start, stop,
-        task}, the first two being naive datetime instances.
+        De-serialises a raw archive log file line and returns a (start, stop,
+        task) tuple, the first two being naive datetime instances.
         """
         try:
             assert len(line) == 3
-            start = datetime.strptime(line[0], ARCHIVE_DT_FORMAT)
-            stop = datetime.strptime(line[1], ARCHIVE_DT_FORMAT)
+            start = parse_stamp(line[0])
+            stop = parse_stamp(line[1])
             task = str(line[2])
         except (AssertionError, ValueError) as err:
             self.log.error(str(err))
             raise ValueError
 
-        return {'start': start, 'stop': stop, 'task': task}
+        return start, stop, task
 
-    def _sort_lines(self, lines):
+    def _write_line(self, line):
         """
-        Returns the given [] of archive log file lines but sorted by the start
-        datetime. Note that the method expects and returns [] of [] of str.
+        Returns the given [] of str serialised as a raw archive log file line,
+        i.e. csv-encoded bytes including the line terminator.
         """
-        def sort_key_func(item):
-            try:
-                return datetime.strptime(item[0], ARCHIVE_DT_FORMAT)
-            except ValueError as err:
-                self.log.error(str(err))
-                raise ValueError
+        buf = io.StringIO()
+        writer = csv.writer(buf, delimiter='\t')
+        writer.writerow(line)
+
+        return buf.getvalue().encode(ENCODING)
 
-        return list(sorted(lines, key=sort_key_func))
+    def _seek_entry(self, f, pos):
+        """
+        Moves the given binary archive log file to the beginning of the first
+        log entry found at or after the given byte position and returns the
+        offset of the latter. If there is no such entry, this is the file size.
+        """
+        if pos > 0:
+            f.seek(pos - 1)
+            f.readline()
+        else:
+            f.seek(0)
+
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line or ARCHIVE_LINE_RE.match(line):
+                f.seek(offset)
+                return offset
+
+    def _bisect_file(self, f, key):
+        """
+        Returns the byte offset of the first log entry in the given binary
+        archive log file (or file-like object) which starts after the given
+        key, the latter being an ARCHIVE_DT_FORMAT bytes string. The file is
+        expected to be sorted; if it is not, the position is still valid, just
+        not necessarily sorted.
+        """
+        lo, hi = 0, f.seek(0, os.SEEK_END)
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self._seek_entry(f, mid)
+            line = f.readline()
+            if line and line[:ARCHIVE_DT_FORMAT_LEN] <= key:
+                lo = offset + len(line)
+            else:
+                hi = mid
+
+        return self._seek_entry(f, lo)
 
     def add_complete(self, start, stop, task='', append=True):
         """
@@ -169,7 +752,15 @@ class Database:
         argument is optional.
 
         If append is True, then the new entry is appended to the end of the
-        respective db file. Otherwise, it is sorted into the right place.
+        respective db file. Otherwise, it is sorted into the right place: the
+        latter is bisected for and only the part of the file following it is
+        rewritten; unless the file has quotes, in which case it is merged with
+        the entry at the csv level, see _write_entry_line.
+
+        Rather than the month's rollup, indexes, and summary in the manifest,
+        only its journal is updated with the new entry; the former are brought
+        up to date when read, see _get_cached. A new month file is added to
+        the manifest right away.
         """
         entry = [
             start.strftime(ARCHIVE_DT_FORMAT).zfill(ARCHIVE_DT_FORMAT_LEN),
@@ -178,168 +769,808 @@ class Database:
         ]
 
         path = self.get_path(start.year, start.month, create=True)
-        data = []
+        line = self._write_line(entry)
 
-        if os.path.exists(path):
-            with open(path, 'r', newline='') as f:
-                reader = csv.reader(f, delimiter='\t')
-                for line in reader:
-                    data.append(line)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
 
-        data.append(entry)
+        if stat is not None:
+            journal = self.cache.get_journal(start.year, start.month, stat)
+            if journal is None:
+                journal = Journal(get_stat_key(stat))
+
+        res = self._write_entry_line(path, line, append)
+
+        if res is None:
+            self._merge_month(start.year, start.month,
+                              [(start, stop, entry[2])])
+            self.log.debug('Added log entry: '+str(entry))
+            return
+
+        self.cache.invalidate(start.year, start.month)
+
+        if stat is None:
+            stamp = encode_stamp(start)
+            self._update_manifest(start.year, start.month, os.stat(path),
+                                  [1, stamp, stamp])
+        else:
+            stat = os.stat(path)
+            journal.add(get_stat_key(stat), encode_stamp(start),
+                        encode_stamp(stop), entry[2], *res)
+            self.cache.put_journal(start.year, start.month, stat, journal)
+
+        self.log.debug('Added log entry: '+str(entry))
 
-        if not append:
+    def _write_entry_line(self, path, line, append):
+        """
+        Writes the given raw archive log line to the given file, creating the
+        latter if missing: at its end if append is set, or else sorted into
+        its place, the part of the file following it being written back after
+        it. Returns the byte offset of the entry and the number of bytes
+        written before the part following it.
+
+        Returns None instead, writing nothing, if append is not set and the
+        file contains quotes: bisecting tells the entries apart by the raw
+        lines, which the continuation lines of quoted multi-line tasks can
+        look like.
+        """
+        # in append mode the file is created if missing but all the writes go
+        # to its end, hence the tail is truncated and written back after line
+        with self.counters.timed('io_time'), open(path, 'a+b') as f:
+            if append:
+                offset = f.seek(0, os.SEEK_END)
+                if offset > 0:
+                    f.seek(offset - 1)
+                    prev = f.read(1)
+                tail = b''
+            else:
+                f.seek(0)
+                raw = f.read()
+
+                if b'"' in raw:
+                    offset = None
+                else:
+                    offset = self._bisect_file(
+                            io.BytesIO(raw), line[:ARCHIVE_DT_FORMAT_LEN])
+                    prev = raw[offset - 1:offset]
+                    tail = raw[offset:]
+
+            if offset is not None:
+                if offset > 0 and prev != b'\n':
+                    line = b'\n' + line
+
+                if tail:
+                    f.truncate(offset)
+
+                f.write(line + tail)
+
+        self.counters.add('files_opened')
+
+        if offset is None:
+            self.counters.add('bytes_read', len(raw))
+            return None
+
+        self.counters.add('bytes_read', len(tail))
+        self.counters.add('bytes_written', len(line + tail))
+        self.counters.add('rows_written')
+
+        if line.startswith(b'\n'):
+            return offset + 1, len(line)
+
+        return offset, len(line)
+
+    def _merge_month(self, year, month, entries):
+        """
+        Merges the given [] of (start, stop, task) tuples into the archive log
+        file for the given month, which is rewritten once, sorted; its rollup
+        and its summary in the manifest are updated. Helper used by add_many;
+        the tasks are expected to be sanitised.
+        """
+        path = self.get_path(year, month, create=True)
+
+        try:
+            rollup = self._get_cached(year, month, os.stat(path), 'rollup')
+        except FileNotFoundError:
+            rollup = Rollup()
+            rows = []
+        else:
+            rows = self._read_file(path)
+
+        for start, stop, task in entries:
+            rows.append([
+                start.strftime(ARCHIVE_DT_FORMAT).zfill(ARCHIVE_DT_FORMAT_LEN),
+                stop.strftime(ARCHIVE_DT_FORMAT).zfill(ARCHIVE_DT_FORMAT_LEN),
+                task
+            ])
+
+        try:
+            rows = sorted(rows, key=lambda row: parse_stamp(row[0]))
+        except (IndexError, ValueError):
+            message = 'Could not read the file for {}.{}'
+            raise DatabaseError(message.format(year, month))
+
+        temp_path = '{}.{}'.format(path, os.getpid())
+
+        self._write_file(temp_path, rows)
+        os.replace(temp_path, path)
+
+        self.cache.invalidate(year, month)
+
+        stat = os.stat(path)
+
+        if rollup is not None:
+            for start, stop, task in entries:
+                rollup.add(encode_stamp(start), encode_stamp(stop), task)
+            self.cache.put_rollup(year, month, stat, rollup)
+
+        self._update_manifest(year, month, stat, [
+            len(rows),
+            encode_stamp(parse_stamp(rows[0][0])),
+            encode_stamp(parse_stamp(rows[-1][0]))])
+
+    def add_many(self, entries):
+        """
+        Creates archive log entries in bulk. Expects an iterable of (start,
+        stop, task) tuples, each as the arguments of add_complete. The entries
+        are grouped by month and each month file is merged with its group and
+        rewritten only once, keeping it sorted.
+
+        Returns the number of entries added.
+        """
+        months = {}  # (year, month): [(start, stop, task)]
+
+        for start, stop, task in entries:
+            months.setdefault((start.year, start.month), []).append(
+                (start, stop, self._sanitise_text(task)))
+
+        for (year, month), li in sorted(months.items()):
+            self._merge_month(year, month, li)
+            self.log.debug('Added {} log entries to {}-{:02}'.format(
+                len(li), year, month))
+
+        return sum([len(li) for li in months.values()])
+
+    def _read_month(self, path, year, month):
+        """
+        Reads and de-serialises the given archive log file. Returns a MonthLog
+        with the entries sorted by the start datetime and the task and day
+        OffsetIndex instances of the file or, if the entries' offsets cannot
+        be told, two Nones.
+        """
+        raw = self._read_raw(path)
+        lines = self._parse_rows(raw)
+
+        with self.counters.timed('parse_time'):
+            rows = self._read_entries(lines, year, month)
+
+            log = MonthLog()
+            for start, stop, task in sorted(rows, key=lambda row: row[0]):
+                log.append(start, stop, task)
+
+            offsets = [m.start() for m in ARCHIVE_ENTRY_RE.finditer(raw)]
+
+            if len(offsets) == len(rows):
+                task_index, day_index = OffsetIndex(), OffsetIndex()
+                for offset, (start, _, task) in zip(offsets, rows):
+                    task_index.add(task, offset)
+                    day_index.add(start.day, offset)
+            else:
+                task_index, day_index = None, None
+
+        return log, task_index, day_index
+
+    def _read_entries(self, lines, year, month):
+        """
+        Returns the [] of (start, stop, task) tuples de-serialised from the
+        given csv-read lines of the archive log file for the given month.
+        """
+        rows = []
+
+        for line in lines:
             try:
-                data = self._sort_lines(data)
+                rows.append(self._read_entry(line))
             except ValueError:
                 message = 'Could not read the file for {}.{}'
-                raise DatabaseError(message.format(start.year, start.month))
+                raise DatabaseError(message.format(year, month))
 
-        with open(path, 'w', newline='') as f:
-            writer = csv.writer(f, delimiter='\t')
-            for line in data:
-                writer.writerow(line)
+        return rows
 
-        self.log.debug('Added log entry: '+str(entry))
+    def _read_entries_at(self, path, offsets, year, month, check):
+        """
+        Reads only the archive log entries at the given byte offsets of the
+        given file. Returns these as a MonthLog sorted by the start datetime or
+        None if the check function returns False for any of their (start,
+        stop, task) tuples, i.e. if the offsets are not right.
+        """
+        chunks = []
+
+        with self.counters.timed('io_time'), open(path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                chunk = f.readline()
+
+                # the continuation lines of a multi-line task
+                while True:
+                    line = f.readline()
+                    if not line or ARCHIVE_LINE_RE.match(line):
+                        break
+                    chunk += line
+
+                chunks.append(chunk)
+
+        raw = b''.join(chunks)
+
+        self.counters.add('files_opened')
+        self.counters.add('bytes_read', len(raw))
+
+        try:
+            lines = self._parse_rows(raw)
+        except UnicodeDecodeError:
+            return None
+
+        if len(lines) != len(offsets):
+            return None
+
+        with self.counters.timed('parse_time'):
+            try:
+                rows = self._read_entries(lines, year, month)
+            except DatabaseError:
+                return None
+
+            if not all(check(row) for row in rows):
+                return None
+
+            log = MonthLog()
+            for start, stop, task in sorted(rows, key=lambda row: row[0]):
+                log.append(start, stop, task)
+
+        return log
 
     def get_month(self, year, month):
         """
-        Returns the [] of {start, stop, task} for the archive log entries for
-        the given month. The [] is sorted by the start datetime.
+        Returns a MonthLog, i.e. a compact sequence of {start, stop, task}, for
+        the archive log entries for the given month. The log is sorted by the
+        start datetime.
+
+        The month file is only parsed if it has changed since it was last
+        cached; otherwise, the entries are loaded from the cache.
         """
         path = self.get_path(year, month)
 
-        if not os.path.exists(path):
-            return []
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return MonthLog()
 
-        li = []
+        log = self.cache.get(year, month, stat)
 
-        with open(path, newline='') as f:
-            reader = csv.reader(f, delimiter='\t')
-            for line in reader:
-                try:
-                    entry = self._read_entry(line)
-                except ValueError:
-                    message = 'Could not read the file for {}.{}'
-                    raise DatabaseError(message.format(year, month))
-                else:
-                    li.append(entry)
+        if log is None:
+            log = self._load_month(path, year, month, stat)
 
-        return list(sorted(li, key=lambda d: d['start']))
+        return log
 
-    def get_day(self, year, month, day):
+    def _load_month(self, path, year, month, stat):
         """
-        Returns the [] of {start, stop, task} for the archive log entries for
-        the given date. The [] is sorted by the start datetime.
+        Reads the given archive log file and caches its entries and its task
+        and day indexes. Returns the former. Helper for get_month and the
+        methods reading parts of a month.
         """
-        return list(filter(lambda d: d['start'].day == day,
-                           self.get_month(year, month)))
+        log, task_index, day_index = self._read_month(path, year, month)
 
-    def get_year(self, year):
+        self.cache.put(year, month, stat, log)
+        if task_index is not None:
+            self.cache.put_task_index(year, month, stat, task_index)
+            self.cache.put_day_index(year, month, stat, day_index)
+
+        return log
+
+    def get_month_task(self, year, month, task):
         """
-        Returns the [] of {start, stop, task} for the archive log entries for
-        the given year. The [] is sorted by the start datetime.
+        Returns the MonthLog of the archive log entries for the given month and
+        the given (sanitised) task, sorted by the start datetime.
+
+        If the month's entries are not cached but its task index is, e.g. right
+        after add_complete, only the entries of the task are read.
         """
-        return [item
-                for month in range(1, 13)
-                for item in self.get_month(year, month)]
+        path = self.get_path(year, month)
 
-    def get_span(self, start, end):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return MonthLog()
+
+        log = self.cache.get(year, month, stat)
+
+        if log is None:
+            index = self._get_cached(year, month, stat, 'tasks')
+
+            if index is not None:
+                log = self._read_entries_at(
+                        path, index.get(task), year, month,
+                        lambda row: row[2] == task)
+                if log is not None:
+                    return log
+
+            log = self._load_month(path, year, month, stat)
+
+        return log.select_task(task)
+
+    def get_month_span(self, year, month, first_day, last_day):
         """
-        Returns the [] of {start, stop, task} for the archive log entries
-        started between the points in time specified by the given date
-        instances, inclusive. The [] is sorted by the start datetime.
+        Returns the MonthLog of the archive log entries for the given month
+        that started between the given days of the month, inclusive, sorted by
+        the start datetime.
+
+        If the month's entries are not cached but its day index is, e.g. right
+        after add_complete, only the entries of these days are read.
         """
-        if start.year == end.year and start.month == end.month:
-            return [log for log in self.get_month(start.year, start.month)
-                    if log['start'].date() >= start
-                    and log['start'].date() <= end]
+        if first_day <= 1 and last_day >= 31:
+            return self.get_month(year, month)
 
-        logs = [log for log in self.get_month(start.year, start.month)
-                if log['start'].date() >= start]
+        path = self.get_path(year, month)
 
-        year, month = int(start.year), int(start.month)
-        while True:
-            month += 1
-            if month > 12:
-                month = 1
-                year += 1
-            if year == end.year and month == end.month:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return MonthLog()
+
+        lo = encode_stamp(datetime(year, month, 1))
+        lo, hi = (lo + (first_day - 1) * MINUTES_PER_DAY,
+                  lo + last_day * MINUTES_PER_DAY)
+
+        log = self.cache.get(year, month, stat)
+
+        if log is None:
+            index = self._get_cached(year, month, stat, 'days')
+
+            if index is not None:
+                days = range(first_day, last_day + 1)
+                log = self._read_entries_at(
+                        path, index.get_many(days), year, month,
+                        lambda row: lo <= encode_stamp(row[0]) < hi)
+                if log is not None:
+                    return log
+
+            log = self._load_month(path, year, month, stat)
+
+        return log.select(lo, hi)
+
+    def get_months(self):
+        """
+        Returns the sorted [] of (year, month) tuples for which there are month
+        files, as per the manifest.
+        """
+        manifest = self._get_manifest()
+        months = []
+
+        for year in sorted(manifest.years):
+            for month in sorted(self._get_year_months(manifest, year)):
+                months.append((year, month))
+
+        self._save_manifest()
+
+        return months
+
+    def _map_months(self, name, months, *args):
+        """
+        Generates the results of calling the method with the given name, e.g.
+        get_month or get_rollup, for each of the given [] of (year, month)
+        tuples, in the same order, passing on the extra args. The months are
+        loaded concurrently if there is more than one worker; see the
+        constructor.
+        """
+        if self.workers == 1 or len(months) <= 1:
+            yield from super()._map_months(name, months, *args)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        years = [year for year, _ in months]
+        months = [month for _, month in months]
+        workers = min(self.workers, len(months))
+        args = [repeat(arg) for arg in args]
+
+        if self.processes:
+            with ProcessPoolExecutor(workers) as executor:
+                yield from executor.map(_call_month_method,
+                                        repeat(self.dir_path), repeat(name),
+                                        years, months, *args)
+        else:
+            with ThreadPoolExecutor(workers) as executor:
+                yield from executor.map(getattr(self, name), years, months,
+                                        *args)
+
+    """
+    Methods handling the manifest, i.e. the summary of the month files
+    """
+    def _get_manifest(self):
+        """
+        Returns the Manifest of the database, first bringing its years up to
+        date with the database dir if the latter has changed; the year dirs
+        are only checked when their months are needed, see _get_year_months.
+        """
+        key = get_stat_key(os.stat(self.dir_path))
+
+        if self.manifest is None:
+            self.manifest = self.cache.get_manifest() or Manifest()
+
+        if self.manifest.key != key:
+            years = {}
+
+            with os.scandir(self.dir_path) as entries:
+                for entry in entries:
+                    if entry.name.isdigit() and entry.is_dir():
+                        year = int(entry.name)
+                        years[year] = self.manifest.years.get(year, [None, {}])
+
+            self.manifest.key, self.manifest.years = key, years
+            self._manifest_changed = True
+
+        return self.manifest
+
+    def _get_year_months(self, manifest, year):
+        """
+        Returns the {month: summary} dict of the given year of the given
+        Manifest, first bringing it up to date with the year dir if the latter
+        has changed. Years that are not in the manifest are not looked for.
+        """
+        if year not in manifest.years:
+            return {}
+
+        item = manifest.years[year]
+        year_dir = os.path.join(self.dir_path, str(year).zfill(4))
+
+        try:
+            key = get_stat_key(os.stat(year_dir))
+        except FileNotFoundError:
+            del manifest.years[year]
+            self._manifest_changed = True
+            return {}
+
+        if item[0] != key:
+            months = {}
+
+            for name in os.listdir(year_dir):
+                if name.isdigit() and 1 <= int(name) <= 12:
+                    months[int(name)] = item[1].get(int(name))
+
+            item[0], item[1] = key, months
+            self._manifest_changed = True
+
+        return item[1]
+
+    def _save_manifest(self):
+        """
+        Caches the manifest if it has changed since it was last cached.
+        """
+        if self._manifest_changed:
+            self.cache.put_manifest(self.manifest)
+            self._manifest_changed = False
+
+    def _filter_months(self, months):
+        """
+        Returns the [] of those of the given (year, month) tuples for which
+        there are month files, in the same order. Only the dirs of the years
+        in the manifest are stat-ed, the month files themselves are not.
+        """
+        manifest = self._get_manifest()
+        years = {}  # year: {month: summary}
+
+        li = []
+        for year, month in months:
+            if year not in years:
+                years[year] = self._get_year_months(manifest, year)
+            if month in years[year]:
+                li.append((year, month))
+
+        self._save_manifest()
+
+        return li
+
+    def get_month_summary(self, year, month):
+        """
+        Returns the (count, first_start, last_start) of the archive log entries
+        for the given month, the last two being encoded stamps or None if the
+        count is zero. The summary is taken from the manifest, unless the month
+        file has changed since.
+        """
+        try:
+            stat = os.stat(self.get_path(year, month))
+        except FileNotFoundError:
+            return 0, None, None
+
+        summary = self._get_manifest_summary(year, month, stat)
+
+        if summary is None:
+            summary = list(super().get_month_summary(year, month))
+            self._update_manifest(year, month, stat, summary)
+
+        return tuple(summary)
+
+    def get_bounds(self):
+        """
+        Returns the (start, start) naive datetime instances of the first and of
+        the last archive log entries or None if there are no such. Only the
+        years at the two ends are checked against the file system, so this is
+        independent of the size of the database.
+        """
+        manifest = self._get_manifest()
+        years = sorted(manifest.years)
+        first, last = None, None
+
+        for year in years:
+            for month in sorted(self._get_year_months(manifest, year)):
+                first = self.get_month_summary(year, month)[1]
+                if first is not None:
+                    break
+            if first is not None:
+                break
+
+        for year in reversed(years):
+            for month in sorted(self._get_year_months(manifest, year),
+                                reverse=True):
+                last = self.get_month_summary(year, month)[2]
+                if last is not None:
+                    break
+            if last is not None:
                 break
-            logs.extend(self.get_month(year, month))
 
-        logs.extend([log for log in self.get_month(end.year, end.month)
-                    if log['start'].date() <= end])
+        self._save_manifest()
+
+        if first is None:
+            return None
+
+        return decode_stamp(first), decode_stamp(last)
+
+    def _get_manifest_summary(self, year, month, stat):
+        """
+        Returns the [count, first_start, last_start] summary of the given month
+        in the manifest if it is up to date with the given os.stat_result of
+        the month file, or None otherwise. A summary that predates entries
+        added since is brought up to date through the month's journal.
+        """
+        months = self._get_year_months(self._get_manifest(), year)
+        item = months.get(month)
+
+        if item is None:
+            return None
+
+        if item[0] == get_stat_key(stat):
+            return item[1:]
+
+        journal = self.cache.get_journal(year, month, stat)
+        entries = None if journal is None else journal.get_since(item[0])
+
+        if entries is None:
+            return None
+
+        count, first, last = item[1:]
+
+        for _, start, _, _, _, _ in entries:
+            count += 1
+            first = start if first is None else min(first, start)
+            last = start if last is None else max(last, start)
+
+        self._update_manifest(year, month, stat, [count, first, last])
+
+        return [count, first, last]
+
+    def _update_manifest(self, year, month, stat, summary):
+        """
+        Records the given [count, first_start, last_start] summary of the
+        given month in the manifest, along with the os.stat_result of the
+        month file it is up to date with, and caches the manifest. Helper for
+        the methods writing the month files.
+
+        The year is added to the manifest if it is not there yet, as its dir
+        might have just been created without the database dir's mtime ticking
+        over on file systems with coarse timestamps.
+        """
+        manifest = self._get_manifest()
+        manifest.years.setdefault(year, [None, {}])
+
+        months = self._get_year_months(manifest, year)
+        months[month] = [get_stat_key(stat)] + summary
 
-        return logs
+        self._manifest_changed = True
+        self._save_manifest()
 
     """
-    Methods handling the tasks file
+    Methods handling the rollups, i.e. the per-month totals
     """
-    def _read_tasks_file(self, path):
+    def get_rollup(self, year, month):
+        """
+        Returns the Rollup of the archive log entries for the given month. It
+        is only rebuilt from the entries if the month file has changed since
+        the rollup was last updated.
+        """
+        path = self.get_path(year, month)
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return Rollup()
+
+        rollup = self._get_cached(year, month, stat, 'rollup')
+
+        if rollup is None:
+            rollup = Rollup.from_log(self.get_month(year, month))
+            self.cache.put_rollup(year, month, stat, rollup)
+
+        return rollup
+
+    def _get_cached(self, year, month, stat, kind):
+        """
+        Returns the Rollup or the task or day OffsetIndex, as per the given
+        kind (see stl.cache.KINDS), cached for the given month and up to date
+        with the given os.stat_result of the month file, or None if there is
+        not such. If the cached object predates entries added since, these are
+        applied to it from the month's journal; it is only cached anew once
+        it lags enough entries behind (see stl.cache.JOURNAL_LAG).
+        """
+        item = self.cache.get_since(year, month, kind, stat)
+        if item is None:
+            return None
+
+        obj, entries = item
+        if not entries:
+            return obj
+
+        for _, start, stop, task, offset, size in entries:
+            if kind == 'rollup':
+                obj.add(start, stop, task)
+            elif kind == 'tasks':
+                obj.insert(task, offset, size)
+            else:
+                obj.insert(decode_stamp(start).day, offset, size)
+
+        self.cache.put_since(year, month, kind, stat, obj, len(entries))
+
+        return obj
+
+    """
+    Methods handling the tasks index
+    """
+    def _get_bucket_path(self, task):
         """
-        Returns a [] of the csv-read lines of the given tasks file. Helper used
-        by add_task, get_task, and check_month_tasks.
+        Returns the path to the task index bucket file that holds the line for
+        the given (sanitised) task.
         """
-        lines = []
+        bucket = zlib.crc32(task.encode(ENCODING)) % TASKS_BUCKETS
+        return os.path.join(self.dir_path, TASKS_DIR, '{:02x}'.format(bucket))
 
+    def _read_tasks_file(self, path):
+        """
+        Returns a [] of the csv-read lines of the given tasks file, i.e. either
+        a task index bucket or a tasks file of older stl versions. Helper used
+        by add_task, get_task, and _migrate_tasks_file.
+        """
         if os.path.exists(path):
-            with open(path, newline='') as f:
-                reader = csv.reader(f, delimiter='\t')
-                for line in reader:
-                    lines.append(line)
+            return self._read_file(path)
 
-        return lines
+        return []
 
-    def add_task(self, task, year, month):
+    def _write_tasks_file(self, path, lines):
         """
-        Adds an entry in the tasks file for the given task for the given year
-        and month. The file is unchanged if the (task, year, month) tuple is
-        already recorded.
+        Replaces the given task index bucket file with one containing the given
+        [] of [task, months] lines. The bucket is first written in full to a
+        temporary file, so that readers never see a half-written one.
         """
-        task = self._sanitise_text(task)
-        if not len(task):
-            raise ValueError('Task cannot be an empty string')
+        temp_path = '{}.{}'.format(path, os.getpid())
 
-        s = '{}-{:02}'.format(year, month)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_file(temp_path, lines)
+            os.replace(temp_path, path)
+        except OSError as err:
+            self.log.error(str(err))
+            raise DatabaseError('Could not write tasks file')
 
-        path = os.path.join(self.dir_path, 'tasks')
-        lines = self._read_tasks_file(path)
-        entry = [line[1] for line in lines if line[0] == task]
+    def _migrate_tasks_file(self):
+        """
+        Ensures that the task index dir exists. If there is a tasks file left
+        by an older stl version, its lines are distributed among the buckets
+        of the new index and the file is removed.
+        """
+        if self._tasks_checked:
+            return
 
-        if len(entry) == 0:
-            lines.append([task, s])
-            lines = sorted(lines, key=lambda x: x[0])
-        elif len(entry) == 1:
-            li = entry[0].split(',')
-            if s in li:
-                return
-
-            li.append(s)
-            lines = [
-                [line[0], ','.join(li) if line[0] == task else line[1]]
-                for line in lines
-            ]
-        else:
-            raise DatabaseError('Multiple entries for task {}'.format(task))
+        dir_path = os.path.join(self.dir_path, TASKS_DIR)
+        file_path = os.path.join(self.dir_path, TASKS_FILE)
+
+        if not os.path.exists(dir_path):
+            buckets = {}
+            for line in self._read_tasks_file(file_path):
+                path = self._get_bucket_path(line[0])
+                buckets.setdefault(path, []).append(line)
+
+            temp_path = '{}.{}'.format(dir_path, os.getpid())
+
+            try:
+                os.mkdir(temp_path)
+                for path, lines in buckets.items():
+                    self._write_tasks_file(os.path.join(
+                        temp_path, os.path.basename(path)), lines)
+                os.rename(temp_path, dir_path)
+            except OSError as err:
+                import shutil
+                shutil.rmtree(temp_path, ignore_errors=True)
+                if not os.path.exists(dir_path):
+                    self.log.error(str(err))
+                    raise DatabaseError('Could not create tasks index')
+            else:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                    self.log.debug('Migrated the tasks file to '+dir_path)
+
+        self._tasks_checked = True
+
+    def add_tasks(self, items):
+        """
+        Adds entries in the tasks index for the given (task, year, month)
+        tuples, skipping those with an empty task. Each bucket concerned is
+        read and rewritten at most once, regardless of the number of tuples.
+        """
+        buckets = {}  # path: {task: [YYYY-MM]}
+
+        for task, year, month in items:
+            task = self._sanitise_text(task)
+            if not len(task):
+                continue
+
+            s = '{}-{:02}'.format(year, month)
+            path = self._get_bucket_path(task)
+            months = buckets.setdefault(path, {}).setdefault(task, [])
+            if s not in months:
+                months.append(s)
+
+        self._migrate_tasks_file()
+
+        for path, tasks in buckets.items():
+            lines = self._read_tasks_file(path)
+            seen = set()
+            changed = False
 
-        with open(path, 'w', newline='') as f:
-            writer = csv.writer(f, delimiter='\t')
             for line in lines:
-                writer.writerow(line)
+                if line[0] not in tasks:
+                    continue
+                elif line[0] in seen:
+                    message = 'Multiple entries for task {}'
+                    raise DatabaseError(message.format(line[0]))
+
+                seen.add(line[0])
+
+                li = line[1].split(',')
+                new = [s for s in tasks[line[0]] if s not in li]
+                if len(new):
+                    line[1] = ','.join(li + new)
+                    changed = True
+
+            for task, months in tasks.items():
+                if task not in seen:
+                    lines.append([task, ','.join(months)])
+                    changed = True
 
-        self.log.debug('Added time entry for task {}: {}'.format(task, entry))
+            if changed:
+                lines = sorted(lines, key=lambda x: x[0])
+                self._write_tasks_file(path, lines)
+
+            self.log.debug('Added time entries for tasks: {}'.format(tasks))
 
     def get_task(self, task):
         """
         Returns the [] of (year, month) tuples for which the given task has
-        archive log entries.
+        archive log entries. Only the bucket of the task is read.
         """
         task = self._sanitise_text(task)
         if not len(task):
             raise ValueError('Task cannot be an empty string')
 
-        path = os.path.join(self.dir_path, 'tasks')
+        self._migrate_tasks_file()
+
+        path = self._get_bucket_path(task)
         lines = self._read_tasks_file(path)
         entry = [line[1] for line in lines if line[0] == task]
 
@@ -355,41 +1586,71 @@ class Database:
             try:
                 item = item.split('-')
                 item = tuple([int(item[0]), int(item[1])])
-            except (KeyError, ValueError) as err:
+            except (IndexError, ValueError) as err:
                 self.log.error(str(err))
                 raise DatabaseError('Could not read tasks file')
             li.append(item)
 
         return li
 
-    def check_month_tasks(self, year, month):
-        """
-        Ensures that the tasks file contains the given month for all the tasks
-        that are worked on during that month.
 
-        Does not ensure (yet) that the tasks file does not include a task
-        pointing to the given month which task is not in the given month's
-        archive file.
-        """
-        s = '{}-{:02}'.format(year, month)
+def _call_month_method(dir_path, name, year, month, *args):
+    """
+    Returns the result of the Database method with the given name for the
+    given month of the database in the given dir, passing on the extra args.
+    Run by the worker processes of Database._map_months, hence module-level.
+    """
+    return getattr(Database(dir_path), name)(year, month, *args)
 
-        tasks = [item['task'] for item in self.get_month(year, month)
-                 if item['task']]
 
-        lines = self._read_tasks_file(os.path.join(self.dir_path, 'tasks'))
+def copy_database(source, target):
+    """
+    Copies the log entries of the given database into the other one, a month
+    at a time, along with the current log entry. The tasks index of the target
+    is rebuilt from the entries. Returns the number of entries copied.
+    """
+    count = 0
 
-        mods = []
+    for year, month in source.get_months():
+        log = source.get_month(year, month)
 
-        for task in tasks:
-            try:
-                line = [line for line in lines if line[0] == task][0][1]
-            except IndexError:
-                continue
+        count += target.add_many([
+            (entry.start, entry.stop, entry.task) for entry in log])
+        target.add_tasks([(task, year, month) for task in log.tasks])
+
+    curr = source.get_current()
+    if curr is not None:
+        target.add_current(curr['stamp'], curr['task'])
 
-            if line.find(s) < 0:
-                mods.append(task)
+    return count
 
-        for mod in mods:
-            self.add_task(mod, year, month)
 
-        self.log.debug('Checked tasks for {}'.format(s))
+def get_backend(name):
+    """
+    Returns the BaseDatabase subclass of the backend with the given name; see
+    BACKENDS. Raises ValueError if there is no such backend.
+    """
+    try:
+        module_name, class_name = BACKENDS[name]
+    except KeyError:
+        raise ValueError('Unknown backend: {}'.format(name))
+
+    __import__(module_name)
+    return getattr(sys.modules[module_name], class_name)
+
+
+def open_database(dir_path, backend=None, **kwargs):
+    """
+    Returns an instance of the backend with the given name or, if None, of the
+    one serving the given database dir, passing on the keyword args to its
+    constructor.
+    """
+    if backend is None:
+        if dir_path == MEMORY_DIR:
+            backend = 'memory'
+        elif os.path.exists(os.path.join(dir_path, SQLITE_FILE)):
+            backend = 'sqlite'
+        else:
+            backend = 'files'
+
+    return get_backend(backend)(dir_path, **kwargs)
@@ -0,0 +1,545 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+
+
+"""
+The point in time the archive log stamps are counted from, in minutes. The
+archive log files have minute precision, so nothing is lost.
+"""
+EPOCH = datetime(1, 1, 1)
+MINUTE = timedelta(minutes=1)
+MINUTES_PER_DAY = 24 * 60
+
+
+"""
+How many of the latest entries added to a month file its Journal keeps.
+"""
+JOURNAL_SIZE = 64
+
+
+def encode_stamp(dt):
+    """
+    Returns the number of whole minutes between EPOCH and the given naive
+    datetime instance.
+    """
+    return (dt - EPOCH) // MINUTE
+
+
+def decode_stamp(minutes):
+    """
+    Returns the naive datetime instance that is the given number of minutes
+    after EPOCH; the inverse of encode_stamp.
+    """
+    return EPOCH + timedelta(minutes=minutes)
+
+
+class LogEntry:
+    """
+    A single archive log entry. Can be accessed both through attributes and
+    as a read-only {start, stop, task} dict, start and stop being naive
+    datetime instances. These are only decoded when accessed.
+    """
+
+    __slots__ = ('_start', '_stop', 'task')
+
+    KEYS = ('start', 'stop', 'task')
+
+    def __init__(self, start, stop, task):
+        """
+        Constructor. Expects the start and stop as encoded by encode_stamp.
+        """
+        self._start = start
+        self._stop = stop
+        self.task = task
+
+    @property
+    def start(self):
+        return decode_stamp(self._start)
+
+    @property
+    def stop(self):
+        return decode_stamp(self._stop)
+
+    @property
+    def duration(self):
+        """
+        The timedelta between the start and the stop, computed without
+        decoding any of them.
+        """
+        return timedelta(minutes=self._stop - self._start)
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def keys(self):
+        return list(self.KEYS)
+
+    def items(self):
+        return [(key, self[key]) for key in self.KEYS]
+
+    def get(self, key, default=None):
+        return self[key] if key in self.KEYS else default
+
+    def __eq__(self, other):
+        if isinstance(other, LogEntry):
+            return ((self._start, self._stop, self.task)
+                    == (other._start, other._stop, other.task))
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'LogEntry({!r}, {!r}, {!r})'.format(
+            self.start, self.stop, self.task)
+
+
+class MonthLog:
+    """
+    A compact sequence of archive log entries, usually those of a month but
+    also the concatenation of several months. The starts and stops are kept
+    in arrays of encoded stamps and the task names in a list of their own,
+    each distinct name stored once and referred to by its index in the list.
+
+    Items are LogEntry instances created on access, so code expecting [] of
+    {start, stop, task} keeps working. Most methods expect the entries to be
+    sorted by their start, which is the order they are stored in.
+    """
+
+    def __init__(self):
+        """
+        Constructor. Creates an empty log; use append and extend to fill it.
+        """
+        self.starts = array('q')
+        self.stops = array('q')
+        self.task_ids = array('l')
+        self.tasks = []
+        self._task_index = {}
+
+    def _intern(self, task):
+        """
+        Returns the index of the given task name in self.tasks, adding it if
+        it is not there yet.
+        """
+        try:
+            return self._task_index[task]
+        except KeyError:
+            self._task_index[task] = len(self.tasks)
+            self.tasks.append(task)
+            return self._task_index[task]
+
+    def append_encoded(self, start, stop, task):
+        """
+        Adds an entry to the end of the log. Expects the start and stop as
+        encoded by encode_stamp.
+        """
+        self.starts.append(start)
+        self.stops.append(stop)
+        self.task_ids.append(self._intern(task))
+
+    def insert_encoded(self, start, stop, task):
+        """
+        Adds an entry after those that start before or at the same time as it,
+        keeping the log sorted. Expects the start and stop as encoded by
+        encode_stamp.
+        """
+        i = bisect_right(self.starts, start)
+
+        self.starts.insert(i, start)
+        self.stops.insert(i, stop)
+        self.task_ids.insert(i, self._intern(task))
+
+    def append(self, start, stop, task):
+        """
+        Adds an entry to the end of the log. Expects the start and stop as
+        naive datetime instances.
+        """
+        self.append_encoded(encode_stamp(start), encode_stamp(stop), task)
+
+    def extend(self, other):
+        """
+        Adds all the entries of the given MonthLog to the end of this one.
+        """
+        self.starts.extend(other.starts)
+        self.stops.extend(other.stops)
+
+        ids = [self._intern(task) for task in other.tasks]
+        self.task_ids.extend([ids[task_id] for task_id in other.task_ids])
+
+    def select(self, lo=None, hi=None):
+        """
+        Returns a new MonthLog with the entries that start in the [lo, hi)
+        interval, both ends being encoded stamps or None for unbounded. Bisects
+        for the interval, so the log should be sorted.
+        """
+        i = 0 if lo is None else bisect_left(self.starts, lo)
+        j = len(self) if hi is None else bisect_left(self.starts, hi)
+
+        return self[i:max(i, j)]
+
+    def select_task(self, task):
+        """
+        Returns a new MonthLog with only the entries for the given task.
+        """
+        log = MonthLog()
+
+        task_id = self._task_index.get(task)
+        if task_id is None:
+            return log
+
+        for i, other_id in enumerate(self.task_ids):
+            if other_id == task_id:
+                log.append_encoded(self.starts[i], self.stops[i], task)
+
+        return log
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            log = MonthLog()
+            log.starts = self.starts[index]
+            log.stops = self.stops[index]
+            log.task_ids = self.task_ids[index]
+            log.tasks = list(self.tasks)
+            log._task_index = dict(self._task_index)
+            return log
+
+        return LogEntry(self.starts[index],
+                        self.stops[index],
+                        self.tasks[self.task_ids[index]])
+
+    def __iter__(self):
+        tasks = self.tasks
+        for start, stop, task_id in zip(self.starts, self.stops,
+                                        self.task_ids):
+            yield LogEntry(start, stop, tasks[task_id])
+
+    def __eq__(self, other):
+        if isinstance(other, (MonthLog, list, tuple)):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'MonthLog({!r})'.format(list(self))
+
+    def dump(self):
+        """
+        Returns the log as a tuple of bytes and str objects, suitable for
+        marshalling; the inverse of MonthLog.load.
+        """
+        return (self.starts.tobytes(), self.stops.tobytes(),
+                self.task_ids.tobytes(), list(self.tasks))
+
+    @classmethod
+    def load(cls, data):
+        """
+        Returns a new MonthLog from a tuple as returned by MonthLog.dump.
+        """
+        starts, stops, task_ids, tasks = data
+
+        log = cls()
+        log.starts.frombytes(starts)
+        log.stops.frombytes(stops)
+        log.task_ids.frombytes(task_ids)
+        log.tasks = list(tasks)
+        log._task_index = {task: i for i, task in enumerate(log.tasks)}
+
+        if not len(log.starts) == len(log.stops) == len(log.task_ids):
+            raise ValueError('Inconsistent log data')
+
+        if len(log.task_ids) and max(log.task_ids) >= len(log.tasks):
+            raise ValueError('Inconsistent log data')
+
+        return log
+
+
+def merge_totals(totals, other):
+    """
+    Adds the given {task: [minutes, first_start]} totals to the first ones, in
+    place. The first_start of a task is kept the earliest of the two.
+    """
+    for task, (minutes, first_start) in other.items():
+        if task in totals:
+            totals[task][0] += minutes
+            totals[task][1] = min(totals[task][1], first_start)
+        else:
+            totals[task] = [minutes, first_start]
+
+
+class Rollup:
+    """
+    The totals of the archive log entries of a month, per day and per task;
+    these are enough to answer the status reports without going through the
+    entries themselves. All times are in minutes, all stamps are encoded as
+    per encode_stamp, and the empty task stands for the entries without one.
+    """
+
+    def __init__(self):
+        """
+        Constructor. Creates an empty rollup; use add to fill it.
+        """
+        self.days = {}  # day: {task: [minutes, first_start]}
+        self.tasks = {}  # task: [minutes, first_start, last_start, last_stop]
+
+    @classmethod
+    def from_log(cls, log):
+        """
+        Returns a new Rollup of the entries of the given MonthLog.
+        """
+        rollup = cls()
+
+        for start, stop, task_id in zip(log.starts, log.stops, log.task_ids):
+            rollup.add(start, stop, log.tasks[task_id])
+
+        return rollup
+
+    def add(self, start, stop, task):
+        """
+        Adds an entry to the totals. Of entries with the same start, the one
+        added last is considered the last one of its task, as it is in the
+        month file.
+        """
+        minutes = stop - start
+
+        totals = self.days.setdefault(decode_stamp(start).day, {})
+        merge_totals(totals, {task: [minutes, start]})
+
+        if task in self.tasks:
+            item = self.tasks[task]
+            item[0] += minutes
+            item[1] = min(item[1], start)
+            if start >= item[2]:
+                item[2], item[3] = start, stop
+        else:
+            self.tasks[task] = [minutes, start, start, stop]
+
+    def get_totals(self, first_day=1, last_day=31):
+        """
+        Returns the {task: [minutes, first_start]} totals of the entries that
+        started between the given days of the month, inclusive.
+        """
+        if first_day <= 1 and last_day >= 31:
+            return {task: item[:2] for task, item in self.tasks.items()}
+
+        totals = {}
+
+        for day in range(first_day, last_day + 1):
+            if day in self.days:
+                merge_totals(totals, self.days[day])
+
+        return totals
+
+    def dump(self):
+        """
+        Returns the rollup as a tuple of dicts, suitable for marshalling; the
+        inverse of Rollup.load.
+        """
+        return self.days, self.tasks
+
+    @classmethod
+    def load(cls, data):
+        """
+        Returns a new Rollup from a tuple as returned by Rollup.dump.
+        """
+        rollup = cls()
+        rollup.days, rollup.tasks = data
+
+        for item in data:
+            if not isinstance(item, dict):
+                raise ValueError('Inconsistent rollup data')
+
+        return rollup
+
+
+class OffsetIndex:
+    """
+    The byte offsets in a month file at which its archive log entries start,
+    grouped by a key, in file order; these let some of the entries be read
+    without parsing the rest of the file. The month files have a task index,
+    keyed by the task (the empty task standing for the entries without one),
+    and a day index, keyed by the day of the month of the entries' start.
+    """
+
+    def __init__(self):
+        """
+        Constructor. Creates an empty index; use add and insert to fill it.
+        """
+        self.offsets = {}  # key: [offset]
+
+    def add(self, key, offset):
+        """
+        Adds the offset of an entry that starts after all the others.
+        """
+        self.offsets.setdefault(key, []).append(offset)
+
+    def insert(self, key, offset, size):
+        """
+        Adds the offset of an entry of the given size in bytes which has been
+        inserted into the file at that offset; the offsets of the entries
+        following it are moved accordingly.
+        """
+        for offsets in self.offsets.values():
+            i = bisect_left(offsets, offset)
+            offsets[i:] = [other + size for other in offsets[i:]]
+
+        insort(self.offsets.setdefault(key, []), offset)
+
+    def get(self, key):
+        """
+        Returns the [] of offsets of the entries with the given key.
+        """
+        return self.offsets.get(key, [])
+
+    def get_many(self, keys):
+        """
+        Returns the sorted [] of offsets of the entries with any of the given
+        keys.
+        """
+        return sorted([offset for key in keys for offset in self.get(key)])
+
+    def dump(self):
+        """
+        Returns the index as a dict, suitable for marshalling; the inverse of
+        OffsetIndex.load.
+        """
+        return self.offsets
+
+    @classmethod
+    def load(cls, data):
+        """
+        Returns a new OffsetIndex from a dict as returned by OffsetIndex.dump.
+        """
+        if not isinstance(data, dict):
+            raise ValueError('Inconsistent offset index data')
+
+        for offsets in data.values():
+            if not isinstance(offsets, list):
+                raise ValueError('Inconsistent offset index data')
+
+        index = cls()
+        index.offsets = data
+
+        return index
+
+
+class Journal:
+    """
+    The archive log entries added to a month file, each with the stat key
+    (see stl.cache.get_stat_key) of the file right after it was added and its
+    byte offset and size in the file. With these, the month's rollup, indexes,
+    and summary can be brought up to date with the file from any point in the
+    journal without reading the file, so that adding an entry does not have to
+    update them all. Only the latest JOURNAL_SIZE entries are kept.
+    """
+
+    def __init__(self, key):
+        """
+        Constructor. Creates an empty journal of the month file with the given
+        stat key; use add to fill it.
+        """
+        self.key = key  # the key of the file before the first entry
+        self.entries = []  # [key, start, stop, task, offset, size]
+
+    def add(self, key, start, stop, task, offset, size):
+        """
+        Adds an entry, its stamps encoded as per encode_stamp, which has been
+        written to the file at the given offset; the key is that of the file
+        after the write.
+        """
+        self.entries.append([key, start, stop, task, offset, size])
+
+        if len(self.entries) > JOURNAL_SIZE:
+            self.key = self.entries.pop(0)[0]
+
+    def get_since(self, key):
+        """
+        Returns the [] of the entries added after the file had the given stat
+        key, in the order they were added, or None if the journal does not go
+        back that far.
+        """
+        if key == self.key:
+            return self.entries
+
+        for i, entry in enumerate(self.entries):
+            if entry[0] == key:
+                return self.entries[i + 1:]
+
+        return None
+
+    def dump(self):
+        """
+        Returns the journal as a tuple, suitable for marshalling; the inverse
+        of Journal.load.
+        """
+        return self.key, self.entries
+
+    @classmethod
+    def load(cls, data):
+        """
+        Returns a new Journal from a tuple as returned by Journal.dump.
+        """
+        key, entries = data
+
+        if not isinstance(entries, list):
+            raise ValueError('Inconsistent journal data')
+
+        for entry in entries:
+            if not (isinstance(entry, list) and len(entry) == 6):
+                raise ValueError('Inconsistent journal data')
+
+        journal = cls(key)
+        journal.entries = entries
+
+        return journal
+
+
+class Manifest:
+    """
+    The summary of the month files of a database: the years and the months
+    for which there are such and, for each month, the number of its archive
+    log entries and their first and last start, as encoded stamps. Along with
+    these, it keeps the stat keys (see stl.cache.get_stat_key) of the database
+    dir, of the year dirs, and of the month files that it is up to date with,
+    so that it can be checked against the file system; see Database. The
+    summary of a month is None until it is needed.
+    """
+
+    def __init__(self):
+        """
+        Constructor. Creates an empty manifest, up to date with nothing.
+        """
+        self.key = None
+        self.years = {}  # year: [key, {month: [key, count, first, last]}]
+
+    def dump(self):
+        """
+        Returns the manifest as a tuple, suitable for marshalling; the inverse
+        of Manifest.load.
+        """
+        return self.key, self.years
+
+    @classmethod
+    def load(cls, data):
+        """
+        Returns a new Manifest from a tuple as returned by Manifest.dump.
+        """
+        manifest = cls()
+        manifest.key, manifest.years = data
+
+        if not isinstance(manifest.years, dict):
+            raise ValueError('Inconsistent manifest data')
+
+        for item in manifest.years.values():
+            if not (isinstance(item, list) and len(item) == 2
+                    and isinstance(item[1], dict)):
+                raise ValueError('Inconsistent manifest data')
+
+        return manifest
@@ -0,0 +1,144 @@
+from stl.db import BaseDatabase
+from stl.entries import MonthLog, Rollup
+from stl.entries import encode_stamp
+
+
+class MemoryDatabase(BaseDatabase):
+    """
+    The backend keeping all the data in memory, for as long as the instance
+    lives; meant for tests and for benchmarking the code on top of the
+    database without the cost of the file system. The entries are ordered as
+    in the other backends: by their start and then by the order they were
+    added in.
+    """
+
+    NAME = 'memory'
+
+    def __init__(self, dir_path=None, workers=1, processes=False,
+                 keep_in_memory=False, stats_callback=None):
+        """
+        Constructor. The args other than stats_callback (see BaseDatabase) are
+        accepted for compatibility with the files backend and are ignored.
+        """
+        super().__init__(stats_callback)
+
+        self.dir_path = dir_path
+
+        self.current = None
+        self.months = {}  # (year, month): MonthLog
+        self.rollups = {}  # (year, month): Rollup
+        self.tasks = {}  # task: [(year, month)]
+
+    """
+    Methods handling the current log
+    """
+    def add_current(self, stamp, task=''):
+        """
+        Creates a new current log entry, replacing the existing one, if such.
+        Expects a datetime instance with the time of starting the task. The
+        task argument is optional.
+        """
+        self.current = {'stamp': stamp.replace(microsecond=0),
+                        'task': self._sanitise_text(task)}
+
+        self.log.debug('Added an open log entry: '+str(self.current))
+
+    def get_current(self, delete=False):
+        """
+        Returns {stamp, task} of the current log entry or None if there is not
+        such. The entry will be removed if the delete flag is set.
+        """
+        entry = self.current
+
+        if delete:
+            self.current = None
+
+        return None if entry is None else dict(entry)
+
+    """
+    Methods handling the archive logs
+    """
+    def add_complete(self, start, stop, task='', append=True):
+        """
+        Creates a new archive log entry. Expects two datetime instances, for
+        when work on the task started and stopped, respectively. The task
+        argument is optional; the append flag makes no difference here.
+        """
+        key = (start.year, start.month)
+
+        if key not in self.months:
+            self.months[key] = MonthLog()
+
+        self.months[key].insert_encoded(
+                encode_stamp(start), encode_stamp(stop),
+                self._sanitise_text(task))
+        self.rollups.pop(key, None)
+
+        self.counters.add('rows_written')
+
+    def get_month(self, year, month):
+        """
+        Returns a copy of the MonthLog of {start, stop, task} for the archive
+        log entries for the given month, sorted by the start datetime.
+        """
+        log = self.months.get((year, month))
+
+        if log is None:
+            return MonthLog()
+
+        self.counters.add('rows_parsed', len(log))
+
+        return log[:]
+
+    def get_months(self):
+        """
+        Returns the sorted [] of (year, month) tuples for which there are
+        archive log entries.
+        """
+        return sorted(self.months)
+
+    """
+    Methods handling the rollups, i.e. the per-month totals
+    """
+    def get_rollup(self, year, month):
+        """
+        Returns the Rollup of the archive log entries for the given month. It
+        is rebuilt after each change to the month.
+        """
+        key = (year, month)
+
+        if key not in self.rollups:
+            self.rollups[key] = Rollup.from_log(self.get_month(year, month))
+            self.counters.add('cache_misses')
+        else:
+            self.counters.add('cache_hits')
+
+        return self.rollups[key]
+
+    """
+    Methods handling the tasks index
+    """
+    def add_tasks(self, items):
+        """
+        Adds entries in the tasks index for the given (task, year, month)
+        tuples, skipping those with an empty task and those already recorded.
+        """
+        for task, year, month in items:
+            task = self._sanitise_text(task)
+            if not len(task):
+                continue
+
+            months = self.tasks.setdefault(task, [])
+            if (year, month) not in months:
+                months.append((year, month))
+
+    def get_task(self, task):
+        """
+        Returns the [] of (year, month) tuples for which the given task has
+        archive log entries, in the order they were added to the index.
+        """
+        task = self._sanitise_text(task)
+        if not len(task):
+            raise ValueError('Task cannot be an empty string')
+
+        return list(self.tasks.get(task, []))
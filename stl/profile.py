@@ -0,0 +1,268 @@
+from contextlib import contextmanager
+from types import GeneratorType
+
+import sys
+import threading
+import time
+
+import stl
+from stl.stats import format_stats
+
+
+"""
+The phases that the time of a profiled run is split into, in the order they
+are reported. The startup is the time between importing stl and parsing the
+args; the interpreter's own startup is not included.
+"""
+PHASES = ('startup', 'parse args', 'core init', 'db reads', 'db writes',
+          'aggregation', 'render')
+
+
+"""
+The (module, attribute path, phase) of the functions and methods that are timed
+in phases mode. Anything called by a command and not listed here is counted as
+aggregation. The modules are imported up front and counted as startup, except
+for those of the backends other than the files one; see Profiler._patch.
+"""
+TIMED = [
+    ('stl.core', 'Core.__init__', 'core init'),
+    ('stl.db', 'Database.get_current', 'db reads'),
+    ('stl.db', 'Database.get_month', 'db reads'),
+    ('stl.db', 'Database.get_rollup', 'db reads'),
+    ('stl.db', 'Database.get_task', 'db reads'),
+    ('stl.db', 'Database._map_months', 'db reads'),
+    ('stl.db', 'Database.add_current', 'db writes'),
+    ('stl.db', 'Database.add_complete', 'db writes'),
+    ('stl.db', 'Database.add_many', 'db writes'),
+    ('stl.db', 'Database.add_tasks', 'db writes'),
+    ('stl.sqlite', 'SqliteDatabase._select', 'db reads'),
+    ('stl.sqlite', 'SqliteDatabase._execute', 'db writes'),
+    ('stl.status', 'Status.get_current_info', 'render'),
+    ('stl.status', 'Status._get_time_info', 'render'),
+    ('stl.status', 'prettify_date', 'render'),
+    ('stl.status', 'prettify_datetime', 'render'),
+    ('stl.status', 'prettify_delta', 'render'),
+    ('stl.core', 'prettify_date', 'render'),
+    ('stl.core', 'prettify_datetime', 'render')
+]
+
+
+"""
+The file the stats are dumped to in cprofile mode, in the working dir. It can
+be inspected with python -m pstats.
+"""
+PSTATS_FILE = 'stl.pstats'
+
+
+class Profiler:
+    """
+    Runs a command with instrumentation and reports where the time went. In
+    phases mode, the functions in TIMED are temporarily wrapped so that the
+    time spent in each phase can be tallied; a phase's time does not include
+    that of the phases nested in it, e.g. a report's db reads do not count
+    towards its aggregation. In cprofile mode, the command is run under the
+    cProfile module instead.
+
+    Only the main thread is timed: with several workers, the time the main
+    thread spends waiting for them is counted towards db reads.
+    """
+
+    def __init__(self, mode, started):
+        """
+        Constructor. Expects the mode, phases or cprofile, and the
+        time.perf_counter value from before the args were parsed.
+        """
+        self.mode = mode
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.times['startup'] = started - stl.STARTED
+        self.times['parse args'] = time.perf_counter() - started
+
+        self.thread = threading.current_thread()
+        self.stack = []
+        self.since = None
+        self.patched = []
+        self.databases = []
+
+    def _switch(self, name=None):
+        """
+        Adds the time since the last switch to the phase on top of the stack
+        and then pushes the given phase or, if None, pops the top one.
+        """
+        now = time.perf_counter()
+
+        if self.stack:
+            self.times[self.stack[-1]] += now - self.since
+
+        if name is None:
+            self.stack.pop()
+        else:
+            self.stack.append(name)
+
+        self.since = now
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Context manager timing its block as the given phase.
+        """
+        self._switch(name)
+        try:
+            yield
+        finally:
+            self._switch()
+
+    def _iter_phase(self, name, gen):
+        """
+        Generates the items of the given generator, timing the production of
+        each as the given phase.
+        """
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(gen)
+                except StopIteration:
+                    return
+            yield item
+
+    def _wrap(self, func, name):
+        """
+        Returns a function that calls the given one, timing the call as the
+        given phase. Generators are timed as they are consumed.
+        """
+        def wrapper(*args, **kwargs):
+            if threading.current_thread() is not self.thread:
+                return func(*args, **kwargs)
+
+            with self.phase(name):
+                res = func(*args, **kwargs)
+
+            if isinstance(res, GeneratorType):
+                return self._iter_phase(name, res)
+
+            return res
+
+        return wrapper
+
+    def _patch_module(self, module_name):
+        """
+        Replaces the functions and methods in TIMED that belong to the given
+        module with their wrappers.
+        """
+        for other_name, path, name in TIMED:
+            if other_name != module_name:
+                continue
+
+            __import__(module_name)
+            obj = sys.modules[module_name]
+
+            *parents, attr = path.split('.')
+            for parent in parents:
+                obj = getattr(obj, parent)
+
+            func = getattr(obj, attr)
+            self.patched.append((obj, attr, func))
+            setattr(obj, attr, self._wrap(func, name))
+
+    def _patch(self):
+        """
+        Replaces the functions and methods in TIMED with their wrappers; also
+        keeps track of the database instances created, for their counters.
+        The modules of the backends other than the files one are only patched
+        when the backend is opened, so as not to import them needlessly.
+        """
+        from stl import db
+
+        backends = {module for module, _ in db.BACKENDS.values()}
+        backends.discard(db.__name__)
+
+        for module_name in dict.fromkeys(module for module, _, _ in TIMED):
+            if module_name not in backends:
+                self._patch_module(module_name)
+
+        get_backend = db.get_backend
+
+        def patch_backend(name):
+            cls = get_backend(name)
+            if cls.__module__ in backends:
+                backends.remove(cls.__module__)
+                self._patch_module(cls.__module__)
+            return cls
+
+        self.patched.append((db, 'get_backend', get_backend))
+        db.get_backend = patch_backend
+
+        init = db.BaseDatabase.__init__
+
+        def track(instance, *args, **kwargs):
+            init(instance, *args, **kwargs)
+            self.databases.append(instance)
+
+        self.patched.append((db.BaseDatabase, '__init__', init))
+        db.BaseDatabase.__init__ = track
+
+    def _unpatch(self):
+        """
+        Restores the functions and methods replaced by _patch.
+        """
+        while self.patched:
+            obj, attr, func = self.patched.pop()
+            setattr(obj, attr, func)
+
+    def run(self, func, *args):
+        """
+        Calls the given function with the given args and returns the result,
+        having written the report to stderr. If the result is an iterator of
+        lines, e.g. of stl show -f json, it is consumed within the run, so that
+        the work of generating the lines is profiled too.
+        """
+        def call():
+            res = func(*args)
+            if res is not None and not isinstance(res, str):
+                with self.phase('render'):
+                    res = list(res)
+            return res
+
+        if self.mode == 'cprofile':
+            import cProfile
+
+            profile = cProfile.Profile()
+            try:
+                res = profile.runcall(call)
+            finally:
+                profile.dump_stats(PSTATS_FILE)
+
+            sys.stderr.write('profile: written to {}\n'.format(PSTATS_FILE))
+            return res
+
+        started = time.perf_counter()
+        self._patch()
+        self.times['startup'] += time.perf_counter() - started
+
+        try:
+            with self.phase('aggregation'):
+                res = call()
+        finally:
+            self._unpatch()
+
+        sys.stderr.write(self.report() + '\n')
+        return res
+
+    def report(self):
+        """
+        Returns a human-readable string with the time spent in each phase and
+        the counters of the Database instances of the run.
+        """
+        lines = ['{:<16}{:>10.2f} ms'.format(name, self.times[name] * 1000)
+                 for name in PHASES]
+        lines.append('{:<16}{:>10.2f} ms'.format(
+            'total', sum(self.times.values()) * 1000))
+
+        counters = {}
+        for db in self.databases:
+            for key, value in db.stats().items():
+                counters[key] = counters.get(key, 0) + value
+
+        for label, value in format_stats(counters):
+            lines.append('{:<16}{:>13}'.format(label, value))
+
+        return '\n'.join('profile: ' + line for line in lines)
@@ -0,0 +1,117 @@
+from datetime import datetime
+
+import os
+import sys
+
+from stl import DIR_PATHS
+from stl.time import prettify_delta
+
+
+"""
+The str(f|p)time format of the current log file's stamp and its length, and
+the file of the sqlite backend; these should be kept in sync with stl.db,
+which is too slow to import here.
+"""
+CURRENT_DT_FORMAT = '%Y-%m-%d %H:%M:%S'
+CURRENT_DT_FORMAT_LEN = 19
+SQLITE_FILE = 'stl.sqlite3'
+
+
+def get_dir_path(args):
+    """
+    Returns the path to the database dir, either the value of the --dir option
+    in the given [] of command-line args or the default one. Returns None if
+    there is no such dir.
+    """
+    for i, arg in enumerate(args):
+        if arg == '--dir' and i + 1 < len(args):
+            return args[i + 1]
+        if arg.startswith('--dir='):
+            return arg[len('--dir='):]
+
+    for dir_path in DIR_PATHS:
+        dir_path = os.path.expanduser(dir_path)
+        if os.path.isdir(dir_path):
+            return dir_path
+
+    return None
+
+
+def get_current(dir_path):
+    """
+    Returns {stamp, task} of the current log entry or None if there is not
+    such, as Database.get_current does. The usual one-line file is split and
+    sliced by hand and the empty file, as left by stl stop, is no entry;
+    anything else, e.g. a quoted task name, is left to the Database. So are
+    the databases of the sqlite backend.
+    """
+    if os.path.exists(os.path.join(dir_path, SQLITE_FILE)):
+        from stl.db import open_database
+        return open_database(dir_path).get_current()
+
+    path = os.path.join(dir_path, 'current')
+
+    try:
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return None
+
+    if not content.strip():
+        return None
+
+    s, _, task = content.rstrip('\r\n').partition('\t')
+
+    try:
+        if '"' in content or '\n' in task or '\r' in task:
+            raise ValueError
+        if len(s) != CURRENT_DT_FORMAT_LEN:
+            raise ValueError
+
+        stamp = datetime(int(s[:4]), int(s[5:7]), int(s[8:10]),
+                         int(s[11:13]), int(s[14:16]), int(s[17:]))
+    except ValueError:
+        from stl.db import Database
+        return Database(dir_path).get_current()
+
+    return {'stamp': stamp, 'task': task}
+
+
+def get_current_info(dir_path, now):
+    """
+    Returns the same human-readable string as Status.get_current_info, i.e. as
+    `stl show` without further arguments.
+    """
+    curr = get_current(dir_path) if dir_path else None
+    if curr is None:
+        return 'nothing to see here'
+
+    li = []
+
+    if curr['task']:
+        li.append('task: {}'.format(curr['task']))
+
+    delta = now - curr['stamp']
+
+    li.append('started: {}'.format(curr['stamp']))
+    li.append('elapsed: {}'.format(prettify_delta(delta)))
+
+    return '\n'.join(li)
+
+
+def main():
+    """
+    The entry point for the stl-prompt command as registered in pyproject.toml.
+    Prints what `stl show` would but only imports what it needs for that, so
+    that it can be called from shell prompts and status bars without lag.
+    """
+    try:
+        res = get_current_info(get_dir_path(sys.argv[1:]), datetime.now())
+    except ValueError as err:
+        res = str(err)
+
+    print(res)
+
+
+if __name__ == '__main__':
+    main()
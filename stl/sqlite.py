@@ -0,0 +1,381 @@
+from datetime import date, datetime, time
+
+import os
+import sqlite3
+
+from stl.db import ARCHIVE_DT_FORMAT, ARCHIVE_DT_FORMAT_LEN
+from stl.db import CURRENT_DT_FORMAT, CURRENT_DT_FORMAT_LEN
+from stl.db import SQLITE_FILE
+from stl.db import BaseDatabase, DatabaseError
+from stl.db import iter_months, parse_stamp
+from stl.entries import MonthLog
+from stl.entries import MINUTES_PER_DAY
+from stl.entries import decode_stamp, encode_stamp
+
+
+"""
+The tables and indexes of the database, created if missing whenever it is
+opened. The starts and stops of the archive log entries are stamps encoded as
+per encode_stamp, so that the span queries are range scans of the start index
+and the task queries of the (task, start) one. The entries with the same start
+are ordered by rowid, i.e. in the order they were added.
+"""
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    start INTEGER NOT NULL,
+    stop INTEGER NOT NULL,
+    task TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_start ON entries (start);
+CREATE INDEX IF NOT EXISTS entries_task ON entries (task, start);
+
+CREATE TABLE IF NOT EXISTS current (
+    stamp TEXT NOT NULL,
+    task TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    task TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    UNIQUE (task, year, month)
+);
+'''
+
+
+def get_month_range(year, month):
+    """
+    Returns the [lo, hi) interval of encoded stamps spanning the given month.
+    """
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    return (encode_stamp(datetime(year, month, 1)),
+            encode_stamp(datetime(next_year, next_month, 1)))
+
+
+class SqliteDatabase(BaseDatabase):
+    """
+    The backend keeping all the data in a single SQLite database, SQLITE_FILE
+    in the database dir; see SCHEMA. Unlike the files backend, it answers the
+    span, task, and totals queries with indexed range scans, without loading
+    whole months.
+    """
+
+    NAME = 'sqlite'
+
+    def __init__(self, dir_path, workers=1, processes=False,
+                 keep_in_memory=False, stats_callback=None, path=None):
+        """
+        Constructor. The database is created if it does not exist yet; the path
+        arg overrides its default location in the given dir.
+
+        The workers, processes, and keep_in_memory args are accepted for
+        compatibility with the files backend and are ignored. The
+        stats_callback is as in BaseDatabase.
+        """
+        super().__init__(stats_callback)
+
+        self.dir_path = dir_path
+
+        if path is None:
+            path = os.path.join(dir_path, SQLITE_FILE)
+
+        self.path = path
+
+        try:
+            self.conn = sqlite3.connect(self.path)
+            self.conn.executescript(SCHEMA)
+        except sqlite3.Error as err:
+            self.log.error(str(err))
+            raise DatabaseError('Could not open {}'.format(self.path))
+
+        self.counters.add('files_opened')
+
+    def close(self):
+        """
+        Closes the connection to the database.
+        """
+        self.conn.close()
+
+    def _select(self, sql, params=()):
+        """
+        Returns the [] of rows returned by the given query.
+        """
+        try:
+            with self.counters.timed('io_time'):
+                rows = self.conn.execute(sql, params).fetchall()
+        except sqlite3.Error as err:
+            self.log.error(str(err))
+            raise DatabaseError('Could not read the database')
+
+        self.counters.add('rows_parsed', len(rows))
+
+        return rows
+
+    def _execute(self, *statements):
+        """
+        Runs the given (sql, [] of params) statements in a single transaction,
+        each statement once for each of its params.
+        """
+        count = 0
+
+        try:
+            with self.counters.timed('io_time'), self.conn:
+                for sql, li in statements:
+                    count += self.conn.executemany(sql, li).rowcount
+        except sqlite3.Error as err:
+            self.log.error(str(err))
+            raise DatabaseError('Could not write to the database')
+
+        self.counters.add('rows_written', count)
+
+    def _select_log(self, where, params):
+        """
+        Returns the MonthLog of the archive log entries matching the given
+        WHERE clause, sorted by their start and then by the order they were
+        added in.
+        """
+        rows = self._select(
+                'SELECT start, stop, task FROM entries WHERE {} '
+                'ORDER BY start, rowid'.format(where), params)
+
+        log = MonthLog()
+
+        with self.counters.timed('parse_time'):
+            for start, stop, task in rows:
+                log.append_encoded(start, stop, task)
+
+        return log
+
+    """
+    Methods handling the current log
+    """
+    def add_current(self, stamp, task=''):
+        """
+        Creates a new current log entry, replacing the existing one, if such.
+        Expects a datetime instance with the time of starting the task. The
+        task argument is optional.
+        """
+        entry = [
+            stamp.strftime(CURRENT_DT_FORMAT).zfill(CURRENT_DT_FORMAT_LEN),
+            self._sanitise_text(task)
+        ]
+
+        self._execute(('DELETE FROM current', [()]),
+                      ('INSERT INTO current VALUES (?, ?)', [entry]))
+
+        self.log.debug('Added an open log entry: '+str(entry))
+
+    def get_current(self, delete=False):
+        """
+        Returns {stamp, task} of the current log entry or None if there is not
+        such. The entry will be removed from the database if the delete flag
+        is set.
+        """
+        rows = self._select('SELECT stamp, task FROM current')
+
+        if len(rows) == 0:
+            return None
+
+        if len(rows) > 1:
+            raise DatabaseError('Multiple current log entries found')
+
+        try:
+            stamp = parse_stamp(rows[0][0], CURRENT_DT_FORMAT)
+        except ValueError as err:
+            self.log.error(str(err))
+            raise DatabaseError('Could not read the current log entry')
+
+        if delete:
+            self._execute(('DELETE FROM current', [()]))
+            self.log.debug('Deleted the current log entry')
+
+        return {'stamp': stamp, 'task': rows[0][1]}
+
+    """
+    Methods handling the archive logs
+    """
+    def add_complete(self, start, stop, task='', append=True):
+        """
+        Creates a new archive log entry. Expects two datetime instances, for
+        when work on the task started and stopped, respectively. The task
+        argument is optional; the append flag makes no difference here.
+        """
+        self.add_many([(start, stop, task)])
+
+        self.log.debug('Added log entry: '+str([
+            start.strftime(ARCHIVE_DT_FORMAT).zfill(ARCHIVE_DT_FORMAT_LEN),
+            stop.strftime(ARCHIVE_DT_FORMAT).zfill(ARCHIVE_DT_FORMAT_LEN),
+            self._sanitise_text(task)
+        ]))
+
+    def add_many(self, entries):
+        """
+        Creates archive log entries in bulk, in a single transaction. Expects
+        an iterable of (start, stop, task) tuples, each as the arguments of
+        add_complete. Returns the number of entries added.
+        """
+        rows = [(encode_stamp(start), encode_stamp(stop),
+                 self._sanitise_text(task)) for start, stop, task in entries]
+
+        self._execute(('INSERT INTO entries VALUES (?, ?, ?)', rows))
+
+        return len(rows)
+
+    def get_month(self, year, month):
+        """
+        Returns the MonthLog of {start, stop, task} for the archive log entries
+        for the given month, sorted by the start datetime.
+        """
+        return self._select_log('start >= ? AND start < ?',
+                                get_month_range(year, month))
+
+    def get_months(self):
+        """
+        Returns the sorted [] of (year, month) tuples from the month of the
+        first archive log entry to that of the last one.
+        """
+        lo, hi = self._select('SELECT MIN(start), MAX(start) FROM entries')[0]
+
+        if lo is None:
+            return []
+
+        return list(iter_months(decode_stamp(lo), decode_stamp(hi)))
+
+    def get_month_summary(self, year, month):
+        """
+        Returns the (count, first_start, last_start) of the archive log entries
+        for the given month, the last two being encoded stamps or None if the
+        count is zero.
+        """
+        rows = self._select(
+                'SELECT COUNT(*), MIN(start), MAX(start) FROM entries '
+                'WHERE start >= ? AND start < ?', get_month_range(year, month))
+
+        return tuple(rows[0])
+
+    def get_bounds(self):
+        """
+        Returns the (start, start) naive datetime instances of the first and of
+        the last archive log entries or None if there are no such.
+        """
+        lo, hi = self._select('SELECT MIN(start), MAX(start) FROM entries')[0]
+
+        if lo is None:
+            return None
+
+        return decode_stamp(lo), decode_stamp(hi)
+
+    def get_day(self, year, month, day):
+        """
+        Returns the MonthLog of {start, stop, task} for the archive log entries
+        for the given date, sorted by the start datetime.
+        """
+        return self.get_span(date(year, month, day), date(year, month, day))
+
+    def get_year(self, year):
+        """
+        Returns the MonthLog of {start, stop, task} for the archive log entries
+        for the given year, sorted by the start datetime.
+        """
+        return self.get_span(date(year, 1, 1), date(year, 12, 31))
+
+    def get_span(self, start, end):
+        """
+        Returns the MonthLog of {start, stop, task} for the archive log entries
+        started between the given date instances, inclusive, sorted by the
+        start datetime.
+        """
+        lo = encode_stamp(datetime.combine(start, time()))
+        hi = encode_stamp(datetime.combine(end, time())) + MINUTES_PER_DAY
+
+        return self._select_log('start >= ? AND start < ?', (lo, hi))
+
+    def iter_task(self, task):
+        """
+        Generates the archive log entries for the given task, sorted by the
+        start datetime.
+        """
+        task = self._sanitise_text(task)
+        yield from self._select_log('task = ?', (task,))
+
+    """
+    Methods handling the totals
+    """
+    def get_totals(self, start, end):
+        """
+        Returns the {task: [minutes, first_start]} totals of the archive log
+        entries started between the given date instances, inclusive, as the
+        files backend does; the totals are summed up by SQLite.
+        """
+        lo = encode_stamp(datetime.combine(start, time()))
+        hi = encode_stamp(datetime.combine(end, time())) + MINUTES_PER_DAY
+
+        rows = self._select(
+                'SELECT task, SUM(stop - start), MIN(start) FROM entries '
+                'WHERE start >= ? AND start < ? GROUP BY task', (lo, hi))
+
+        return {task: [minutes, first_start]
+                for task, minutes, first_start in rows}
+
+    def get_totals_many(self, spans):
+        """
+        Returns the [] of totals, as returned by get_totals, for each of the
+        given (start, end) tuples of date instances, in the same order; each
+        of these is summed up by SQLite on its own.
+        """
+        return [self.get_totals(start, end) for start, end in spans]
+
+    def get_task_totals(self, task):
+        """
+        Returns the [minutes, first_start, last_start, last_stop] totals of the
+        archive log entries for the given task, the last three being encoded
+        stamps, or None if there are no such entries.
+        """
+        task = self._sanitise_text(task)
+
+        minutes, first_start = self._select(
+                'SELECT SUM(stop - start), MIN(start) FROM entries '
+                'WHERE task = ?', (task,))[0]
+
+        if minutes is None:
+            return None
+
+        last_start, last_stop = self._select(
+                'SELECT start, stop FROM entries WHERE task = ? '
+                'ORDER BY start DESC, rowid DESC LIMIT 1', (task,))[0]
+
+        return [minutes, first_start, last_start, last_stop]
+
+    """
+    Methods handling the tasks index
+    """
+    def add_tasks(self, items):
+        """
+        Adds entries in the tasks index for the given (task, year, month)
+        tuples, skipping those with an empty task and those already recorded.
+        """
+        rows = []
+
+        for task, year, month in items:
+            task = self._sanitise_text(task)
+            if len(task):
+                rows.append((task, year, month))
+
+        self._execute(('INSERT OR IGNORE INTO tasks VALUES (?, ?, ?)', rows))
+
+        self.log.debug('Added time entries for tasks: {}'.format(rows))
+
+    def get_task(self, task):
+        """
+        Returns the [] of (year, month) tuples for which the given task has
+        archive log entries, in the order they were added to the index.
+        """
+        task = self._sanitise_text(task)
+        if not len(task):
+            raise ValueError('Task cannot be an empty string')
+
+        rows = self._select('SELECT year, month FROM tasks WHERE task = ? '
+                            'ORDER BY rowid', (task,))
+
+        return [tuple(row) for row in rows]
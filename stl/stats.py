@@ -0,0 +1,91 @@
+from contextlib import contextmanager
+
+import threading
+import time
+
+
+"""
+The counters kept by a Counters instance. Those in TIMES hold the seconds
+spent reading and writing files (io) and de-serialising their contents (parse),
+the rest are plain tallies; a cache hit is a MonthLog or Rollup served from the
+cache, a miss one that had to be rebuilt.
+"""
+NAMES = ('files_opened', 'bytes_read', 'bytes_written', 'rows_parsed',
+         'rows_written', 'cache_hits', 'cache_misses', 'io_time', 'parse_time')
+TIMES = ('io_time', 'parse_time')
+
+
+def format_stats(stats):
+    """
+    Returns a [] of (label, value) str tuples for the given {name: value} dict
+    of counters, as returned by Counters.snapshot, in the order of NAMES.
+    """
+    li = []
+
+    for name in NAMES:
+        if name not in stats:
+            continue
+
+        if name in TIMES:
+            value = '{:.2f} ms'.format(stats[name] * 1000)
+        else:
+            value = str(stats[name])
+
+        li.append((name.replace('_', ' '), value))
+
+    return li
+
+
+class Counters:
+    """
+    Tallies of the work done by a Database instance and its MonthCache, e.g.
+    the number of files opened; see NAMES. The counters are shared by the
+    worker threads of the instance but not by its worker processes, if any
+    (see Database.__init__).
+    """
+
+    def __init__(self, callback=None):
+        """
+        Constructor. All counters start at zero. The callback, if given, is
+        called with the name and the value of each addition, e.g. so that an
+        embedding application can forward these to its own metrics.
+        """
+        self._lock = threading.Lock()
+        self.values = dict.fromkeys(NAMES, 0)
+        self.callback = callback
+
+    def add(self, name, value=1):
+        """
+        Adds the given value to the counter with the given name.
+        """
+        with self._lock:
+            self.values[name] += value
+
+        if self.callback is not None:
+            self.callback(name, value)
+
+    @contextmanager
+    def timed(self, name):
+        """
+        Context manager adding the time spent in its block to the counter with
+        the given name, one of TIMES.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        """
+        Returns a {name: value} dict of the counters as they are now.
+        """
+        with self._lock:
+            return dict(self.values)
+
+    def reset(self):
+        """
+        Sets all the counters back to zero.
+        """
+        with self._lock:
+            self.values = dict.fromkeys(NAMES, 0)
@@ -1,18 +1,175 @@
-from datetime import timedelta
-from functools import reduce
+from calendar import monthrange
+from datetime import date, timedelta
 
+import heapq
 import logging
 
+from stl.entries import MINUTES_PER_DAY
+from stl.entries import decode_stamp
 from stl.time import prettify_date, prettify_datetime, prettify_delta
 
 
+def _get_day(stamp):
+    """
+    Returns the date of the given encoded stamp.
+    """
+    return date.fromordinal(stamp // MINUTES_PER_DAY + 1)
+
+
+"""
+The keys that the entries can be grouped by in a breakdown report (see
+Status.get_breakdown), each with a function returning the key's sort value for
+an entry's encoded start stamp and task, a function turning the sort value
+into the structured value reported, and a function formatting the latter. The
+periods are reported as the dates of their first days; the first day,
+date(1, 1, 1), is a Monday, hence the week arithmetic.
+"""
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+GROUP_KEYS = {
+    'day': (
+        lambda stamp, task: stamp // MINUTES_PER_DAY,
+        lambda key: date.fromordinal(key + 1),
+        lambda value: prettify_date(value.year, value.month, value.day)),
+    'week': (
+        lambda stamp, task: stamp // MINUTES_PER_DAY // 7,
+        lambda key: date.fromordinal(key * 7 + 1),
+        lambda value: 'week of ' + prettify_date(
+            value.year, value.month, value.day)),
+    'weekday': (
+        lambda stamp, task: stamp // MINUTES_PER_DAY % 7,
+        lambda key: WEEKDAYS[key],
+        lambda value: value),
+    'hour': (
+        lambda stamp, task: stamp % MINUTES_PER_DAY // 60,
+        lambda key: key,
+        lambda value: '{:02}:00'.format(value)),
+    'month': (
+        lambda stamp, task: _get_day(stamp).timetuple()[:2],
+        lambda key: date(key[0], key[1], 1),
+        lambda value: prettify_date(value.year, value.month)),
+    'year': (
+        lambda stamp, task: _get_day(stamp).year,
+        lambda key: key,
+        lambda value: str(value)),
+    'task': (
+        lambda stamp, task: task,
+        lambda key: key,
+        lambda value: value or '-')
+}
+
+
+"""
+The columns of the structured results of the Status methods, in order; those
+of get_breakdown also include the names of the keys grouped by, before the
+seconds.
+"""
+COLUMNS = {
+    'current': ('task', 'started', 'seconds'),
+    'time': ('start', 'end', 'task', 'seconds'),
+    'task': ('task', 'started', 'last_mod', 'seconds'),
+    'breakdown': ('start', 'end', 'seconds')
+}
+
+
+def _serialise(value):
+    """
+    Returns the given structured value as it should be written out: dates and
+    datetimes in ISO format, the rest (strings and ints) as they are.
+    """
+    if isinstance(value, date):
+        return value.isoformat()
+
+    return value
+
+
+def iter_tsv(tables):
+    """
+    Generates the lines of the given [] of (columns, rows) tables, as returned
+    by Core.export, in tab-separated format: a header line and a line per row
+    for each table, the tables separated by empty lines. Values containing
+    tabs, newlines, or quotes are quoted as the csv module does, so a line can
+    span more than one line of text.
+    """
+    import csv
+    import io
+
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter='\t', lineterminator='\n')
+
+    def format_row(values):
+        line = '\t'.join([str(value) for value in values])
+
+        if line.count('\t') + 1 == len(values) and \
+                not any(char in line for char in '\n\r"'):
+            return line
+
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow(values)
+        return buf.getvalue()[:-1]
+
+    for index, (columns, rows) in enumerate(tables):
+        if index:
+            yield ''
+
+        yield format_row(columns)
+
+        for row in rows:
+            yield format_row([_serialise(row[column]) for column in columns])
+
+
+def iter_json(tables):
+    """
+    Generates the lines of the given [] of (columns, rows) tables, as returned
+    by Core.export, in json lines format: a json object per row.
+    """
+    import json
+
+    for columns, rows in tables:
+        for row in rows:
+            yield json.dumps({
+                column: _serialise(row[column]) for column in columns})
+
+
+"""
+The machine-readable output formats of stl show and the functions generating
+their lines; see Core.export.
+"""
+FORMATS = {
+    'json': iter_json,
+    'tsv': iter_tsv
+}
+
+
+def group_entries(log, by):
+    """
+    Returns the {key: minutes} totals of the entries of the given MonthLog
+    grouped by the given [] of GROUP_KEYS names, the keys being tuples of the
+    respective values. The entries are gone through once and each is counted
+    whole in the group of its start.
+    """
+    funcs = [GROUP_KEYS[name][0] for name in by]
+    tasks = log.tasks
+
+    groups = {}
+
+    for start, stop, task_id in zip(log.starts, log.stops, log.task_ids):
+        task = tasks[task_id]
+        key = tuple([func(start, task) for func in funcs])
+        groups[key] = groups.get(key, 0) + stop - start
+
+    return groups
+
+
 class Status:
     """
     Represents an answer to an inquiry about the status. Knows what comprises
     different status informations.
 
     Methods of this class only call the Database.get_* methods, i.e.
-    information from the database is only retrieved, not altered.
+    information from the database is only retrieved, not altered. The reports
+    are built from the per-month rollups rather than from the entries.
     """
 
     def __init__(self, db):
@@ -21,13 +178,133 @@ class Status:
         """
         self.db = db
         self.log = logging.getLogger(__name__)
+        self.totals = {}  # (date1, date2): {task: [minutes, first_start]}
+
+    def preload(self, spans):
+        """
+        Fetches the totals of the given [] of (date1, date2) tuples in one go,
+        so that the reports for these spans share the loading of the months
+        they have in common.
+        """
+        spans = [span for span in set(spans) if span not in self.totals]
+        self.totals.update(zip(spans, self.db.get_totals_many(spans)))
+
+    def _get_totals(self, d1, d2):
+        """
+        Returns the totals of the span between the two given dates, inclusive,
+        as preloaded or else as fetched from the database.
+        """
+        if (d1, d2) in self.totals:
+            return self.totals[(d1, d2)]
+
+        return self.db.get_totals(d1, d2)
 
+    """
+    Methods returning structured results: dicts or generators of such, with
+    the keys listed in COLUMNS, the dates and datetimes as such, and the times
+    in whole seconds; see the *_info methods for the human-readable versions.
+    The generators do not fetch anything until consumed, so that the reports
+    can be written out one after the other as they go.
+    """
+    def get_current(self, now):
+        """
+        Returns {task, started, seconds} of the current task or None if there
+        is not such. Does not check the time itself and expects a datetime
+        instance.
+        """
+        curr = self.db.get_current()
+        if curr is None:
+            return None
+
+        return {
+            'task': curr['task'],
+            'started': curr['stamp'],
+            'seconds': int((now - curr['stamp']).total_seconds())
+        }
+
+    def get_time(self, d1, d2):
+        """
+        Generates the {start, end, task, seconds} with the time spent on each
+        task between the two given dates, inclusive, the time not spent on a
+        task included. Tasks with the same time are listed in the order they
+        were first worked on.
+        """
+        totals = self._get_totals(d1, d2)
+
+        for minutes, _, task in sorted([
+                (minutes, first_start, task)
+                for task, (minutes, first_start) in totals.items()]):
+            yield {'start': d1, 'end': d2, 'task': task,
+                   'seconds': minutes * 60}
+
+    def get_task(self, task):
+        """
+        Returns {task, started, last_mod, seconds} of the given task or None
+        if the latter is not found.
+        """
+        totals = self.db.get_task_totals(task)
+
+        if totals is None:
+            return None
+
+        minutes, first_start, _, last_stop = totals
+
+        return {
+            'task': task,
+            'started': decode_stamp(first_start),
+            'last_mod': decode_stamp(last_stop),
+            'seconds': minutes * 60
+        }
+
+    def get_breakdown(self, d1, d2, by, top=None):
+        """
+        Generates the {start, end, <key>..., seconds} with the time worked
+        between the two given dates, inclusive, broken down by the given [] of
+        GROUP_KEYS names; e.g. ['day', 'task'] yields a dict per day and task
+        worked on. The entries are fetched and gone through once, however long
+        the span.
+
+        If top is given, only that many groups are listed, those with the most
+        time, largest first; otherwise all groups are listed in key order.
+        """
+        yield from self._get_breakdown(d1, d2, by, top)[0]
+
+    def _get_breakdown(self, d1, d2, by, top=None):
+        """
+        Helper for the get_breakdown* methods. Returns the [] of rows as in
+        get_breakdown and the total seconds of all the groups, including those
+        not among the top ones.
+        """
+        groups = group_entries(self.db.get_span(d1, d2), by)
+
+        if top is None:
+            items = sorted(groups.items())
+        else:
+            items = heapq.nlargest(top, groups.items(),
+                                   key=lambda item: item[1])
+
+        funcs = [(name, GROUP_KEYS[name][1]) for name in by]
+        rows = []
+
+        for key, minutes in items:
+            row = {'start': d1, 'end': d2}
+            row.update([
+                (name, func(value)) for (name, func), value in zip(funcs, key)
+            ])
+            row['seconds'] = minutes * 60
+            rows.append(row)
+
+        return rows, sum(groups.values()) * 60
+
+    """
+    Methods returning human-readable strings
+    """
     def get_current_info(self, now):
         """
         Returns a human-readable string with info about the current task, if
         such. Does not check the time itself and expects a datetime instance.
         """
-        curr = self.db.get_current()
+        curr = self.get_current(now)
         if curr is None:
             return 'nothing to see here'
 
@@ -36,41 +313,31 @@ class Status:
         if curr['task']:
             li.append('task: {}'.format(curr['task']))
 
-        delta = now - curr['stamp']
-
-        li.append('started: {}'.format(curr['stamp']))
-        li.append('elapsed: {}'.format(prettify_delta(delta)))
+        li.append('started: {}'.format(curr['started']))
+        li.append('elapsed: {}'.format(
+            prettify_delta(timedelta(seconds=curr['seconds']))))
 
         return '\n'.join(li)
 
-    def _get_time_info(self, logs):
+    def _get_time_info(self, rows):
         """
-        Helper used by the following three methods. Returns a human-readable
+        Helper used by the following four methods. Returns a human-readable
         string containing info about the time spent working based on the given
-        log entries.
-        """
-        hours = timedelta(0)
-        tasks = {}  # task: timedelta
-
-        for entry in logs:
-            delta = entry['stop'] - entry['start']
-            hours += delta
-            if len(entry['task']):
-                if entry['task'] in tasks:
-                    tasks[entry['task']] += delta
-                else:
-                    tasks[entry['task']] = delta
-
-        tasks = [(task, delta) for task, delta in tasks.items()]
-        tasks = sorted(tasks, key=lambda x: x[1])
+        rows, as generated by get_time.
+        """
+        rows = list(rows)
+
         tasks = ', '.join([
-            '{} ({})'.format(task, prettify_delta(delta))
-            for task, delta in tasks
+            '{} ({})'.format(
+                row['task'], prettify_delta(timedelta(seconds=row['seconds'])))
+            for row in rows if len(row['task'])
         ])
 
         if not tasks:
             tasks = '-'
 
+        hours = timedelta(seconds=sum([row['seconds'] for row in rows]))
+
         return '\n'.join([
             'tasks: {}'.format(tasks),
             'total: {}'.format(prettify_delta(hours))
@@ -81,10 +348,9 @@ class Status:
         Returns a human-readable string containing info about the work done
         during the given day. The latter is expected to be a date instance.
         """
-        logs = self.db.get_day(d.year, d.month, d.day)
         return '\n'.join([
             '[{}]'.format(prettify_date(d.year, d.month, d.day)),
-            self._get_time_info(logs)
+            self._get_time_info(self.get_time(d, d))
         ])
 
     def get_month_info(self, year, month):
@@ -92,10 +358,12 @@ class Status:
         Returns a human-readable string containing info about the work done
         during the given month.
         """
-        logs = self.db.get_month(year, month)
+        last_day = monthrange(year, month)[1]
+        rows = self.get_time(date(year, month, 1),
+                             date(year, month, last_day))
         return '\n'.join([
             '[{}]'.format(prettify_date(year, month)),
-            self._get_time_info(logs)
+            self._get_time_info(rows)
         ])
 
     def get_year_info(self, year):
@@ -103,10 +371,10 @@ class Status:
         Returns a human-readable string containing info about the work done
         during the given year.
         """
-        logs = self.db.get_year(year)
+        rows = self.get_time(date(year, 1, 1), date(year, 12, 31))
         return '\n'.join([
             '[{}]'.format(year),
-            self._get_time_info(logs)
+            self._get_time_info(rows)
         ])
 
     def get_span_info(self, d1, d2):
@@ -114,14 +382,14 @@ class Status:
         Returns a human-readable string containing info about the work done
         between the two given dates, inclusive.
         """
-        logs = self.db.get_span(d1, d2)
+        rows = self.get_time(d1, d2)
 
         pretty_d1 = prettify_date(d1.year, d1.month, d1.day)
         pretty_d2 = prettify_date(d2.year, d2.month, d2.day)
 
         return '\n'.join([
             '[{} to {}]'.format(pretty_d1, pretty_d2),
-            self._get_time_info(logs)
+            self._get_time_info(rows)
         ])
 
     def get_task_info(self, task):
@@ -129,25 +397,47 @@ class Status:
         Returns a human-readable string containing info about the hours worked
         on the given task.
         """
-        logs = []
-        for year, month in self.db.get_task(task):
-            logs.extend(list(filter(
-                lambda entry: entry['task'] == task,
-                self.db.get_month(year, month))))
+        totals = self.get_task(task)
 
-        if not len(logs):
+        if totals is None:
             return 'task {} not found'.format(task)
 
-        logs = list(sorted(logs, key=lambda item: item['start']))
-
-        started = logs[0]['start']
-        last_mod = logs[-1]['stop']
-        hours = reduce(lambda x, y: x+y,
-                       [log['stop']-log['start'] for log in logs])
-
         return '\n'.join([
             '[{}]'.format(task),
-            'started: {}'.format(prettify_datetime(started)),
-            'last mod: {}'.format(prettify_datetime(last_mod)),
-            'total: {}'.format(prettify_delta(hours))
+            'started: {}'.format(prettify_datetime(totals['started'])),
+            'last mod: {}'.format(prettify_datetime(totals['last_mod'])),
+            'total: {}'.format(
+                prettify_delta(timedelta(seconds=totals['seconds'])))
         ])
+
+    def get_breakdown_info(self, d1, d2, by, top=None):
+        """
+        Returns a human-readable string containing the time worked between the
+        two given dates, inclusive, broken down by the given [] of GROUP_KEYS
+        names, as in get_breakdown; the total is that of all groups, even if
+        only the top ones are listed.
+        """
+        rows, seconds = self._get_breakdown(d1, d2, by, top)
+
+        formatters = [(name, GROUP_KEYS[name][2]) for name in by]
+        cells = [
+            [func(row[name]) for name, func in formatters]
+            + [prettify_delta(timedelta(seconds=row['seconds']))]
+            for row in rows
+        ]
+
+        widths = [max(map(len, column)) for column in zip(*cells)]
+
+        pretty_d1 = prettify_date(d1.year, d1.month, d1.day)
+        pretty_d2 = prettify_date(d2.year, d2.month, d2.day)
+
+        li = ['[{} to {} by {}]'.format(pretty_d1, pretty_d2, ', '.join(by))]
+        li.extend([
+            '  '.join([cell.ljust(width)
+                       for cell, width in zip(line, widths)]).rstrip()
+            for line in cells
+        ])
+        li.append('total: {}'.format(
+            prettify_delta(timedelta(seconds=seconds))))
+
+        return '\n'.join(li)
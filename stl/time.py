@@ -1,7 +1,5 @@
-from datetime import date, datetime, timedelta
-from itertools import permutations
-
-import logging
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
 
 
 """
@@ -12,6 +10,48 @@ ISO_FORMAT = '%Y-%m-%dT%H:%M'
 ISO_FORMAT_LEN = 16
 
 
+"""
+The lookup tables of the Parser, from the lower-cased tokens that can stand for
+a month or a day to the respective numbers. These accept the same tokens as
+the strptime directives that the Parser used to try: %m, %b, and %B (in the
+default C locale) for months and %d for days. Years are told by the number of
+their digits instead, as %Y and %y do.
+"""
+MONTH_NAMES = ('january', 'february', 'march', 'april', 'may', 'june', 'july',
+               'august', 'september', 'october', 'november', 'december')
+
+MONTHS = {}
+for month, name in enumerate(MONTH_NAMES, 1):
+    MONTHS[str(month)] = MONTHS[str(month).zfill(2)] = month
+    MONTHS[name] = MONTHS[name[:3]] = month
+
+DAYS = {}
+for day in range(1, 32):
+    DAYS[str(day)] = DAYS[str(day).zfill(2)] = DAYS[str(day).rjust(2)] = day
+
+del month, name, day
+
+
+"""
+The kinds of expressions that Parser.resolve accepts, e.g. the month kind for
+the expressions accepted by extract_month, and how many resolved ranges are
+kept by resolve_range for reuse.
+"""
+KINDS = ('day', 'week', 'month', 'year', 'span')
+RESOLVE_CACHE_SIZE = 256
+
+
+"""
+The orders in which the tokens of a 2-token or a 3-token input can stand for
+the parts of a date, e.g. (1, 0) for a month followed by a year; see
+Parser._resolve.
+"""
+ORDERS = {
+    2: ((0, 1), (1, 0)),
+    3: ((0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1), (2, 1, 0))
+}
+
+
 class Parser:
     """
     Provides methods for converting user input into time units.
@@ -22,74 +62,91 @@ class Parser:
         Constructor. Expects a datetime instance as argument; the Parser does
         not check the time itself.
         """
+        # logging is slow to import and the prettify functions below are also
+        # used by the prompt entry point, which does not need it
+        import logging
+
         self.now = now
         self.log = logging.getLogger(__name__)
 
-    def _try(self, funcs, args):
+    def _resolve(self, lookups, tokens):
         """
-        Expects a [] of one-argument functions and a [] of arguments. Keeping
-        the order of the funcs, tries all permutations of the args and returns
-        [(func_result,),] of the combinations that did not raise ValueError.
-
-        Of course, the number of funcs and args must be equal.
+        Expects a [] of lookup functions and a [] of as many tokens. Keeping
+        the order of the lookups, tries all orders of the tokens and returns
+        [(lookup_result,),] of those for which no lookup returned None.
         """
+        results = [[lookup(token) for token in tokens] for lookup in lookups]
         combos = []
 
-        for args_li in permutations(args):
-            res_li = []
-            try:
-                for index, arg in enumerate(args_li):
-                    res_li.append(funcs[index](arg))
-            except ValueError:
-                pass
-            else:
-                combos.append(tuple(res_li))
+        for order in ORDERS[len(tokens)]:
+            combo = tuple(results[i][j] for i, j in enumerate(order))
+            if None not in combo:
+                combos.append(combo)
 
         return combos
 
+    def _lookup_year(self, s):
+        """
+        Returns the year represented by the given string, four digits or the
+        last two of a year between 1969 and 2068, or None if there is no such.
+        """
+        if not (s.isascii() and s.isdigit()):
+            return None
+
+        if len(s) == 4 and s != '0000':
+            return int(s)
+
+        if len(s) == 2:
+            return int(s) + (1900 if int(s) >= 69 else 2000)
+
+        return None
+
+    def _lookup_month(self, s):
+        """
+        Returns the month represented by the given string, a number or an
+        English name or abbreviation, or None if there is no such.
+        """
+        return MONTHS.get(s.lower())
+
+    def _lookup_day(self, s):
+        """
+        Returns the day of the month represented by the given string or None if
+        there is no such.
+        """
+        return DAYS.get(s)
+
     def _get_year(self, s):
         """
-        Returns the year represented by the given string by trying the year
-        strptime directives. Raises ValueError if unsuccessful.
+        Returns the year represented by the given string. Raises ValueError if
+        unsuccessful.
         """
-        for code in ['%Y', '%y']:
-            try:
-                dt = datetime.strptime(s, code)
-            except ValueError:
-                continue
-            else:
-                return dt.year
-        else:
+        year = self._lookup_year(s)
+        if year is None:
             raise ValueError('Could not extract year: {}'.format(s))
 
+        return year
+
     def _get_month(self, s):
         """
-        Returns the month represented by the given string by trying the month
-        strptime directives. Raises ValueError if unsuccessful.
+        Returns the month represented by the given string. Raises ValueError if
+        unsuccessful.
         """
-        s = s.lower()
-
-        for code in ['%m', '%b', '%B']:
-            try:
-                dt = datetime.strptime(s, code)
-            except ValueError:
-                continue
-            else:
-                return dt.month
-        else:
+        month = self._lookup_month(s)
+        if month is None:
             raise ValueError('Could not extract month: {}'.format(s))
 
+        return month
+
     def _get_day(self, s):
         """
-        Returns the day represented by the given string by trying the day
-        strptime directive. Raises ValueError if unsuccessful.
+        Returns the day represented by the given string. Raises ValueError if
+        unsuccessful.
         """
-        try:
-            dt = datetime.strptime(s, '%d')
-        except ValueError:
+        day = self._lookup_day(s)
+        if day is None:
             raise ValueError('Could not extract day: {}'.format(s))
-        else:
-            return dt.day
+
+        return day
 
     def extract_year(self, s):
         """
@@ -128,7 +185,7 @@ class Parser:
             return year, month
 
         elif len(li) == 2:
-            combos = self._try([self._get_year, self._get_month], li)
+            combos = self._resolve([self._lookup_year, self._lookup_month], li)
             if len(combos) != 1:
                 raise ValueError('Could not infer month: {}'.format(s))
 
@@ -170,8 +227,8 @@ class Parser:
         Returns a date instance extracted from the given string. Raises
         ValueError if unsuccessful.
 
-        Apart from the _get_(year|month|day) permutations, this method also
-        recognises the ISO date format and words like today and yesterday.
+        Apart from the year, month, and day tokens in any order, this method
+        also recognises the ISO date format and words like today and yesterday.
         """
         li = s.split()
 
@@ -179,12 +236,16 @@ class Parser:
             return self.now.date()
 
         elif len(li) == 1:
-            try:
-                dt = datetime.strptime(s, '%Y-%m-%d')
-            except ValueError:
-                pass
-            else:
-                return dt.date()
+            parts = s.split('-')
+            if len(parts) == 3 and len(parts[0]) == 4 and parts[1].isdigit():
+                combo = (self._lookup_year(parts[0]),
+                         self._lookup_month(parts[1]),
+                         self._lookup_day(parts[2]))
+                if None not in combo:
+                    try:
+                        return date(*combo)
+                    except ValueError:
+                        pass
 
             if s.lower() in ['last', 'yesterday']:
                 return self.now.date() - timedelta(days=1)
@@ -195,17 +256,17 @@ class Parser:
                 return date(self.now.year, self.now.month, day)
 
         elif len(li) == 2:
-            combos = self._try([self._get_month, self._get_day], li)
+            combos = self._resolve([self._lookup_month, self._lookup_day], li)
             if len(combos) != 1:
                 raise ValueError('Could not infer date: {}'.format(s))
 
             return date(self.now.year, combos[0][0], combos[0][1])
 
         elif len(li) == 3:
-            combos = self._try([self._get_year,
-                                self._get_month,
-                                self._get_day],
-                               li)
+            combos = self._resolve([self._lookup_year,
+                                    self._lookup_month,
+                                    self._lookup_day],
+                                   li)
             if len(combos) != 1:
                 raise ValueError('Could not infer date: {}'.format(s))
 
@@ -322,6 +383,63 @@ class Parser:
 
         return d1, d2
 
+    def resolve(self, kind, s):
+        """
+        Returns the (date1, date2) range, both inclusive, of the expression of
+        the given kind (one of KINDS) given in the string, e.g. the first and
+        the last day of the month for the month kind. Raises ValueError if
+        unsuccessful.
+
+        The ranges are memoised by resolve_range, as the expressions only
+        depend on the date of now.
+        """
+        return resolve_range(kind, s, self.now.date())
+
+    def resolve_many(self, items):
+        """
+        Returns the [] of (date1, date2) ranges of the given (kind, string)
+        expressions, in the same order; see resolve. Raises ValueError if any
+        of them cannot be resolved.
+        """
+        return [self.resolve(kind, s) for kind, s in items]
+
+    def _resolve_range(self, kind, s):
+        """
+        Helper for resolve_range; does the actual resolving.
+        """
+        if kind == 'day':
+            d = self.extract_date(s)
+            return d, d
+
+        elif kind == 'week':
+            return self.extract_week(s)
+
+        elif kind == 'month':
+            year, month = self.extract_month(s)
+            next_year, next_month = divmod(year * 12 + month, 12)
+            return (date(year, month, 1),
+                    date(next_year, next_month + 1, 1) - timedelta(days=1))
+
+        elif kind == 'year':
+            year = self.extract_year(s)
+            return date(year, 1, 1), date(year, 12, 31)
+
+        elif kind == 'span':
+            return self.extract_span(s)
+
+        raise ValueError('Unknown kind of expression: {}'.format(kind))
+
+
+@lru_cache(maxsize=RESOLVE_CACHE_SIZE)
+def resolve_range(kind, s, today):
+    """
+    Returns the (date1, date2) range of the expression of the given kind given
+    in the string, as resolved by a Parser on the given date (see
+    Parser.resolve). The last RESOLVE_CACHE_SIZE ranges are kept in memory, so
+    that resolving the same expression again on the same day is free.
+    """
+    return Parser(datetime.combine(today, time()))._resolve_range(kind, s)
+
 
 """
 Functions that convert time units into pretty strings for human consumption
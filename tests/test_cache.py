@@ -0,0 +1,88 @@
+import os
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from hypothesis.strategies import datetimes, lists, text, tuples
+from hypothesis import given
+
+from stl.cache import MonthCache
+from stl.db import Database
+from stl.entries import MonthLog
+
+
+class MonthCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.cache = MonthCache(self.temp_dir.name)
+
+        self.path = os.path.join(self.temp_dir.name, 'month')
+        with open(self.path, 'w') as f:
+            f.write('EATME')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    @given(lists(tuples(datetimes(), datetimes(), text())))
+    def test_put_and_get(self, rows):
+        log = MonthLog()
+        for start, stop, task in rows:
+            log.append(start, stop, task)
+
+        stat = os.stat(self.path)
+        self.cache.put(2000, 1, stat, log)
+        self.assertEqual(self.cache.get(2000, 1, stat), log)
+        self.assertIsNone(self.cache.get(2000, 2, stat))
+
+        self.cache.invalidate(2000, 1)
+        self.assertIsNone(self.cache.get(2000, 1, stat))
+
+    def test_get_stale(self):
+        self.cache.put(2000, 1, os.stat(self.path), MonthLog())
+
+        with open(self.path, 'a') as f:
+            f.write('EATME')
+
+        self.assertIsNone(self.cache.get(2000, 1, os.stat(self.path)))
+
+    def test_get_corrupt(self):
+        stat = os.stat(self.path)
+        self.cache.put(2000, 1, stat, MonthLog())
+
+        with open(self.cache.get_path(2000, 1), 'wb') as f:
+            f.write(b'EATME')
+
+        self.assertIsNone(self.cache.get(2000, 1, stat))
+
+    def test_database_rebuilds_stale(self):
+        db = Database(self.temp_dir.name)
+        db.add_complete(datetime(2000, 1, 1), datetime(2000, 1, 1, 1), 'foo')
+        self.assertEqual(db.get_month(2000, 1)[0]['task'], 'foo')
+
+        path = db.get_path(2000, 1)
+        stat = os.stat(path)
+        self.assertIsNotNone(self.cache.get(2000, 1, stat))
+
+        with open(path, 'w') as f:
+            f.write('2000-01-01 00:00\t2000-01-01 01:00\tbarbaz\r\n')
+
+        self.assertEqual(db.get_month(2000, 1)[0]['task'], 'barbaz')
+
+    def test_keep_in_memory(self):
+        cache = MonthCache(self.temp_dir.name, keep_in_memory=True)
+        stat = os.stat(self.path)
+
+        log = MonthLog()
+        cache.put(2000, 1, stat, log)
+        os.remove(cache.get_path(2000, 1))
+        self.assertIs(cache.get(2000, 1, stat), log)
+
+        with open(self.path, 'a') as f:
+            f.write('EATME')
+
+        self.assertIsNone(cache.get(2000, 1, os.stat(self.path)))
+
+        cache.put(2000, 1, stat, log)
+        cache.invalidate(2000, 1)
+        self.assertIsNone(cache.get(2000, 1, stat))
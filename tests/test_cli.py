@@ -1,11 +1,16 @@
-from unittest.mock import patch
+import io
+import os
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from unittest.mock import call, patch
 from unittest import TestCase
 
 from hypothesis.strategies import fixed_dictionaries, just, one_of
 from hypothesis.strategies import sampled_from, text, tuples
 from hypothesis import given
 
-from stl.cli import Cli
+from stl.cli import Cli, main
 from stl.core import Core
 
 
@@ -99,6 +104,78 @@ class CliTestCase(TestCase):
             self.cli.run(args)
             mock_status.assert_called_once_with(extra=extra)
 
+    def test_status_many(self):
+        args = ['show', '-d', 'today', '-w', '-m', 'oct', '2016', '-t', '-y']
+
+        with patch.object(Core, 'status_many') as mock_status_many:
+            self.cli.run(args)
+            mock_status_many.assert_called_once_with([
+                ('day', 'today'), ('week', ''), ('month', 'oct 2016'),
+                ('task', '-y')])
+
+        # the reports are in the order they are asked for
+        args = ['show', '-m', 'this', '-s', '1', 'oct', '-d', 'today', '-m']
+
+        with patch.object(Core, 'status_many') as mock_status_many:
+            self.cli.run(args)
+            mock_status_many.assert_called_once_with([
+                ('month', 'this'), ('span', '1 oct'), ('day', 'today'),
+                ('month', '')])
+
+    def test_status_by(self):
+        args = ['show', '-y', 'last', '-m', '--by', 'day,task', '--top', '3']
+
+        with patch.object(Core, 'breakdown') as mock_breakdown:
+            mock_breakdown.return_value = ''
+            self.cli.run(args)
+            self.assertEqual(mock_breakdown.call_args_list, [
+                call(('year', 'last'), ['day', 'task'], 3),
+                call(('month', ''), ['day', 'task'], 3)])
+
+        with patch.object(Core, 'breakdown') as mock_breakdown:
+            self.cli.run(['show', '--by', 'day'])
+            mock_breakdown.assert_not_called()
+
+        for args in [['show', '-m', '--top', '3'],
+                     ['show', '-m', '--top', '3', '-f', 'tsv']]:
+            with patch.object(Core, 'status') as mock_status, \
+                    patch.object(Core, 'export') as mock_export:
+                self.assertEqual(self.cli.run(args),
+                                 'Please specify what to break down by')
+                mock_status.assert_not_called()
+                mock_export.assert_not_called()
+
+    def test_status_format(self):
+        args = ['show', '-d', '-s', '1', 'oct', '--by', 'task', '-f', 'json']
+
+        with patch.object(Core, 'export') as mock_export:
+            mock_export.return_value = []
+            self.assertEqual(list(self.cli.run(args)), [])
+            mock_export.assert_called_once_with(
+                [('day', ''), ('span', '1 oct')], ['task'], None)
+
+        with patch.object(Core, 'export') as mock_export:
+            mock_export.return_value = [(('task',), [{'task': 'foo'}])]
+            self.assertEqual(list(self.cli.run(['show', '-f', 'tsv'])),
+                             ['task', 'foo'])
+            mock_export.assert_called_once_with([], None, None)
+
+        # the errors raised while the rows are generated are printed too
+        def rows():
+            yield {'task': 'foo'}
+            raise ValueError('Could not read the month file')
+
+        with TemporaryDirectory() as temp_dir, \
+                patch.object(Core, 'export') as mock_export, \
+                patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                patch('sys.argv', ['stl', '--dir', temp_dir, 'show', '-f',
+                                   'tsv']):
+            mock_export.return_value = [(('task',), rows())]
+            main()
+
+        self.assertEqual(stdout.getvalue(),
+                         'task\nfoo\nCould not read the month file\n')
+
     @given(fixed_dictionaries({
             'start': text(min_size=1).filter(lambda t: not t.startswith('-')),
             'stop': text(min_size=1).filter(lambda t: not t.startswith('-')),
@@ -130,3 +207,89 @@ class CliTestCase(TestCase):
         with patch.object(Core, 'edit') as mock_edit:
             self.cli.run(args)
             mock_edit.assert_called_once_with(d['month'])
+
+    def test_import(self):
+        with TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'entries')
+
+            with open(path, 'w') as f:
+                f.write('2016-10-15T09:00\t2016-10-15T10:00\tfoo\n\n'
+                        '2016-10-15 11:00\t2016-10-15 12:00\n')
+
+            with patch.object(Core, 'add_many') as mock_add_many:
+                mock_add_many.side_effect = list
+                res = self.cli.run(['import', path])
+
+            self.assertEqual(res, [
+                ('2016-10-15T09:00', '2016-10-15T10:00', 'foo'),
+                ('2016-10-15T11:00', '2016-10-15T12:00', '')])
+
+            with open(path, 'w') as f:
+                f.write('{"start": "2016-10-15T09:00", '
+                        '"stop": "2016-10-15T10:00"}\n')
+
+            with patch.object(Core, 'add_many') as mock_add_many:
+                mock_add_many.side_effect = list
+                res = self.cli.run(['import', '--format', 'jsonl', path])
+
+            self.assertEqual(res, [
+                ('2016-10-15T09:00', '2016-10-15T10:00', '')])
+
+            with open(path, 'w') as f:
+                f.write('{"start": "2016-10-15 09:00", '
+                        '"stop": "2016-10-15 10:00", "task": null}\n\n'
+                        '{"start": "2016-10-15T11:00", '
+                        '"stop": "2016-10-15T12:00", "task": "foo"}\n')
+
+            with patch.object(Core, 'add_many') as mock_add_many:
+                mock_add_many.side_effect = list
+                res = self.cli.run(['import', '--format', 'jsonl', path])
+
+            self.assertEqual(res, [
+                ('2016-10-15T09:00', '2016-10-15T10:00', ''),
+                ('2016-10-15T11:00', '2016-10-15T12:00', 'foo')])
+
+            for line in ['[1, 2]', '{"start": 5, "stop": "2016-10-15T10:00"}',
+                         '{"start": "2016-10-15T09:00"}',
+                         '{"start": "2016-10-15T09:00", '
+                         '"stop": "2016-10-15T10:00", "task": 5}',
+                         '{"start":']:
+                with open(path, 'w') as f:
+                    f.write('{"start": "2016-10-15T08:00", '
+                            '"stop": "2016-10-15T08:30"}\n' + line + '\n')
+
+                with patch.object(Core, 'add_many') as mock_add_many:
+                    mock_add_many.side_effect = list
+                    res = self.cli.run(['import', '--format', 'jsonl', path])
+
+                self.assertEqual(res, 'Could not read line 2: ' + line)
+
+    def test_find_command(self):
+        self.assertEqual(self.cli._find_command(['show', '-t', 'add']), 0)
+        self.assertEqual(self.cli._find_command(
+            ['-v', '--dir', 'start', '--jobs', '2', 'stop']), 5)
+        self.assertEqual(self.cli._find_command(['--profile', 'show']), 1)
+        self.assertIsNone(self.cli._find_command(['--dir', 'show']))
+        self.assertIsNone(self.cli._find_command(['-h', 'show']))
+
+    def test_help(self):
+        res = self.cli.run([])
+        for command in ['start', 'stop', 'switch', 'status', 'show', 'add',
+                        'import', 'edit', 'migrate', 'daemon']:
+            self.assertIn(command, res)
+
+    def test_lazy_imports(self):
+        code = (
+            'import sys; from stl.cli import Cli; '
+            'Cli().run(["--dir", sys.argv[1], "stop"]); '
+            'print(sorted(set(sys.modules) & {"csv", "json", '
+            '"logging.config", "shutil", "socketserver", "stl.daemon", '
+            '"stl.spawn", "stl.status"}))')
+
+        with TemporaryDirectory() as temp_dir:
+            res = subprocess.run([sys.executable, '-c', code, temp_dir],
+                                 cwd=os.path.dirname(os.path.dirname(
+                                     os.path.abspath(__file__))),
+                                 stdout=subprocess.PIPE, check=True)
+
+        self.assertEqual(res.stdout.decode().strip(), "['csv']")
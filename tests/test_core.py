@@ -1,6 +1,9 @@
+import csv
+import io
+import json
 import os.path
 import shutil
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from tempfile import TemporaryDirectory
 from unittest.mock import patch
 from unittest import TestCase
@@ -9,6 +12,7 @@ from hypothesis.strategies import datetimes, text
 from hypothesis import assume, given
 
 from stl.core import Core
+from stl.status import FORMATS
 
 
 MIN_DATETIME = datetime(1000, 1, 1)
@@ -93,3 +97,192 @@ class CoreTestCase(TestCase):
 
         year_dir = os.path.join(self.temp_dir.name, str(dt1.year))
         shutil.rmtree(year_dir)
+
+    def test_add_many(self):
+        res = self.core.add_many([
+            ('2016-10-15T09:00', '2016-10-15T10:00', 'foo'),
+            (datetime(2016, 9, 1, 9), datetime(2016, 9, 1, 10), 'foo'),
+            ('2016-10-14T09:00', '2016-10-14T10:00', '')])
+        self.assertEqual(res, 'added 3 entries')
+
+        logs = self.core.db.get_month(2016, 10)
+        self.assertEqual([log['task'] for log in logs], ['', 'foo'])
+        self.assertEqual(sorted(self.core.db.get_task('foo')),
+                         [(2016, 9), (2016, 10)])
+
+        with self.assertRaises(ValueError):
+            self.core.add_many([
+                ('2016-11-15T09:00', '2016-11-15T10:00', 'foo'),
+                ('2016-11-15T09:00', '2016-11-15T08:00', 'foo')])
+
+        self.assertEqual(self.core.db.get_month(2016, 11), [])
+
+    def test_status_many(self):
+        self.core.add('2016-09-30T09:00', '2016-09-30T10:00', 'foo')
+        self.core.add('2016-10-14T09:00', '2016-10-14T10:00', 'foo')
+        self.core.add('2016-10-15T09:00', '2016-10-15T11:30', 'bar')
+
+        now = datetime(2016, 10, 15, 12)
+        extras = [('day', 'today'), ('week', 'this'), ('month', 'this'),
+                  ('year', 'this'), ('span', '30 sep 2016'), ('task', 'foo')]
+
+        reports = [self.core.status(extra, now=now) for extra in extras]
+
+        self.assertEqual(self.core.status_many(extras, now=now), reports)
+
+        # the reports but the task one only need the rollups of sep and oct
+        stats = self.core.db.stats()
+        self.core.status_many(extras[:-1], now=now)
+
+        new_stats = self.core.db.stats()
+        self.assertEqual(
+            new_stats['cache_hits'] + new_stats['cache_misses']
+            - stats['cache_hits'] - stats['cache_misses'], 2)
+
+    def test_breakdown(self):
+        self.core.add('2016-09-30T09:00', '2016-09-30T10:00', 'foo')
+        self.core.add('2016-10-14T09:00', '2016-10-14T10:00', 'foo')
+        self.core.add('2016-10-15T09:00', '2016-10-15T11:30', 'bar')
+        self.core.add('2016-10-15T13:00', '2016-10-15T13:20')
+
+        now = datetime(2016, 10, 15, 12)
+        extra = ('span', '30 sep 2016')
+
+        self.assertEqual(self.core.breakdown(extra, ['day', 'task'], now=now),
+                         '\n'.join([
+                             '[30 sep 2016 to 15 oct 2016 by day, task]',
+                             '30 sep 2016  foo  1 hour',
+                             '14 oct 2016  foo  1 hour',
+                             '15 oct 2016  -    20 minutes',
+                             '15 oct 2016  bar  2 hours, 30 minutes',
+                             'total: 4 hours, 50 minutes']))
+
+        self.assertEqual(self.core.breakdown(extra, ['weekday', 'hour'],
+                                             top=1, now=now),
+                         '\n'.join([
+                             '[30 sep 2016 to 15 oct 2016 by weekday, hour]',
+                             'sat  09:00  2 hours, 30 minutes',
+                             'total: 4 hours, 50 minutes']))
+
+        # the totals agree with the status report of the same span
+        report = self.core.status(('month', 'this'), now=now)
+        breakdown = self.core.breakdown(('month', 'this'), ['week'], now=now)
+        self.assertEqual(breakdown.split('\n')[-1], report.split('\n')[-1])
+
+        with self.assertRaises(ValueError):
+            self.core.breakdown(('task', 'foo'), ['day'])
+
+        with self.assertRaises(ValueError):
+            self.core.breakdown(extra, ['fortnight'], now=now)
+
+        with self.assertRaises(ValueError):
+            self.core.breakdown(extra, ['day'], top=0, now=now)
+
+    def test_export(self):
+        self.core.add('2016-09-30T09:00', '2016-09-30T10:00', 'foo')
+        self.core.add('2016-10-15T09:00', '2016-10-15T11:30', 'bar')
+        self.core.add('2016-10-15T13:00', '2016-10-15T13:20')
+
+        now = datetime(2016, 10, 15, 12)
+        oct1, oct31 = date(2016, 10, 1), date(2016, 10, 31)
+
+        def export(*args, **kwargs):
+            return [(columns, list(rows)) for columns, rows
+                    in self.core.export(*args, **kwargs)]
+
+        self.assertEqual(
+            export([('month', 'this'), ('task', 'foo')], now=now), [
+                (('start', 'end', 'task', 'seconds'), [
+                    {'start': oct1, 'end': oct31, 'task': '',
+                     'seconds': 1200},
+                    {'start': oct1, 'end': oct31, 'task': 'bar',
+                     'seconds': 9000}]),
+                (('task', 'started', 'last_mod', 'seconds'), [
+                    {'task': 'foo', 'started': datetime(2016, 9, 30, 9),
+                     'last_mod': datetime(2016, 9, 30, 10),
+                     'seconds': 3600}])])
+
+        self.assertEqual(
+            export([('month', 'this')], ['hour'], now=now), [
+                (('start', 'end', 'hour', 'seconds'), [
+                    {'start': oct1, 'end': oct31, 'hour': 9, 'seconds': 9000},
+                    {'start': oct1, 'end': oct31, 'hour': 13,
+                     'seconds': 1200}])])
+
+        self.assertEqual(export([], now=now),
+                         [(('task', 'started', 'seconds'), [])])
+
+        self.core.start('foo', now=datetime(2016, 10, 15, 11, 30))
+        self.assertEqual(export([], now=now), [
+            (('task', 'started', 'seconds'), [
+                {'task': 'foo', 'started': datetime(2016, 10, 15, 11, 30),
+                 'seconds': 1800}])])
+
+        # the text reports are built from the same results
+        tables = self.core.export([('span', '30 sep 2016')], now=now)
+        lines = list(FORMATS['tsv'](tables))
+
+        self.assertEqual(lines, [
+            'start\tend\ttask\tseconds',
+            '2016-09-30\t2016-10-15\t\t1200',
+            '2016-09-30\t2016-10-15\tfoo\t3600',
+            '2016-09-30\t2016-10-15\tbar\t9000'])
+        self.assertEqual(
+            self.core.status(('span', '30 sep 2016'), now=now).split('\n')[1],
+            'tasks: foo (1 hour), bar (2 hours, 30 minutes)')
+
+        tables = self.core.export([('span', '30 sep 2016')], now=now)
+        lines = list(FORMATS['json'](tables))
+        self.assertEqual(json.loads(lines[-1]), {
+            'start': '2016-09-30', 'end': '2016-10-15', 'task': 'bar',
+            'seconds': 9000})
+
+        with self.assertRaises(ValueError):
+            self.core.export([('task', 'foo')], ['day'], now=now)
+
+        # the entries are only read as the rows are consumed
+        stats = self.core.db.stats()
+        tables = self.core.export([('month', 'this'), ('month', 'last')],
+                                  ['day'], now=now)
+        self.assertEqual(self.core.db.stats(), stats)
+
+        self.assertEqual(len(list(tables[0][1])), 1)
+        self.assertGreater(self.core.db.stats()['files_opened'],
+                           stats['files_opened'])
+
+        # tasks with tabs or newlines do not break the tsv rows
+        rows = [{'task': 'foo\tbar', 'seconds': 60},
+                {'task': 'foo\nbar "baz"', 'seconds': 120}]
+        text = '\n'.join(FORMATS['tsv']([(('task', 'seconds'), rows)]))
+
+        self.assertEqual(list(csv.reader(io.StringIO(text), delimiter='\t')), [
+            ['task', 'seconds'], ['foo\tbar', '60'],
+            ['foo\nbar "baz"', '120']])
+
+    def test_migrate(self):
+        self.core.add('2016-10-15T09:00', '2016-10-15T10:00', 'foo')
+        self.core.start('bar', now=datetime(2016, 10, 15, 11))
+
+        report = self.core.status(('month', 'oct 2016'))
+
+        self.assertEqual(self.core.migrate('sqlite'),
+                         'migrated 1 entries to sqlite')
+        self.assertEqual(self.core.db.NAME, 'sqlite')
+
+        self.assertEqual(self.core.status(('month', 'oct 2016')), report)
+        self.assertEqual(self.core.db.get_task('foo'), [(2016, 10)])
+        self.assertEqual(self.core.stop(now=datetime(2016, 10, 15, 12)),
+                         'stopped with bar')
+
+        core = Core(dir_path=self.temp_dir.name)
+        self.assertEqual(core.db.NAME, 'sqlite')
+        self.assertEqual(len(core.db.get_month(2016, 10)), 2)
+
+        with self.assertRaises(ValueError):
+            core.migrate('sqlite')
+
+        with self.assertRaises(ValueError):
+            core.edit('oct 2016')
+
+        core.db.close()
+        self.core.db.close()
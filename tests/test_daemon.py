@@ -0,0 +1,94 @@
+import os
+import socket
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest.mock import patch
+from unittest import TestCase
+
+from stl.cli import Cli
+from stl.core import Core
+from stl.client import SOCKET_NAME
+from stl.client import forward
+from stl.daemon import Daemon
+
+
+class DaemonTestCase(TestCase):
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.cli = Cli()
+
+        core = Core(dir_path=self.temp_dir.name, keep_in_memory=True)
+        core.db.add_complete(datetime(2000, 1, 1, 9), datetime(2000, 1, 1, 17),
+                             'foo')
+
+        self.daemon = Daemon(core, self.cli)
+        self.thread = Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.daemon.server_close()
+        self.thread.join()
+        self.temp_dir.cleanup()
+
+    def test_forward(self):
+        args = ['--dir', self.temp_dir.name, 'show', '-y', '2000']
+        self.assertEqual(forward(self.temp_dir.name, args),
+                         self.cli.run(args))
+
+        args = ['--dir', self.temp_dir.name, 'add',
+                '2000-01-02T09:00', '2000-01-02T10:00', 'bar']
+        self.assertIn('added task bar', forward(self.temp_dir.name, args))
+
+        args = ['--dir', self.temp_dir.name, 'show', '-t', 'bar']
+        self.assertIn('1 hour', forward(self.temp_dir.name, args))
+
+    def test_forward_format(self):
+        args = ['--dir', self.temp_dir.name, 'show', '-y', '2000', '-f', 'tsv']
+        self.assertEqual(forward(self.temp_dir.name, args),
+                         '\n'.join(self.cli.run(args)))
+
+    def test_socket_mode(self):
+        path = os.path.join(self.temp_dir.name, SOCKET_NAME)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+        # not accessible by others even before the chmod
+        with TemporaryDirectory() as temp_dir:
+            with patch('os.chmod'):
+                daemon = Daemon(Core(dir_path=temp_dir), self.cli)
+
+            path = os.path.join(temp_dir, SOCKET_NAME)
+            self.assertEqual(os.stat(path).st_mode & 0o077, 0)
+            daemon.server_close()
+
+    def test_forward_rejected(self):
+        args = ['--dir', self.temp_dir.name, 'edit', 'jan 2000']
+        self.assertIn('does not run', forward(self.temp_dir.name, args))
+
+    def test_already_running(self):
+        with self.assertRaises(ValueError):
+            Daemon(self.daemon.core, self.cli)
+
+    def test_no_daemon(self):
+        with TemporaryDirectory() as temp_dir:
+            self.assertIsNone(forward(temp_dir, ['show']))
+
+            path = os.path.join(temp_dir, SOCKET_NAME)
+            with open(path, 'w') as f:
+                f.write('stale')
+
+            self.assertIsNone(forward(temp_dir, ['show']))
+
+    def test_no_reply(self):
+        with TemporaryDirectory() as temp_dir:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.bind(os.path.join(temp_dir, SOCKET_NAME))
+            sock.listen()
+
+            with sock, patch('stl.client.REPLY_TIMEOUT', 0.1):
+                with self.assertRaises(ValueError) as cm:
+                    forward(temp_dir, ['show'])
+
+            self.assertIn('did not reply', str(cm.exception))
@@ -1,16 +1,45 @@
 import os
 import shutil
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from tempfile import TemporaryDirectory
 from unittest import TestCase
+from unittest.mock import patch
 
 from hypothesis.strategies import (
-    dates, datetimes, dictionaries, fixed_dictionaries, lists, text
+    dates, datetimes, dictionaries, fixed_dictionaries, lists, sampled_from,
+    text
 )
 from hypothesis import assume, given
 
-from stl.db import ARCHIVE_DT_FORMAT
+from stl.db import ARCHIVE_DT_FORMAT, ARCHIVE_DT_FORMAT_LEN
+from stl.db import CURRENT_DT_FORMAT, CURRENT_DT_FORMAT_LEN
+from stl.db import TASKS_DIR, TASKS_FILE
 from stl.db import Database
+from stl.db import parse_stamp
+from stl.entries import Rollup
+from stl.entries import encode_stamp
+
+
+class ParseStampTestCase(TestCase):
+
+    @given(datetimes())
+    def test_parse_stamp(self, dt):
+        s = dt.strftime(CURRENT_DT_FORMAT).zfill(CURRENT_DT_FORMAT_LEN)
+        self.assertEqual(parse_stamp(s, CURRENT_DT_FORMAT),
+                         dt.replace(microsecond=0))
+
+        s = dt.strftime(ARCHIVE_DT_FORMAT).zfill(ARCHIVE_DT_FORMAT_LEN)
+        self.assertEqual(parse_stamp(s),
+                         dt.replace(second=0, microsecond=0))
+
+    def test_parse_stamp_fallback(self):
+        self.assertEqual(parse_stamp('2016-1-5 9:30'),
+                         datetime(2016, 1, 5, 9, 30))
+
+        for s in ['2016-13-05 09:30', '2016-01-05 09:30:00',
+                  '1_00-01-05 09:30', '2016-01-05T09:30', '']:
+            with self.assertRaises(ValueError):
+                parse_stamp(s)
 
 
 class DatabaseTestCase(TestCase):
@@ -177,6 +206,29 @@ class DatabaseTestCase(TestCase):
         for subdir in os.listdir(self.temp_dir.name):
             shutil.rmtree(os.path.join(self.temp_dir.name, subdir))
 
+    def test_workers(self):
+        for day in range(1, 400, 3):
+            dt = datetime(2000, 1, 1) + timedelta(days=day, hours=day % 24)
+            self.db.add_complete(dt, dt + timedelta(hours=1), str(day % 5))
+            self.db.add_task(str(day % 5), dt.year, dt.month)
+
+        start, end = date(2000, 1, 15), date(2001, 1, 20)
+
+        for db in [Database(self.temp_dir.name, workers=4),
+                   Database(self.temp_dir.name, workers=2, processes=True)]:
+            self.assertEqual(db.get_year(2000), self.db.get_year(2000))
+            self.assertEqual(db.get_span(start, end),
+                             self.db.get_span(start, end))
+            self.assertEqual(list(db.iter_span(start, end)),
+                             list(self.db.iter_span(start, end)))
+            self.assertEqual(list(db.iter_task('3')),
+                             list(self.db.iter_task('3')))
+            self.assertTrue(list(db.iter_task('3')))
+            self.assertEqual(db.get_totals(start, end),
+                             self.db.get_totals(start, end))
+            self.assertEqual(db.get_task_totals('3'),
+                             self.db.get_task_totals('3'))
+
     @given(dictionaries(
            keys=text(),
            values=lists(dates(), min_size=1)))
@@ -193,6 +245,382 @@ class DatabaseTestCase(TestCase):
             res = self.db.get_task(task)
             self.assertEqual(list(sorted(li)), list(sorted(res)))
 
-        path = os.path.join(self.temp_dir.name, 'tasks')
+        path = os.path.join(self.temp_dir.name, TASKS_DIR)
         if os.path.exists(path):
-            os.remove(path)
+            shutil.rmtree(path)
+
+    def test_migrate_tasks_file(self):
+        path = os.path.join(self.temp_dir.name, TASKS_FILE)
+        with open(path, 'w') as f:
+            f.write('bar\t2016-10\r\nfoo\t2016-09,2016-10\r\n')
+
+        self.assertEqual(self.db.get_task('foo'), [(2016, 9), (2016, 10)])
+        self.assertEqual(self.db.get_task('bar'), [(2016, 10)])
+        self.assertEqual(self.db.get_task('baz'), [])
+        self.assertFalse(os.path.exists(path))
+
+        self.db.add_task('foo', 2016, 11)
+        self.assertEqual(Database(self.temp_dir.name).get_task('foo'),
+                         [(2016, 9), (2016, 10), (2016, 11)])
+
+    def test_add_complete_appends(self):
+        path = self.db.get_path(2000, 1, create=True)
+        with open(path, 'wb') as f:
+            f.write(b'2000-01-05 10:00\t2000-01-05 11:00\tfoo')
+
+        self.db.add_complete(datetime(2000, 1, 1, 9), datetime(2000, 1, 1, 10))
+
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), (
+                b'2000-01-05 10:00\t2000-01-05 11:00\tfoo\n'
+                b'2000-01-01 09:00\t2000-01-01 10:00\t\r\n'))
+
+    def test_add_complete_inserts(self):
+        self.db.add_complete(datetime(2000, 1, 1), datetime(2000, 1, 1, 1),
+                             'foo\nbar')
+        self.db.add_complete(datetime(2000, 1, 3), datetime(2000, 1, 3, 1),
+                             '2000-01-02 00:00\tbaz')
+        self.db.add_complete(datetime(2000, 1, 4), datetime(2000, 1, 4, 1))
+
+        for day in [5, 2, 1, 3, 4]:
+            self.db.add_complete(datetime(2000, 1, day, 12),
+                                 datetime(2000, 1, day, 13),
+                                 str(day), append=False)
+
+        with open(self.db.get_path(2000, 1), 'rb') as f:
+            stamps = [line[:10] for line in f
+                      if line.startswith(b'2000-01-0')]
+        self.assertEqual(stamps, list(sorted(stamps)))
+
+        logs = self.db.get_month(2000, 1)
+        self.assertEqual([log['task'] for log in logs], [
+            'foo\nbar', '1', '2', '2000-01-02 00:00\tbaz', '3', '', '4', '5'])
+
+    def test_add_complete_inserts_quoted(self):
+        # the continuation line of the task looks like the start of an entry
+        self.db.add_complete(datetime(2000, 1, 1, 1), datetime(2000, 1, 1, 2),
+                             'x\n2000-01-09 00:00\ty')
+        self.db.add_complete(datetime(2000, 1, 10, 1),
+                             datetime(2000, 1, 10, 2), 'z')
+        self.db.add_complete(datetime(2000, 1, 1, 6), datetime(2000, 1, 1, 7),
+                             'new', append=False)
+
+        logs = Database(self.temp_dir.name).get_month(2000, 1)
+        self.assertEqual([(log['start'], log['task']) for log in logs], [
+            (datetime(2000, 1, 1, 1), 'x\n2000-01-09 00:00\ty'),
+            (datetime(2000, 1, 1, 6), 'new'),
+            (datetime(2000, 1, 10, 1), 'z')])
+
+    @given(lists(fixed_dictionaries({
+            'start': datetimes(min_value=datetime(2000, 1, 1),
+                               max_value=datetime(2002, 1, 1)),
+            'stop': datetimes(min_value=datetime(2000, 1, 1),
+                              max_value=datetime(2002, 1, 1)),
+            'task': sampled_from(['', 'foo', 'bar'])}), min_size=1))
+    def test_iter_span_and_task(self, li):
+        for d in li:
+            self.db.add_complete(d['start'], d['stop'], d['task'])
+            if d['task']:
+                self.db.add_task(d['task'], d['start'].year, d['start'].month)
+
+        first = min([d['start'] for d in li]).date()
+        last = max([d['start'] for d in li]).date()
+
+        span = self.db.get_span(first, last)
+        self.assertEqual(list(self.db.iter_span(first, last)), list(span))
+
+        for task in ['foo', 'bar']:
+            entries = [entry for entry in span if entry['task'] == task]
+            self.assertEqual(list(self.db.iter_task(task)), entries)
+
+            totals = self.db.get_task_totals(task)
+            if entries:
+                self.assertEqual(totals, [
+                    sum([e.duration for e in entries], timedelta(0))
+                    // timedelta(minutes=1),
+                    entries[0]._start, entries[-1]._start, entries[-1]._stop])
+            else:
+                self.assertIsNone(totals)
+
+        for subdir in os.listdir(self.temp_dir.name):
+            path = os.path.join(self.temp_dir.name, subdir)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    @given(lists(fixed_dictionaries({
+            'start': datetimes(min_value=datetime(2000, 1, 1),
+                               max_value=datetime(2000, 3, 1)),
+            'stop': datetimes(min_value=datetime(2000, 1, 1),
+                              max_value=datetime(2000, 3, 1)),
+            'task': sampled_from(['', 'foo', 'bar']),
+            'append': sampled_from([True, False])}), min_size=1),
+           dates(min_value=date(2000, 1, 1), max_value=date(2000, 3, 1)),
+           dates(min_value=date(2000, 1, 1), max_value=date(2000, 3, 1)))
+    def test_get_totals(self, li, d1, d2):
+        assume(d1 <= d2)
+
+        for d in li:
+            path = self.db.get_path(d['start'].year, d['start'].month)
+            existed = os.path.exists(path)
+
+            self.db.get_rollup(d['start'].year, d['start'].month)
+            self.db.add_complete(d['start'], d['stop'], d['task'],
+                                 append=d['append'])
+
+            # the rollup can be brought up to date through the journal
+            if existed:
+                self.assertIsNotNone(self.db.cache.get_since(
+                    d['start'].year, d['start'].month, 'rollup',
+                    os.stat(path)))
+
+        totals = {}
+        for entry in self.db.get_span(d1, d2):
+            item = totals.setdefault(entry['task'], [0, entry._start])
+            item[0] += entry.duration // timedelta(minutes=1)
+
+        self.assertEqual(self.db.get_totals(d1, d2), totals)
+
+        shutil.rmtree(os.path.join(self.temp_dir.name, '2000'))
+
+    @given(lists(fixed_dictionaries({
+            'start': datetimes(min_value=datetime(2000, 1, 1),
+                               max_value=datetime(2000, 3, 1)),
+            'stop': datetimes(min_value=datetime(2000, 1, 1),
+                              max_value=datetime(2000, 3, 1)),
+            'task': text(),
+            'many': sampled_from([True, False])})))
+    def test_add_many(self, li):
+        assume(len(li) == len(set([  # avoid dts that can be sorted either way
+            d['start'].strftime(ARCHIVE_DT_FORMAT) for d in li])))
+
+        for d in li:
+            if not d['many']:
+                self.db.add_complete(d['start'], d['stop'], d['task'])
+
+        count = self.db.add_many([(d['start'], d['stop'], d['task'])
+                                  for d in li if d['many']])
+        self.assertEqual(count, len([d for d in li if d['many']]))
+
+        li = list(sorted(li, key=lambda d: d['start']))
+        logs = self.db.get_span(date(2000, 1, 1), date(2000, 3, 1))
+        self.assertEqual(len(logs), len(li))
+
+        for log, d in zip(logs, li):
+            self._check_dt_equal(log['start'], d['start'])
+            self._check_dt_equal(log['stop'], d['stop'])
+            self.assertEqual(log['task'], self.db._sanitise_text(d['task']))
+
+        year_dir = os.path.join(self.temp_dir.name, '2000')
+        if os.path.exists(year_dir):
+            shutil.rmtree(year_dir)
+
+    @given(lists(fixed_dictionaries({
+            'day': sampled_from([1, 2, 3]),
+            'task': sampled_from(['', 'foo', 'foo\nbar', '"foo"\tbar']),
+            'append': sampled_from([True, False])}), min_size=1))
+    def test_get_month_task_and_day(self, li):
+        for i, d in enumerate(li):
+            start = datetime(2000, 1, d['day'], i // 60, i % 60)
+            self.db.add_complete(start, start + timedelta(minutes=1),
+                                 d['task'], append=d['append'])
+
+            for task in ['foo', 'foo\nbar', '"foo"\tbar']:
+                entries = self.db.get_month_task(2000, 1, task)
+                self.assertEqual(entries, [
+                    entry for entry in self.db.get_month(2000, 1)
+                    if entry['task'] == task])
+
+            for day in [1, 2, 3]:
+                entries = self.db.get_day(2000, 1, day)
+                self.assertEqual(entries, [
+                    entry for entry in self.db.get_month(2000, 1)
+                    if entry['start'].day == day])
+
+        path = self.db.get_path(2000, 1)
+        with open(path, 'ab') as f:
+            f.write(b'2000-01-04 00:00\t2000-01-04 00:01\tfoo\r\n')
+
+        self.assertEqual(self.db.get_month_task(2000, 1, 'foo')[-1]['start'],
+                         datetime(2000, 1, 4))
+
+        shutil.rmtree(os.path.join(self.temp_dir.name, '2000'))
+
+    def test_get_month_task_reads_offsets(self):
+        for day in range(1, 11):
+            self.db.add_complete(datetime(2000, 1, day),
+                                 datetime(2000, 1, day, 1), str(day % 2))
+        self.db.get_month(2000, 1)
+
+        self.db.add_complete(datetime(2000, 1, 5, 12),
+                             datetime(2000, 1, 5, 13), '1', append=False)
+
+        stats = self.db.stats()
+        log = self.db.get_month_task(2000, 1, '1')
+        self.assertEqual([entry['start'].day for entry in log],
+                         [1, 3, 5, 5, 7, 9])
+        self.assertEqual(self.db.stats()['rows_parsed'] - stats['rows_parsed'],
+                         6)
+
+    def test_get_day_reads_offsets(self):
+        for day in range(1, 11):
+            self.db.add_complete(datetime(2000, 1, day),
+                                 datetime(2000, 1, day, 1))
+        self.db.add_complete(datetime(2000, 2, 1), datetime(2000, 2, 1, 1))
+        self.db.get_month(2000, 1)
+
+        self.db.add_complete(datetime(2000, 1, 5, 12),
+                             datetime(2000, 1, 5, 13), append=False)
+
+        stats = self.db.stats()
+        log = self.db.get_day(2000, 1, 5)
+        self.assertEqual([entry['start'].hour for entry in log], [0, 12])
+
+        log = self.db.get_span(date(2000, 1, 9), date(2000, 2, 1))
+        self.assertEqual([entry['start'].day for entry in log], [9, 10, 1])
+        self.assertEqual(self.db.stats()['rows_parsed'] - stats['rows_parsed'],
+                         5)
+
+    def test_add_complete_journal(self):
+        for day in range(1, 11):
+            self.db.add_complete(datetime(2000, 1, day),
+                                 datetime(2000, 1, day, 1), str(day % 3))
+        self.db.get_month(2000, 1)
+        self.db.get_rollup(2000, 1)
+        self.db.get_month_summary(2000, 1)
+
+        # only the month file and its journal are read and written
+        for day, append in [(11, True), (5, False), (1, False), (12, True)]:
+            stats = self.db.stats()
+            self.db.add_complete(datetime(2000, 1, day, 12),
+                                 datetime(2000, 1, day, 13), 'foo',
+                                 append=append)
+            self.assertLessEqual(
+                self.db.stats()['files_opened'] - stats['files_opened'], 3)
+
+        stat = os.stat(self.db.get_path(2000, 1))
+        rollup = self.db._get_cached(2000, 1, stat, 'rollup')
+        task_index = self.db._get_cached(2000, 1, stat, 'tasks')
+        day_index = self.db._get_cached(2000, 1, stat, 'days')
+        summary = self.db.get_month_summary(2000, 1)
+
+        log, new_task_index, new_day_index = self.db._read_month(
+                self.db.get_path(2000, 1), 2000, 1)
+
+        self.assertEqual(rollup.dump(), Rollup.from_log(log).dump())
+        self.assertEqual(task_index.offsets, new_task_index.offsets)
+        self.assertEqual(day_index.offsets, new_day_index.offsets)
+        self.assertEqual(summary, (14, log.starts[0], log.starts[-1]))
+
+        # reading does not write the cache, nor applies the entries twice
+        stats = self.db.stats()
+        self.assertEqual(self.db.get_rollup(2000, 1).dump(), rollup.dump())
+        self.assertEqual(self.db.stats()['bytes_written'],
+                         stats['bytes_written'])
+
+        db = Database(self.temp_dir.name, keep_in_memory=True)
+        db.get_rollup(2000, 1)
+        db.add_complete(datetime(2000, 1, 13), datetime(2000, 1, 13, 1))
+
+        for _ in range(2):
+            self.assertEqual(db.get_month_summary(2000, 1)[0], 15)
+            self.assertEqual(db.get_rollup(2000, 1).get_totals()['foo'][0],
+                             4 * 60)
+            self.assertEqual(db.get_rollup(2000, 1).get_totals()[''][0], 60)
+
+    def test_manifest(self):
+        self.assertIsNone(self.db.get_bounds())
+
+        self.db.add_complete(datetime(2000, 5, 2), datetime(2000, 5, 2, 1))
+        self.db.add_complete(datetime(2000, 5, 1), datetime(2000, 5, 1, 1),
+                             append=False)
+        self.db.add_many([(datetime(2003, 2, 1), datetime(2003, 2, 1, 1), ''),
+                          (datetime(2003, 2, 9), datetime(2003, 2, 9, 1), '')])
+
+        self.assertEqual(self.db.get_months(), [(2000, 5), (2003, 2)])
+        self.assertEqual(self.db.get_bounds(), (datetime(2000, 5, 1),
+                                                datetime(2003, 2, 9)))
+        self.assertEqual(self.db.get_month_summary(2000, 5), (
+            2, encode_stamp(datetime(2000, 5, 1)),
+            encode_stamp(datetime(2000, 5, 2))))
+
+        db = Database(self.temp_dir.name)
+        self.assertEqual(db.get_bounds(), self.db.get_bounds())
+
+        stats = db.stats()
+        log = db.get_span(date(2000, 1, 1), date(2003, 12, 31))
+        self.assertEqual(len(log), 4)
+        self.assertEqual(db.stats()['cache_misses'] - stats['cache_misses'],
+                         2)
+
+        # month files written by hand are picked up
+        path = self.db.get_path(2001, 7, create=True)
+        with open(path, 'wb') as f:
+            f.write(b'2001-07-04 10:00\t2001-07-04 11:00\tfoo\r\n')
+        with open(self.db.get_path(2003, 2), 'ab') as f:
+            f.write(b'2003-02-20 10:00\t2003-02-20 11:00\tfoo\r\n')
+
+        self.assertEqual(self.db.get_months(),
+                         [(2000, 5), (2001, 7), (2003, 2)])
+        self.assertEqual(self.db.get_year(2001), self.db.get_month(2001, 7))
+        self.assertEqual(self.db.get_bounds(), (datetime(2000, 5, 1),
+                                                datetime(2003, 2, 20, 10)))
+
+    def test_manifest_coarse_mtime(self):
+        self.db.add_complete(datetime(2000, 5, 2), datetime(2000, 5, 2, 1))
+        self.assertEqual(self.db.get_months(), [(2000, 5)])
+
+        # as if the mtime of the database dir did not tick over
+        def mkdir(path, mode=0o777, mkdir=os.mkdir):
+            stat = os.stat(os.path.dirname(path))
+            mkdir(path, mode)
+            os.utime(os.path.dirname(path),
+                     ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        with patch('os.mkdir', mkdir):
+            self.db.add_complete(datetime(2031, 1, 2),
+                                 datetime(2031, 1, 2, 1))
+
+        for db in [self.db, Database(self.temp_dir.name)]:
+            self.assertEqual(db.get_months(), [(2000, 5), (2031, 1)])
+            self.assertEqual(len(db.get_year(2031)), 1)
+
+    def test_add_tasks(self):
+        self.db.add_task('foo', 2016, 9)
+        self.db.add_tasks([('foo', 2016, 10), ('bar', 2016, 10),
+                           ('foo', 2016, 10), ('', 2016, 11)])
+
+        self.assertEqual(self.db.get_task('foo'), [(2016, 9), (2016, 10)])
+        self.assertEqual(self.db.get_task('bar'), [(2016, 10)])
+
+    def test_stats(self):
+        calls = []
+        db = Database(self.temp_dir.name,
+                      stats_callback=lambda *args: calls.append(args))
+
+        db.add_complete(datetime(2000, 1, 1, 10), datetime(2000, 1, 1, 11))
+        db.add_complete(datetime(2000, 1, 2, 10), datetime(2000, 1, 2, 11))
+        path = db.get_path(2000, 1)
+
+        stats = db.stats()
+        self.assertEqual(stats['rows_written'], 2)
+        self.assertGreater(stats['bytes_written'], os.path.getsize(path))
+
+        self.assertEqual(len(db.get_month(2000, 1)), 2)
+        self.assertEqual(len(db.get_month(2000, 1)), 2)
+
+        new_stats = db.stats()
+        self.assertEqual(new_stats['rows_parsed'], 2)
+        self.assertEqual(new_stats['cache_hits'] - stats['cache_hits'], 1)
+        self.assertEqual(new_stats['cache_misses'] - stats['cache_misses'], 1)
+        self.assertGreaterEqual(new_stats['bytes_read'] - stats['bytes_read'],
+                                os.path.getsize(path))
+        self.assertGreater(new_stats['parse_time'], 0)
+
+        totals = {}
+        for name, value in calls:
+            totals[name] = totals.get(name, 0) + value
+        self.assertEqual(totals, {name: value
+                                  for name, value in new_stats.items()
+                                  if value})
@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+from hypothesis.strategies import datetimes, lists, sampled_from, tuples
+from hypothesis import given
+
+from stl.entries import JOURNAL_SIZE
+from stl.entries import Journal, LogEntry, MonthLog, OffsetIndex
+from stl.entries import decode_stamp, encode_stamp
+
+
+class StampTestCase(TestCase):
+
+    @given(datetimes())
+    def test_encode_and_decode(self, dt):
+        dt = dt.replace(second=0, microsecond=0)
+        self.assertEqual(decode_stamp(encode_stamp(dt)), dt)
+
+
+class LogEntryTestCase(TestCase):
+
+    def test_dict_access(self):
+        start, stop = datetime(2016, 10, 15, 9), datetime(2016, 10, 15, 17)
+        entry = LogEntry(encode_stamp(start), encode_stamp(stop), 'foo')
+
+        self.assertEqual(entry['start'], start)
+        self.assertEqual(entry['stop'], stop)
+        self.assertEqual(entry['task'], 'foo')
+        self.assertEqual(entry.duration, timedelta(hours=8))
+        self.assertEqual(entry, {'start': start, 'stop': stop, 'task': 'foo'})
+
+        with self.assertRaises(KeyError):
+            entry['duration']
+
+
+class MonthLogTestCase(TestCase):
+
+    @given(lists(tuples(
+        datetimes(max_value=datetime(3000, 1, 1)),
+        datetimes(max_value=datetime(3000, 1, 1)),
+        sampled_from(['', 'foo', 'bar']))))
+    def test_append_and_extend(self, rows):
+        rows = [(start.replace(second=0, microsecond=0),
+                 stop.replace(second=0, microsecond=0), task)
+                for start, stop, task in rows]
+
+        log1, log2 = MonthLog(), MonthLog()
+        for i, (start, stop, task) in enumerate(rows):
+            (log1 if i % 2 else log2).append(start, stop, task)
+
+        log = MonthLog()
+        log.extend(log2)
+        log.extend(log1)
+
+        self.assertEqual(len(log), len(rows))
+        self.assertLessEqual(len(log.tasks), 3)
+        self.assertEqual(log, list(log2) + list(log1))
+        self.assertEqual(MonthLog.load(log.dump()), log)
+
+    def test_select(self):
+        log = MonthLog()
+        for day in range(1, 11):
+            log.append(datetime(2016, 10, day), datetime(2016, 10, day, 1),
+                       str(day))
+
+        lo = encode_stamp(datetime(2016, 10, 3))
+        hi = encode_stamp(datetime(2016, 10, 6))
+
+        self.assertEqual([entry['task'] for entry in log.select(lo, hi)],
+                         ['3', '4', '5'])
+        self.assertEqual(len(log.select(lo)), 8)
+        self.assertEqual(len(log.select(hi=lo)), 2)
+        self.assertEqual(log.select(hi, lo), [])
+
+
+class OffsetIndexTestCase(TestCase):
+
+    def test_insert(self):
+        index = OffsetIndex()
+        index.add('foo', 0)
+        index.add('bar', 10)
+        index.add('foo', 20)
+
+        index.insert('baz', 10, 5)
+        self.assertEqual(index.get('foo'), [0, 25])
+        self.assertEqual(index.get('bar'), [15])
+        self.assertEqual(index.get('baz'), [10])
+        self.assertEqual(index.get('qux'), [])
+
+        index.insert('foo', 25, 5)
+        self.assertEqual(index.get('foo'), [0, 25, 30])
+        self.assertEqual(index.get_many(['foo', 'baz', 'qux']),
+                         [0, 10, 25, 30])
+
+    def test_dump_and_load(self):
+        index = OffsetIndex()
+        index.add('foo', 0)
+        index.add('', 10)
+
+        self.assertEqual(OffsetIndex.load(index.dump()).offsets, index.offsets)
+
+        for data in [[], {'foo': 0}, None]:
+            with self.assertRaises(ValueError):
+                OffsetIndex.load(data)
+
+
+class JournalTestCase(TestCase):
+
+    def test_get_since(self):
+        journal = Journal((0, 0, 0))
+        journal.add((1, 0, 0), 10, 20, 'foo', 0, 5)
+        journal.add((2, 0, 0), 30, 40, '', 5, 5)
+
+        self.assertEqual([entry[3] for entry in journal.get_since((0, 0, 0))],
+                         ['foo', ''])
+        self.assertEqual([entry[3] for entry in journal.get_since((1, 0, 0))],
+                         [''])
+        self.assertEqual(journal.get_since((2, 0, 0)), [])
+        self.assertIsNone(journal.get_since((3, 0, 0)))
+
+        for i in range(JOURNAL_SIZE):
+            journal.add((i + 3, 0, 0), 0, 0, '', 0, 0)
+
+        self.assertIsNone(journal.get_since((0, 0, 0)))
+        self.assertEqual(len(journal.get_since((2, 0, 0))), JOURNAL_SIZE)
+
+    def test_dump_and_load(self):
+        journal = Journal((0, 0, 0))
+        journal.add((1, 0, 0), 10, 20, 'foo', 0, 5)
+
+        loaded = Journal.load(journal.dump())
+        self.assertEqual(loaded.key, journal.key)
+        self.assertEqual(loaded.entries, journal.entries)
+
+        for data in [((0, 0, 0), None), ((0, 0, 0), [[1, 2]]), None]:
+            with self.assertRaises((TypeError, ValueError)):
+                Journal.load(data)
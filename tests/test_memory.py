@@ -0,0 +1,93 @@
+from datetime import date, datetime
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from hypothesis.strategies import (
+    booleans, dates, datetimes, fixed_dictionaries, lists, sampled_from
+)
+from hypothesis import assume, given
+
+from stl.core import Core
+from stl.db import MEMORY_DIR
+from stl.db import Database, copy_database, open_database
+from stl.memory import MemoryDatabase
+
+
+class MemoryDatabaseTestCase(TestCase):
+
+    def test_open_database(self):
+        self.assertIsInstance(open_database(MEMORY_DIR), MemoryDatabase)
+        self.assertIsInstance(Core(dir_path=MEMORY_DIR).db, MemoryDatabase)
+        self.assertIsInstance(Core(backend='memory').db, MemoryDatabase)
+
+    @given(datetimes(), booleans())
+    def test_add_and_get_current(self, dt, delete):
+        db = MemoryDatabase()
+        self.assertIsNone(db.get_current())
+
+        db.add_current(dt, 'foo')
+        db.add_current(dt, ' bar ')
+
+        entry = db.get_current(delete=delete)
+        self.assertEqual(entry, {'stamp': dt.replace(microsecond=0),
+                                 'task': 'bar'})
+        self.assertEqual(db.get_current() is None, delete)
+
+    @given(lists(fixed_dictionaries({
+            'start': datetimes(min_value=datetime(2000, 1, 1),
+                               max_value=datetime(2001, 3, 1)),
+            'stop': datetimes(min_value=datetime(2000, 1, 1),
+                              max_value=datetime(2001, 3, 1)),
+            'task': sampled_from(['', 'foo', 'bar']),
+            'append': booleans()}), min_size=1),
+           dates(min_value=date(2000, 1, 1), max_value=date(2001, 3, 1)),
+           dates(min_value=date(2000, 1, 1), max_value=date(2001, 3, 1)))
+    def test_same_as_files(self, li, d1, d2):
+        assume(d1 <= d2)
+
+        with TemporaryDirectory() as dir_path:
+            files = Database(dir_path)
+            memory = MemoryDatabase()
+
+            for db in [files, memory]:
+                for d in li:
+                    db.add_complete(d['start'], d['stop'], d['task'],
+                                    append=d['append'])
+                    if d['task']:
+                        db.add_task(d['task'], d['start'].year,
+                                    d['start'].month)
+
+            self.assertEqual(memory.get_months(), files.get_months())
+            self.assertEqual(memory.get_day(d1.year, d1.month, d1.day),
+                             files.get_day(d1.year, d1.month, d1.day))
+            self.assertEqual(memory.get_year(2000), files.get_year(2000))
+            self.assertEqual(memory.get_span(d1, d2), files.get_span(d1, d2))
+            self.assertEqual(memory.get_totals(d1, d2),
+                             files.get_totals(d1, d2))
+            self.assertEqual(memory.get_bounds(), files.get_bounds())
+
+            for task in ['foo', 'bar']:
+                self.assertEqual(list(memory.iter_task(task)),
+                                 list(files.iter_task(task)))
+                self.assertEqual(memory.get_task_totals(task),
+                                 files.get_task_totals(task))
+                self.assertEqual(memory.get_task(task), files.get_task(task))
+
+    def test_core(self):
+        core = Core(dir_path=MEMORY_DIR)
+
+        core.start('foo', now=datetime(2016, 10, 15, 9))
+        core.stop(now=datetime(2016, 10, 15, 10, 30))
+        core.add('2016-10-16T09:00', '2016-10-16T10:00', 'bar')
+
+        self.assertEqual(core.status(('task', 'foo')), '\n'.join([
+            '[foo]', 'started: 15 oct 2016 09:00',
+            'last mod: 15 oct 2016 10:30', 'total: 1 hour, 30 minutes']))
+
+        other = MemoryDatabase()
+        self.assertEqual(copy_database(core.db, other), 2)
+        self.assertEqual(other.get_month(2016, 10),
+                         core.db.get_month(2016, 10))
+
+        with self.assertRaises(ValueError):
+            core.migrate('sqlite')
@@ -0,0 +1,80 @@
+import io
+import os
+from contextlib import redirect_stderr
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from stl.cli import Cli
+from stl.core import Core
+from stl.db import Database
+from stl.profile import PHASES, PSTATS_FILE, Profiler
+
+
+class ProfileTestCase(TestCase):
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.dir_path = self.temp_dir.name
+
+        core = Core(dir_path=self.dir_path)
+        core.add('2000-01-10T10:00', '2000-01-10T12:00', 'foo')
+        core.add('2000-02-10T10:00', '2000-02-10T11:00', 'bar')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def run_cli(self, *args):
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            res = Cli().run(['--dir', self.dir_path] + list(args))
+        return res, stderr.getvalue()
+
+    def test_phases(self):
+        res, stderr = self.run_cli('--profile', 'show', '-y', '2000')
+        self.assertEqual(res, self.run_cli('show', '-y', '2000')[0])
+
+        lines = stderr.splitlines()
+        self.assertTrue(all(line.startswith('profile: ') for line in lines))
+
+        names = [line[len('profile: '):].rsplit(None, 2)[0]
+                 for line in lines[:len(PHASES)]]
+        self.assertEqual(names, list(PHASES))
+
+        self.assertIn('files opened', stderr)
+        self.assertIn('bytes read', stderr)
+        self.assertIn('rows parsed', stderr)
+
+    def test_unpatch(self):
+        get_month = Database.get_month
+        init = Database.__init__
+
+        self.run_cli('--profile', 'show', '-t', 'foo')
+
+        self.assertIs(Database.get_month, get_month)
+        self.assertIs(Database.__init__, init)
+
+    def test_counters(self):
+        profiler = Profiler('phases', 0)
+        profiler.run(lambda: Database(self.dir_path).get_month(2000, 1))
+
+        self.assertEqual(len(profiler.databases), 1)
+
+        counters = profiler.databases[0].stats()
+        self.assertEqual(counters['cache_misses'], 1)
+        self.assertEqual(counters['rows_parsed'], 1)
+        self.assertEqual(counters['bytes_read'], os.path.getsize(
+            os.path.join(self.dir_path, '2000', '01')))
+
+    def test_cprofile(self):
+        cwd = os.getcwd()
+        os.chdir(self.dir_path)
+
+        try:
+            res, stderr = self.run_cli('--profile=cprofile', 'show', '-y',
+                                       '2000')
+            self.assertTrue(os.path.exists(PSTATS_FILE))
+        finally:
+            os.chdir(cwd)
+
+        self.assertIn('[2000]', res)
+        self.assertIn(PSTATS_FILE, stderr)
@@ -0,0 +1,104 @@
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from hypothesis.strategies import datetimes, text
+from hypothesis import given
+
+from stl.db import Database
+from stl.prompt import get_current_info, get_dir_path
+from stl.status import Status
+
+
+"""
+How much longer than the bare interpreter's (in seconds) the prompt entry
+point is allowed to take to start up and print its output.
+"""
+LATENCY_BUDGET = 0.020
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class PromptTestCase(TestCase):
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+        self.db = Database(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _run(self, code, repeat=5):
+        """
+        Runs the given code in a new interpreter; returns the output and the
+        best of the given number of wall-clock timings, in seconds.
+        """
+        env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+        best = None
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            res = subprocess.run([sys.executable, '-c', code], env=env,
+                                 stdout=subprocess.PIPE, check=True)
+            elapsed = time.perf_counter() - start
+
+            if best is None or elapsed < best:
+                best = elapsed
+
+        return res.stdout.decode(), best
+
+    @given(datetimes(), text())
+    def test_get_current_info(self, dt, task):
+        now = datetime(2000, 1, 1)
+        status = Status(self.db)
+        self.assertEqual(get_current_info(self.temp_dir.name, now),
+                         status.get_current_info(now))
+
+        self.db.add_current(dt, task)
+        self.assertEqual(get_current_info(self.temp_dir.name, now),
+                         status.get_current_info(now))
+
+        os.remove(os.path.join(self.temp_dir.name, 'current'))
+
+    def test_get_dir_path(self):
+        self.assertEqual(get_dir_path(['--dir', 'foo']), 'foo')
+        self.assertEqual(get_dir_path(['--dir=foo']), 'foo')
+
+    def test_imports(self):
+        code = ('import sys; from stl.prompt import main; main(); '
+                'print(sorted(set(sys.modules) & {"argparse", "csv", '
+                '"logging", "stl.core", "stl.db"}))')
+        code = code.replace('main()', 'sys.argv.extend(["--dir", {!r}]); '
+                            'main()'.format(self.temp_dir.name))
+
+        self.db.add_current(datetime(2000, 1, 1), 'foo')
+        output, _ = self._run(code, repeat=1)
+
+        self.assertIn('task: foo', output)
+        self.assertTrue(output.rstrip().endswith('[]'))
+
+        # the current file is left empty by stl stop
+        self.db.get_current(delete=True)
+        output, _ = self._run(code, repeat=1)
+
+        self.assertIn('nothing to see here', output)
+        self.assertTrue(output.rstrip().endswith('[]'))
+
+    def test_latency(self):
+        code = ('import sys; sys.argv.extend(["--dir", {!r}]); '
+                'from stl.prompt import main; main()'.format(
+                    self.temp_dir.name))
+
+        _, baseline = self._run('pass')
+
+        self.db.add_current(datetime(2000, 1, 1), 'foo')
+        _, elapsed = self._run(code)
+        self.assertLess(elapsed - baseline, LATENCY_BUDGET)
+
+        self.db.get_current(delete=True)
+        _, elapsed = self._run(code)
+        self.assertLess(elapsed - baseline, LATENCY_BUDGET)
@@ -0,0 +1,122 @@
+import os
+from datetime import date, datetime
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from hypothesis.strategies import (
+    booleans, dates, datetimes, fixed_dictionaries, lists, sampled_from
+)
+from hypothesis import assume, given
+
+from stl.db import SQLITE_FILE
+from stl.db import Database, copy_database, open_database
+from stl.sqlite import SqliteDatabase
+
+
+class SqliteDatabaseTestCase(TestCase):
+
+    def setUp(self):
+        self.temp_dir = TemporaryDirectory()
+
+        self.files_dir = os.path.join(self.temp_dir.name, 'files')
+        self.sqlite_dir = os.path.join(self.temp_dir.name, 'sqlite')
+
+        os.mkdir(self.files_dir)
+        os.mkdir(self.sqlite_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_open_database(self):
+        self.assertIsInstance(open_database(self.files_dir), Database)
+        self.assertFalse(os.path.exists(
+            os.path.join(self.files_dir, SQLITE_FILE)))
+
+        SqliteDatabase(self.sqlite_dir).close()
+        self.assertIsInstance(open_database(self.sqlite_dir), SqliteDatabase)
+
+    @given(datetimes(min_value=datetime(1000, 1, 1)), booleans())
+    def test_add_and_get_current(self, dt, delete):
+        db = SqliteDatabase(self.sqlite_dir)
+        self.assertIsNone(db.get_current())
+
+        db.add_current(dt, 'foo')
+        db.add_current(dt, ' bar ')
+
+        entry = db.get_current(delete=delete)
+        self.assertEqual(entry, {'stamp': dt.replace(microsecond=0),
+                                 'task': 'bar'})
+
+        if delete:
+            self.assertIsNone(db.get_current())
+        else:
+            db.get_current(delete=True)
+
+        db.close()
+
+    @given(lists(fixed_dictionaries({
+            'start': datetimes(min_value=datetime(2000, 1, 1),
+                               max_value=datetime(2001, 3, 1)),
+            'stop': datetimes(min_value=datetime(2000, 1, 1),
+                              max_value=datetime(2001, 3, 1)),
+            'task': sampled_from(['', 'foo', 'bar']),
+            'append': booleans()}), min_size=1),
+           dates(min_value=date(2000, 1, 1), max_value=date(2001, 3, 1)),
+           dates(min_value=date(2000, 1, 1), max_value=date(2001, 3, 1)))
+    def test_same_as_files(self, li, d1, d2):
+        assume(d1 <= d2)
+
+        with TemporaryDirectory() as files_dir, \
+                TemporaryDirectory() as sqlite_dir:
+            files = Database(files_dir)
+            sqlite = SqliteDatabase(sqlite_dir)
+
+            for db in [files, sqlite]:
+                for d in li:
+                    db.add_complete(d['start'], d['stop'], d['task'],
+                                    append=d['append'])
+                    if d['task']:
+                        db.add_task(d['task'], d['start'].year,
+                                    d['start'].month)
+
+            self.assertEqual(sqlite.get_month(2000, 6),
+                             files.get_month(2000, 6))
+            self.assertEqual(sqlite.get_day(d1.year, d1.month, d1.day),
+                             files.get_day(d1.year, d1.month, d1.day))
+            self.assertEqual(sqlite.get_year(2000), files.get_year(2000))
+            self.assertEqual(sqlite.get_span(d1, d2), files.get_span(d1, d2))
+            self.assertEqual(list(sqlite.iter_span(d1, d2)),
+                             list(files.iter_span(d1, d2)))
+            self.assertEqual(sqlite.get_totals(d1, d2),
+                             files.get_totals(d1, d2))
+            self.assertEqual(sqlite.get_bounds(), files.get_bounds())
+            self.assertEqual(sqlite.get_month_summary(d1.year, d1.month),
+                             files.get_month_summary(d1.year, d1.month))
+
+            for task in ['foo', 'bar']:
+                self.assertEqual(list(sqlite.iter_task(task)),
+                                 list(files.iter_task(task)))
+                self.assertEqual(sqlite.get_task_totals(task),
+                                 files.get_task_totals(task))
+                self.assertEqual(sqlite.get_task(task), files.get_task(task))
+
+            sqlite.close()
+
+    def test_copy_database(self):
+        files = Database(self.files_dir)
+        files.add_complete(datetime(2016, 10, 15, 9),
+                           datetime(2016, 10, 15, 10), 'foo')
+        files.add_complete(datetime(2017, 1, 1, 9), datetime(2017, 1, 1, 10))
+        files.add_current(datetime(2017, 1, 2, 9, 30, 15), 'bar')
+
+        sqlite = SqliteDatabase(self.sqlite_dir)
+        self.assertEqual(copy_database(files, sqlite), 2)
+
+        self.assertEqual(sqlite.get_months(), files.get_months()[:1] + [
+            (2016, 11), (2016, 12)] + files.get_months()[1:])
+        self.assertEqual(sqlite.get_span(date(2016, 1, 1), date(2017, 12, 31)),
+                         files.get_span(date(2016, 1, 1), date(2017, 12, 31)))
+        self.assertEqual(sqlite.get_task('foo'), [(2016, 10)])
+        self.assertEqual(sqlite.get_current(), files.get_current())
+
+        sqlite.close()
@@ -6,6 +6,7 @@ from hypothesis.strategies import dates, datetimes, just, sampled_from
 from hypothesis import assume, example, given
 
 from stl.time import Parser
+from stl.time import resolve_range
 from stl.time import prettify_date, prettify_datetime, prettify_delta
 
 
@@ -19,6 +20,28 @@ class ParserTestCase(TestCase):
         self.now = datetime(2016, 10, 15)
         self.parser = Parser(self.now)
 
+    def test_lookups(self):
+        def strptime(s, codes, attr):
+            for code in codes:
+                try:
+                    return getattr(datetime.strptime(s, code), attr)
+                except ValueError:
+                    continue
+
+        tokens = [str(i).zfill(width) for width in range(1, 5)
+                  for i in range(10 ** width)]
+        tokens += ['', '1a', '-1', '+12', ' 5', 'Sep', 'SEPTEMBER', 'sept',
+                   'ma', 'mayo', 'oct.']
+
+        for token in tokens:
+            self.assertEqual(self.parser._lookup_year(token),
+                             strptime(token, ['%Y', '%y'], 'year'))
+            self.assertEqual(self.parser._lookup_month(token),
+                             strptime(token.lower(), ['%m', '%b', '%B'],
+                                      'month'))
+            self.assertEqual(self.parser._lookup_day(token),
+                             strptime(token, ['%d'], 'day'))
+
     @given(dates(min_value=MIN_DATE))
     def test_extract_year(self, d):
         s = d.strftime('%Y')
@@ -209,6 +232,41 @@ class ParserTestCase(TestCase):
         self.assertEqual(d1, d)
         self.assertEqual(d2, self.now.date())'''
 
+    def test_resolve(self):
+        self.assertEqual(self.parser.resolve('day', '5 oct'),
+                         (date(2016, 10, 5), date(2016, 10, 5)))
+        self.assertEqual(self.parser.resolve('week', 'last'),
+                         (date(2016, 10, 3), date(2016, 10, 9)))
+        self.assertEqual(self.parser.resolve('month', 'feb 2016'),
+                         (date(2016, 2, 1), date(2016, 2, 29)))
+        self.assertEqual(self.parser.resolve('month', 'dec'),
+                         (date(2016, 12, 1), date(2016, 12, 31)))
+        self.assertEqual(self.parser.resolve('year', 'last'),
+                         (date(2015, 1, 1), date(2015, 12, 31)))
+        self.assertEqual(self.parser.resolve('span', '12 oct 10 sep'),
+                         (date(2016, 9, 10), date(2016, 10, 12)))
+
+        for kind, s in [('day', 'sep'), ('month', '13'), ('task', 'foo')]:
+            with self.assertRaises(ValueError):
+                self.parser.resolve(kind, s)
+
+    def test_resolve_many(self):
+        items = [('day', 'today'), ('month', 'this'), ('day', 'today')]
+        ranges = [(date(2016, 10, 15), date(2016, 10, 15)),
+                  (date(2016, 10, 1), date(2016, 10, 31)),
+                  (date(2016, 10, 15), date(2016, 10, 15))]
+
+        resolve_range.cache_clear()
+        self.assertEqual(self.parser.resolve_many(items), ranges)
+        self.assertEqual(resolve_range.cache_info().hits, 1)
+
+        parser = Parser(self.now + timedelta(hours=12))
+        self.assertEqual(parser.resolve_many(items), ranges)
+        self.assertEqual(resolve_range.cache_info().hits, 4)
+
+        parser = Parser(self.now + timedelta(days=1))
+        self.assertEqual(parser.resolve('day', 'today')[0], date(2016, 10, 16))
+
 
 class PrettifyTestCase(TestCase):
 